@@ -1,3 +1,6 @@
+from app.helper.page_cache import PageCache
+
+
 class VbplFullTextField:
     def __init__(self):
         self.current_big_part_number = None
@@ -20,3 +23,60 @@ class VbplFullTextField:
                 f'chương {self.current_chapter_number} {self.current_chapter_name}, '
                 f'mục {self.current_part_number} {self.current_part_name}, '
                 f'tiểu mục {self.current_mini_part_number} {self.current_mini_part_name}')
+
+
+# one document moving through the vbpl crawl pipeline, the page cache goes with it
+# so the later stages reuse the tab pages fetched by the earlier ones
+class VbplCrawlItem:
+    # force crawls the document in full even when its fingerprint did not change
+    def __init__(self, vbpl, vbpl_type, task=None, force=False):
+        self.vbpl = vbpl
+        self.vbpl_type = vbpl_type
+        # the crawl_task row the item was claimed from, None outside of a frontier crawl
+        self.task = task
+        self.force = force
+        # set by the detail stage when the fingerprint matched, only the relations are crawled then
+        self.unchanged = False
+        self.fulltext = None
+        self.sub_part = None
+        # None until the relation stage read the tab
+        self.related_doc_rows = None
+        self.doc_map_rows = None
+        self.page_cache = PageCache()
+
+    def __str__(self):
+        return f'vbpl {self.vbpl.id}'
+
+
+# listing pages of one vbpl crawl. an incremental crawl stops handing out pages once stop_after_known_pages
+# consecutive pages listed only known vbpl, a full sweep (stop_after_known_pages None) lists every page
+class VbplListingProgress:
+    def __init__(self, total_pages, stop_after_known_pages=None):
+        self.total_pages = total_pages
+        self.stop_after_known_pages = stop_after_known_pages
+        self.stop_page = None
+        self._known_pages = set()
+
+    # read lazily by the pipeline, so a page is only handed out once the listing stage has room for it
+    def pages(self):
+        for page in range(1, self.total_pages + 1):
+            if self.stop_page is not None:
+                return
+            yield page
+
+    def is_past_stop(self, page):
+        return self.stop_page is not None and page > self.stop_page
+
+    # pages finish out of order, the run of known pages around this one is looked up on both sides
+    def record_page(self, page, all_known):
+        if self.stop_after_known_pages is None or not all_known:
+            return
+        self._known_pages.add(page)
+        first = page
+        while first - 1 in self._known_pages:
+            first -= 1
+        last = page
+        while last + 1 in self._known_pages:
+            last += 1
+        if last - first + 1 >= self.stop_after_known_pages and not self.is_past_stop(last):
+            self.stop_page = last
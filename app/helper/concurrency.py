@@ -0,0 +1,13 @@
+import asyncio
+
+
+# gather that cancels the remaining coroutines as soon as one of them fails
+async def gather_or_cancel(*coroutines):
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.helper.db import async_db_session
+from app.helper.db_writer import DbWriter
+from app.helper.enum import CrawlTaskKind, CrawlTaskState
+from app.model import CrawlTask
+from setting import setting
+
+
+# persistent frontier of the crawls in the crawl_task table, one row per (kind, target id).
+# the listing enqueues what it found, workers claim batches of tasks with an atomic UPDATE ... LIMIT and a
+# lease, and every task ends done or failed. a failed task is claimed again after an exponential backoff until
+# CRAWL_TASK_MAX_ATTEMPTS. a running task left by a process that died is released when the next crawl of its kind
+# starts, a running task whose lease expired is claimed again as well.
+# while a kind still has pending or running tasks its crawl resumes them instead of listing again
+class CrawlFrontier:
+    # seconds an empty claim waits for the listing before claiming again
+    _claim_poll_interval = 1
+
+    # tasks found by a new listing, target id -> payload. done and given up tasks are crawled again, the others
+    # are left as they are, every listed task gets the payload of this listing
+    @classmethod
+    async def enqueue(cls, kind: CrawlTaskKind, tasks: Dict[str, Optional[dict]]):
+        rows = {str(target_id): {
+            'kind': kind.value,
+            'target_id': str(target_id),
+            'state': CrawlTaskState.PENDING.value,
+            'attempts': 0,
+            'payload': cls.dump_payload(payload),
+        } for target_id, payload in tasks.items()}
+        if len(rows) == 0:
+            return
+        target_ids = list(rows)
+        async with async_db_session() as session:
+            insert_tasks = mysql_insert(CrawlTask).values(list(rows.values()))
+            await session.execute(insert_tasks.on_duplicate_key_update(payload=insert_tasks.inserted.payload))
+            await session.execute(update(CrawlTask).where(
+                CrawlTask.kind == kind.value,
+                CrawlTask.target_id.in_(target_ids),
+                or_(CrawlTask.state == CrawlTaskState.DONE.value,
+                    and_(CrawlTask.state == CrawlTaskState.FAILED.value,
+                         CrawlTask.attempts >= setting.CRAWL_TASK_MAX_ATTEMPTS))
+            ).values(state=CrawlTaskState.PENDING.value, attempts=0, next_attempt_at=None, last_error=None))
+
+    # running tasks of the kind left by a process that died, handed out again right away instead of once their lease
+    # expired. only the crawl of the kind claims its tasks, so it calls this before it claims anything
+    @classmethod
+    async def release_running(cls, kind: CrawlTaskKind):
+        async with async_db_session() as session:
+            await session.execute(update(CrawlTask).where(
+                CrawlTask.kind == kind.value,
+                CrawlTask.state == CrawlTaskState.RUNNING.value
+            ).values(state=CrawlTaskState.PENDING.value, lease_token=None, lease_expires_at=None))
+
+    # pending or running tasks are left from a run that did not finish
+    @classmethod
+    async def has_unfinished(cls, kind: CrawlTaskKind) -> bool:
+        async with async_db_session() as session:
+            return (await session.execute(select(CrawlTask.id).where(
+                CrawlTask.kind == kind.value,
+                CrawlTask.state.in_([CrawlTaskState.PENDING.value, CrawlTaskState.RUNNING.value])
+            ).limit(1))).first() is not None
+
+    # rows (id, target_id, attempts, payload) of up to limit claimable tasks, leased to the caller. concurrent claims
+    # never get the same task, the UPDATE locks the rows it takes and the rows are found again by the lease token
+    @classmethod
+    async def claim(cls, kind: CrawlTaskKind, limit: int = None) -> List[Row]:
+        lease_token = uuid.uuid4().hex
+        now = datetime.now()
+        async with async_db_session() as session:
+            await session.execute(update(CrawlTask).where(
+                CrawlTask.kind == kind.value,
+                or_(CrawlTask.state == CrawlTaskState.PENDING.value,
+                    and_(CrawlTask.state == CrawlTaskState.RUNNING.value, CrawlTask.lease_expires_at < now),
+                    and_(CrawlTask.state == CrawlTaskState.FAILED.value,
+                         CrawlTask.attempts < setting.CRAWL_TASK_MAX_ATTEMPTS,
+                         CrawlTask.next_attempt_at <= now))
+            ).values(
+                state=CrawlTaskState.RUNNING.value,
+                attempts=CrawlTask.attempts + 1,
+                lease_token=lease_token,
+                lease_expires_at=now + timedelta(seconds=setting.CRAWL_TASK_LEASE)
+            ).with_dialect_options(mysql_limit=limit or setting.CRAWL_TASK_CLAIM_SIZE))
+            return (await session.execute(select(CrawlTask.id, CrawlTask.target_id, CrawlTask.attempts,
+                                                 CrawlTask.payload)
+                                          .where(CrawlTask.lease_token == lease_token)
+                                          .order_by(CrawlTask.id))).all()
+
+    # what the listing knew about the target of a claimed task, empty when it passed nothing
+    @classmethod
+    def payload(cls, task: Row) -> dict:
+        if task.payload is None:
+            return {}
+        return json.loads(task.payload)
+
+    @classmethod
+    def dump_payload(cls, payload: Optional[dict]) -> Optional[str]:
+        if payload is None:
+            return None
+        return json.dumps(payload, ensure_ascii=False)
+
+    # every claimable task of the kind, claimed a batch at a time. while listing (the run filling the frontier)
+    # is not done an empty claim waits for more tasks instead of ending. tasks that fail during the run are not
+    # claimable before their backoff, so the claims end once everything else was handed out
+    @classmethod
+    async def claim_all(cls, kind: CrawlTaskKind, listing: asyncio.Future = None):
+        while True:
+            # read before the claim, a listing that ends right after it has enqueued everything this claim saw
+            listing_done = listing is None or listing.done()
+            tasks = await cls.claim(kind)
+            if len(tasks) == 0:
+                if listing_done:
+                    return
+                await asyncio.wait({listing}, timeout=cls._claim_poll_interval)
+                continue
+            for task in tasks:
+                yield task
+
+    # the writes of the crawled task are committed together with its done state, when they are lost the task is
+    # failed instead and retried with backoff
+    @classmethod
+    async def complete(cls, task: Row, *writes, on_written: Callable[[], None] = None):
+        await DbWriter.submit(DbWriter.chain(*writes, partial(cls.write_done, task.id)), f'crawl task {task.id} done',
+                              on_failed=partial(cls.write_error, task), on_written=on_written)
+
+    @classmethod
+    async def fail(cls, task: Row, error: Exception):
+        await DbWriter.submit(partial(cls.write_error, task, error), f'crawl task {task.id} failed')
+
+    @classmethod
+    async def write_done(cls, task_id, session: AsyncSession):
+        await session.execute(update(CrawlTask).where(CrawlTask.id == task_id).values(
+            state=CrawlTaskState.DONE.value, lease_token=None, lease_expires_at=None, next_attempt_at=None,
+            last_error=None))
+
+    # queue one task again with a new payload, in the transaction of the caller
+    @classmethod
+    async def write_put(cls, kind: CrawlTaskKind, target_id, payload: Optional[dict], session: AsyncSession):
+        insert_task = mysql_insert(CrawlTask).values(kind=kind.value, target_id=str(target_id),
+                                                     state=CrawlTaskState.PENDING.value, attempts=0,
+                                                     payload=cls.dump_payload(payload))
+        await session.execute(insert_task.on_duplicate_key_update(
+            state=CrawlTaskState.PENDING.value, attempts=0, payload=insert_task.inserted.payload, lease_token=None,
+            lease_expires_at=None, next_attempt_at=None, last_error=None))
+
+    @classmethod
+    async def write_remove(cls, kind: CrawlTaskKind, target_id, session: AsyncSession):
+        await session.execute(delete(CrawlTask).where(CrawlTask.kind == kind.value,
+                                                      CrawlTask.target_id == str(target_id)))
+
+    @classmethod
+    async def write_payload(cls, task_id, payload: Optional[dict], session: AsyncSession):
+        await session.execute(update(CrawlTask).where(CrawlTask.id == task_id).values(
+            payload=cls.dump_payload(payload)))
+
+    @classmethod
+    async def write_error(cls, task: Row, error: Exception, session: AsyncSession):
+        await cls.write_failed(task.id, task.attempts, f'{type(error).__name__} {error}', session)
+
+    @classmethod
+    async def write_failed(cls, task_id, attempts, error, session: AsyncSession):
+        backoff = setting.CRAWL_TASK_BACKOFF * 2 ** (attempts - 1)
+        await session.execute(update(CrawlTask).where(CrawlTask.id == task_id).values(
+            state=CrawlTaskState.FAILED.value, lease_token=None, lease_expires_at=None,
+            next_attempt_at=datetime.now() + timedelta(seconds=backoff), last_error=error))
@@ -0,0 +1,22 @@
+import asyncio
+
+from app.helper.db import close_async_engine
+from app.helper.db_writer import DbWriter
+from app.helper.http_client import HttpClient
+
+
+async def _run_crawl(coro):
+    try:
+        return await coro
+    finally:
+        # the queued writes are committed even when the crawl failed
+        try:
+            await DbWriter.close()
+        finally:
+            await close_async_engine()
+            await HttpClient.close()
+
+
+# run a crawl coroutine on its own event loop and release the shared resources once it is done
+def run_crawl(coro):
+    return asyncio.run(_run_crawl(coro))
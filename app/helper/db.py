@@ -1,7 +1,11 @@
+import asyncio
 import time
 import logging
+from contextlib import asynccontextmanager
+from typing import Dict
 from sqlalchemy import create_engine, event
-from sqlalchemy.engine import Engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
 from setting import setting
 
@@ -21,3 +25,39 @@ def db_session():
         yield session
     finally:
         session.close()
+
+
+# the crawlers use an async engine so a query never blocks the event loop, the sync engine above stays for
+# alembic and the cli. aiomysql connections belong to the loop that opened them, every loop gets its own
+# engine and run_crawl disposes it before the loop is closed
+_async_drivers = {'mysql': 'mysql+aiomysql', 'mysql+pymysql': 'mysql+aiomysql'}
+_async_engines: Dict[asyncio.AbstractEventLoop, AsyncEngine] = {}
+
+
+def get_async_engine() -> AsyncEngine:
+    loop = asyncio.get_running_loop()
+    engine = _async_engines.get(loop)
+    if engine is None:
+        url = make_url(setting.SQLALCHEMY_DATABASE_URI)
+        url = url.set(drivername=_async_drivers.get(url.drivername, url.drivername))
+        engine = create_async_engine(url, pool_pre_ping=True,
+                                     pool_size=setting.DB_POOL_SIZE,
+                                     max_overflow=setting.DB_MAX_OVERFLOW,
+                                     pool_timeout=setting.DB_POOL_TIMEOUT,
+                                     pool_recycle=setting.DB_POOL_RECYCLE)
+        _async_engines[loop] = engine
+    return engine
+
+
+# one transaction on the async engine, committed when the block exits without an error
+@asynccontextmanager
+async def async_db_session():
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        async with session.begin():
+            yield session
+
+
+async def close_async_engine():
+    engine = _async_engines.pop(asyncio.get_running_loop(), None)
+    if engine is not None:
+        await engine.dispose()
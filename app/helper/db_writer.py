@@ -0,0 +1,165 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.helper.db import async_db_session
+from app.helper.logger import setup_logger
+from setting import setting
+
+_logger = setup_logger('db_writer_logger', 'log/db_writer.log')
+
+
+class _QueuedWrite(NamedTuple):
+    # None for a flush marker
+    write: Optional[Callable[[AsyncSession], Awaitable]]
+    name: Optional[str] = None
+    on_failed: Optional[Callable[[Exception, AsyncSession], Awaitable]] = None
+    on_written: Optional[Callable[[], None]] = None
+    # resolved by the writer once the writes queued before the marker are committed
+    flushed: Optional[asyncio.Future] = None
+
+
+# write-behind persistence, the crawlers queue their writes and go on with the network while one writer task
+# commits them in batches, up to DB_WRITE_BATCH_SIZE writes in one transaction on the async engine. a write is
+# a coroutine function of the batch session, it must not commit and it must only use values captured when it
+# was submitted. a single writer keeps the writes in the order they were queued in.
+# the crawler hears back through the callbacks of a write: on_written is called once it is committed, on_failed
+# is awaited with the error and a session of its own when the write is lost.
+# the queue is bound to the loop that created it, run_crawl flushes it before the loop is closed
+class DbWriter:
+    _queues: Dict[asyncio.AbstractEventLoop, asyncio.Queue] = {}
+    _tasks: Dict[asyncio.AbstractEventLoop, asyncio.Task] = {}
+
+    @classmethod
+    def _get_queue(cls) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        queue = cls._queues.get(loop)
+        if queue is None:
+            queue = asyncio.Queue(maxsize=setting.DB_WRITE_QUEUE_SIZE)
+            cls._queues[loop] = queue
+            cls._tasks[loop] = loop.create_task(cls._drain(queue))
+        return queue
+
+    # only waits when the queue is full, the write itself happens later
+    @classmethod
+    async def submit(cls, write: Callable[[AsyncSession], Awaitable], name: str,
+                     on_failed: Callable[[Exception, AsyncSession], Awaitable] = None,
+                     on_written: Callable[[], None] = None):
+        await cls._get_queue().put(_QueuedWrite(write, name, on_failed, on_written))
+
+    # one write running the given writes in order, so they are committed or lost together
+    @classmethod
+    def chain(cls, *writes: Callable[[AsyncSession], Awaitable]) -> Callable[[AsyncSession], Awaitable]:
+        async def write_all(session: AsyncSession):
+            for write in writes:
+                await write(session)
+        return write_all
+
+    # wait until every write submitted on this loop so far is committed
+    @classmethod
+    async def flush(cls):
+        loop = asyncio.get_running_loop()
+        queue = cls._queues.get(loop)
+        if queue is None:
+            return
+        flushed = loop.create_future()
+        await queue.put(_QueuedWrite(None, flushed=flushed))
+        await flushed
+
+    # flush and stop the writer of the running loop
+    @classmethod
+    async def close(cls):
+        loop = asyncio.get_running_loop()
+        if loop not in cls._queues:
+            return
+        try:
+            await cls.flush()
+        finally:
+            cls._queues.pop(loop)
+            task = cls._tasks.pop(loop)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    # a batch is written once it is full, DB_WRITE_MAX_LATENCY_MS after its first write or at a flush
+    @classmethod
+    async def _drain(cls, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        max_latency = setting.DB_WRITE_MAX_LATENCY_MS / 1000
+        # a get that is still pending when the batch closes is kept for the next batch, so no write is lost
+        getter = None
+        try:
+            while True:
+                batch = []
+                deadline = None
+                while len(batch) < setting.DB_WRITE_BATCH_SIZE:
+                    if getter is None:
+                        getter = asyncio.ensure_future(queue.get())
+                    timeout = None if deadline is None else max(deadline - loop.time(), 0)
+                    await asyncio.wait({getter}, timeout=timeout)
+                    if not getter.done():
+                        break
+                    entry = getter.result()
+                    getter = None
+                    batch.append(entry)
+                    if entry.write is None:
+                        break
+                    if deadline is None:
+                        deadline = loop.time() + max_latency
+
+                writes = [entry for entry in batch if entry.write is not None]
+                if len(writes) > 0:
+                    await cls._write_batch(writes)
+                for entry in batch:
+                    if entry.write is None and not entry.flushed.done():
+                        entry.flushed.set_result(None)
+        finally:
+            if getter is not None:
+                getter.cancel()
+
+    # a failed batch is written again one write per transaction, only the broken writes are lost
+    @classmethod
+    async def _write_batch(cls, writes: List[_QueuedWrite]):
+        try:
+            async with async_db_session() as session:
+                for entry in writes:
+                    await entry.write(session)
+        except Exception as e:
+            if len(writes) == 1:
+                await cls._write_lost(writes[0], e)
+                return
+            _logger.warning(f'Batch of {len(writes)} writes failed {e}, writing them one by one')
+        else:
+            for entry in writes:
+                cls._written(entry)
+            return
+
+        for entry in writes:
+            try:
+                async with async_db_session() as session:
+                    await entry.write(session)
+            except Exception as e:
+                await cls._write_lost(entry, e)
+                continue
+            cls._written(entry)
+
+    @classmethod
+    def _written(cls, entry: _QueuedWrite):
+        if entry.on_written is None:
+            return
+        try:
+            entry.on_written()
+        except Exception as e:
+            _logger.exception(f'Write {entry.name} committed, its callback failed {e}')
+
+    # called while the error is handled
+    @classmethod
+    async def _write_lost(cls, entry: _QueuedWrite, error: Exception):
+        _logger.exception(f'Write {entry.name} failed {error}')
+        if entry.on_failed is None:
+            return
+        try:
+            async with async_db_session() as session:
+                await entry.on_failed(error, session)
+        except Exception as e:
+            _logger.exception(f'Failure of write {entry.name} could not be written {e}')
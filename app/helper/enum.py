@@ -20,3 +20,58 @@ class VbplTab(Enum):
 class VbplType(Enum):
     PHAP_QUY = 'KetQuaTimKiemVanBan'
     HOP_NHAT = 'KetQuaTimKiemHopNhat'
+
+
+class UpstreamHost(Enum):
+    VBPL = 'vbpl'
+    ANLE = 'anle'
+    CONCETTI = 'concetti'
+    TVPL = 'tvpl'
+    LUAT_VN = 'luatvietnam'
+
+
+class CrawlTaskKind(Enum):
+    VBPL_PHAP_QUY = 'vbpl_phap_quy'
+    VBPL_HOP_NHAT = 'vbpl_hop_nhat'
+    ANLE = 'anle'
+    # edges of a source vbpl waiting for their target vbpl
+    VBPL_RELATED_DOC = 'vbpl_related_doc'
+    VBPL_DOC_MAP = 'vbpl_doc_map'
+
+
+class CrawlTaskState(Enum):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
+class ResponseArchiveMode(Enum):
+    OFF = 'off'
+    RECORD = 'record'
+    REPLAY = 'replay'
+
+
+class ParseKind(Enum):
+    VBPL_LISTING = 'vbpl_listing'
+    VBPL_FULL_TEXT = 'vbpl_full_text'
+    VBPL_HOPNHAT_FULL_TEXT = 'vbpl_hopnhat_full_text'
+    VBPL_ATTRIBUTE = 'vbpl_attribute'
+    VBPL_HOPNHAT_ATTRIBUTE = 'vbpl_hopnhat_attribute'
+    VBPL_RELATED_DOC = 'vbpl_related_doc'
+    VBPL_DOC_MAP = 'vbpl_doc_map'
+    VBPL_HOPNHAT_DOC_MAP = 'vbpl_hopnhat_doc_map'
+    TVPL_SEARCH = 'tvpl_search'
+    TVPL_FULL_TEXT = 'tvpl_full_text'
+    LUAT_VN_SEARCH = 'luatvietnam_search'
+    LUAT_VN_SECTOR = 'luatvietnam_sector'
+
+
+class FullTextLineKind(Enum):
+    BIG_PART = 'big_part'
+    CHAPTER = 'chapter'
+    PART = 'part'
+    MINI_PART = 'mini_part'
+    SECTION = 'section'
+    START_SUB_PART = 'start_sub_part'
+    SUB_PART = 'sub_part'
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from typing import Optional
+
+
+# content addressed storage for downloaded documents, every file is kept once under its sha256
+# and the readable paths in documents/pdf, documents/doc are hard links to it
+class FileStore:
+    _blob_folder_path = 'documents/blob'
+    _partial_folder_path = 'documents/blob/partial'
+
+    @classmethod
+    def blob_path(cls, digest: str, extension: str) -> str:
+        return os.path.join(cls._blob_folder_path, digest[:2], f'{digest}{extension.lower()}')
+
+    # partial downloads live inside the store under a stable key so an interrupted transfer can be resumed,
+    # the bytes are in <key>.part and the response validators plus the byte offset in <key>.json
+    @classmethod
+    def partial_path(cls, key: str) -> str:
+        return os.path.join(cls._partial_folder_path, f'{key}.part')
+
+    @classmethod
+    def _partial_state_path(cls, key: str) -> str:
+        return os.path.join(cls._partial_folder_path, f'{key}.json')
+
+    @classmethod
+    def load_partial(cls, key: str) -> Optional[dict]:
+        partial_path = cls.partial_path(key)
+        state_path = cls._partial_state_path(key)
+        if not os.path.exists(partial_path) or not os.path.exists(state_path):
+            cls.discard_partial(key)
+            return None
+
+        try:
+            with open(state_path, 'r') as state_file:
+                state = json.load(state_file)
+        except ValueError:
+            cls.discard_partial(key)
+            return None
+
+        # every byte on disk was written in order, so the file size is always a valid offset to resume from
+        state['offset'] = os.path.getsize(partial_path)
+        return state
+
+    @classmethod
+    def save_partial(cls, key: str, state: dict):
+        os.makedirs(cls._partial_folder_path, exist_ok=True)
+        state_path = cls._partial_state_path(key)
+        temp_state_path = f'{state_path}.{uuid.uuid4().hex}.tmp'
+        with open(temp_state_path, 'w') as state_file:
+            json.dump(state, state_file)
+        os.replace(temp_state_path, state_path)
+
+    @classmethod
+    def discard_partial(cls, key: str):
+        for path in [cls.partial_path(key), cls._partial_state_path(key)]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def hash_file(file_path: str, chunk_size: int = 1024 * 1024):
+        content_hash = hashlib.sha256()
+        with open(file_path, 'rb') as stored_file:
+            for chunk in iter(lambda: stored_file.read(chunk_size), b''):
+                content_hash.update(chunk)
+        return content_hash
+
+    # move a finished download into the store, the partial is dropped if the content is already there
+    @classmethod
+    def put(cls, key: str, digest: str, extension: str) -> str:
+        blob_path = cls.blob_path(digest, extension)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        if not os.path.exists(blob_path):
+            os.replace(cls.partial_path(key), blob_path)
+        cls.discard_partial(key)
+        return blob_path
+
+    # point file_path at the stored blob, replacing whatever was there before
+    @classmethod
+    def link(cls, blob_path: str, file_path: str):
+        if os.path.exists(file_path) and os.path.samefile(blob_path, file_path):
+            return
+
+        temp_link_path = f'{file_path}.{uuid.uuid4().hex}.link'
+        try:
+            os.link(blob_path, temp_link_path)
+        except OSError:
+            # file systems without hard links get a copy instead
+            shutil.copyfile(blob_path, temp_link_path)
+        os.replace(temp_link_path, file_path)
@@ -0,0 +1,96 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Tuple
+
+import aiohttp
+import yarl
+
+from app.helper.custom_exception import CommonException
+from app.helper.enum import UpstreamHost, ResponseArchiveMode
+from app.helper.rate_limiter import RateLimiter
+from app.helper.response_archive import ResponseArchive
+from setting import setting
+
+
+class HttpClient:
+    # one long-lived session (and connection pool) per upstream host, shared by every service.
+    # aiohttp sessions are bound to the loop that created them, so the running loop is part of the key
+    _sessions: Dict[Tuple[asyncio.AbstractEventLoop, str], aiohttp.ClientSession] = {}
+    # separate concurrency budget for file downloads so large attachments can not take over the pool
+    _download_semaphores: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+
+    @classmethod
+    def _session_key(cls, url):
+        if not isinstance(url, yarl.URL):
+            url = yarl.URL(url)
+        return asyncio.get_running_loop(), str(url.origin())
+
+    @classmethod
+    def get_session(cls, url) -> aiohttp.ClientSession:
+        key = cls._session_key(url)
+        session = cls._sessions.get(key)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=setting.HTTP_POOL_LIMIT,
+                limit_per_host=setting.HTTP_POOL_LIMIT_PER_HOST,
+                ttl_dns_cache=setting.HTTP_DNS_CACHE_TTL,
+                keepalive_timeout=setting.HTTP_KEEPALIVE_TIMEOUT,
+            )
+            session = aiohttp.ClientSession(connector=connector, trust_env=True)
+            cls._sessions[key] = session
+        return session
+
+    # send a request on the pooled session of the url's host, the body is read before the
+    # connection goes back to the pool so callers can still use resp.text() / resp.json() afterwards.
+    # depending on RESPONSE_ARCHIVE_MODE the response is also archived, or answered from the archive
+    @classmethod
+    async def request(cls, method: str, url, host: UpstreamHost = None, **kwargs) -> aiohttp.ClientResponse:
+        archive_mode = ResponseArchive.mode()
+        if archive_mode == ResponseArchiveMode.REPLAY:
+            return await ResponseArchive.replay(method, url, kwargs.get('params'), kwargs.get('data'),
+                                                kwargs.get('json'))
+
+        if host is not None:
+            await RateLimiter.acquire(host)
+        session = cls.get_session(url)
+        async with session.request(method, url, **kwargs) as resp:
+            body = await resp.read()
+
+        if archive_mode == ResponseArchiveMode.RECORD:
+            await ResponseArchive.record(method, url, resp, body, kwargs.get('params'), kwargs.get('data'),
+                                         kwargs.get('json'))
+        return resp
+
+    @classmethod
+    def _download_semaphore(cls) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = cls._download_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(setting.DOWNLOAD_CONCURRENCY)
+            cls._download_semaphores[loop] = semaphore
+        return semaphore
+
+    # open a streamed response for a file download, the body is left unread for the caller to consume
+    @classmethod
+    @asynccontextmanager
+    async def stream(cls, method: str, url, host: UpstreamHost = None, **kwargs):
+        # downloads are kept in the file store, not in the response archive
+        if ResponseArchive.mode() == ResponseArchiveMode.REPLAY:
+            raise CommonException(503, f'No download while replaying the response archive {url}')
+        async with cls._download_semaphore():
+            if host is not None:
+                await RateLimiter.acquire(host)
+            session = cls.get_session(url)
+            async with session.request(method, url, **kwargs) as resp:
+                yield resp
+
+    # close every session opened on the running loop
+    @classmethod
+    async def close(cls):
+        loop = asyncio.get_running_loop()
+        for key in [key for key in cls._sessions.keys() if key[0] is loop]:
+            session = cls._sessions.pop(key)
+            await session.close()
+        cls._download_semaphores.pop(loop, None)
+        # let the ssl transports shut down gracefully before the loop is closed
+        await asyncio.sleep(0.25)
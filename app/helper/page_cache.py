@@ -0,0 +1,40 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Hashable, Optional
+
+
+# pages fetched while crawling one document, concurrent requests for the same key share one fetch
+class PageCache:
+    def __init__(self):
+        self._pages: Dict[Hashable, asyncio.Future] = {}
+
+    async def get(self, key: Hashable, fetch):
+        page = self._pages.get(key)
+        if page is None:
+            page = asyncio.ensure_future(fetch())
+            self._pages[key] = page
+        try:
+            return await asyncio.shield(page)
+        except Exception:
+            # do not keep failures around, the next caller can try again
+            if self._pages.get(key) is page:
+                del self._pages[key]
+            raise
+
+
+_current_page_cache: ContextVar[Optional[PageCache]] = ContextVar('current_page_cache', default=None)
+
+
+def get_page_cache() -> Optional[PageCache]:
+    return _current_page_cache.get()
+
+
+# every coroutine started inside the scope, including the ones it gathers, shares the same cache
+@contextmanager
+def page_cache_scope(page_cache: PageCache = None):
+    token = _current_page_cache.set(page_cache if page_cache is not None else PageCache())
+    try:
+        yield _current_page_cache.get()
+    finally:
+        _current_page_cache.reset(token)
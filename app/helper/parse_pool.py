@@ -0,0 +1,36 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from setting import setting
+
+
+class ParsePool:
+    # html parsing is cpu bound, it runs in worker processes so it neither holds the gil
+    # nor blocks the event loop that keeps the network busy. the pool is not bound to a loop
+    # and is shared by every crawl of the process
+    _executor: Optional[ProcessPoolExecutor] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _get_executor(cls) -> ProcessPoolExecutor:
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ProcessPoolExecutor(max_workers=setting.PARSE_WORKERS)
+            return cls._executor
+
+    # func and its arguments / result cross a process boundary, they have to be picklable
+    @classmethod
+    async def run(cls, func, *args):
+        if setting.PARSE_WORKERS <= 0:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls._get_executor(), func, *args)
+
+    # blocking map for offline jobs, every item is submitted right away and the results come back in order
+    @classmethod
+    def map(cls, func, items, chunksize: int = 1):
+        if setting.PARSE_WORKERS <= 0:
+            return map(func, items)
+        return cls._get_executor().map(func, items, chunksize=chunksize)
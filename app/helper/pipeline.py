@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from typing import AsyncIterable, Awaitable, Callable, Iterable, List, Union
+
+_logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class Stage:
+    # handler takes one item and returns None, one item or a list of items for the next stage
+    def __init__(self, name: str, handler: Callable[[object], Awaitable], workers: int, queue_size: int):
+        self.name = name
+        self.handler = handler
+        self.workers = max(workers, 1)
+        self.queue_size = queue_size
+        self.processed = 0
+        self.failed = 0
+
+
+# chain of stages connected by bounded queues, every stage has its own workers and items flow
+# through continuously, a full queue makes the stage before it wait so memory stays bounded.
+# on_failure is awaited with the item and the error when a stage fails for an item
+class Pipeline:
+    def __init__(self, name: str, stages: List[Stage], logger: logging.Logger = None,
+                 on_failure: Callable[[object, Exception], Awaitable] = None):
+        self._name = name
+        self._stages = stages
+        self._logger = logger or _logger
+        self._on_failure = on_failure
+
+    # items is read lazily, it may be an async iterable
+    async def run(self, items: Union[Iterable, AsyncIterable]):
+        queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in self._stages]
+
+        async def feed():
+            if hasattr(items, '__aiter__'):
+                async for item in items:
+                    await queues[0].put(item)
+            else:
+                for item in items:
+                    await queues[0].put(item)
+
+        async def work(index: int, stage: Stage):
+            in_queue = queues[index]
+            out_queue = queues[index + 1] if index + 1 < len(queues) else None
+            while True:
+                item = await in_queue.get()
+                if item is _STOP:
+                    return
+                try:
+                    results = await stage.handler(item)
+                    stage.processed += 1
+                except Exception as e:
+                    stage.failed += 1
+                    self._logger.exception(f'{self._name} stage {stage.name} failed for {item} {e}')
+                    if self._on_failure is not None:
+                        try:
+                            await self._on_failure(item, e)
+                        except Exception as failure_error:
+                            self._logger.exception(f'{self._name} failure handler failed for {item} '
+                                                   f'{failure_error}')
+                    continue
+
+                if out_queue is None or results is None:
+                    continue
+                if not isinstance(results, list):
+                    results = [results]
+                for result in results:
+                    await out_queue.put(result)
+
+        feed_task = asyncio.ensure_future(feed())
+        worker_tasks = [[asyncio.ensure_future(work(index, stage)) for _ in range(stage.workers)]
+                        for index, stage in enumerate(self._stages)]
+        try:
+            await feed_task
+            # a stage is finished once everything upstream is, then its workers are told to stop
+            for index, stage in enumerate(self._stages):
+                for _ in range(stage.workers):
+                    await queues[index].put(_STOP)
+                await asyncio.gather(*worker_tasks[index])
+                self._logger.info(f'{self._name} stage {stage.name} done, '
+                                  f'processed: {stage.processed}, failed: {stage.failed}')
+        except BaseException:
+            feed_task.cancel()
+            for tasks in worker_tasks:
+                for task in tasks:
+                    task.cancel()
+            raise
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+import time
+from typing import Dict
+
+from app.helper.enum import UpstreamHost
+from setting import setting
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self._rate = rate
+        self._burst = max(burst, 1)
+        self._tokens = float(self._burst)
+        self._updated_at = time.monotonic()
+        # a thread lock instead of an asyncio one, the bucket is shared by coroutines of different loops
+        self._lock = threading.Lock()
+
+    # take a token and return how long the caller has to wait for it,
+    # the token count goes negative when callers are queued up behind each other
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated_at) * self._rate)
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self._rate
+
+    async def acquire(self):
+        if self._rate <= 0:
+            return
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class RateLimiter:
+    _buckets: Dict[UpstreamHost, TokenBucket] = {
+        UpstreamHost.VBPL: TokenBucket(setting.VBPL_RATE_LIMIT, setting.VBPL_RATE_BURST),
+        UpstreamHost.ANLE: TokenBucket(setting.ANLE_RATE_LIMIT, setting.ANLE_RATE_BURST),
+        UpstreamHost.CONCETTI: TokenBucket(setting.CONCETTI_RATE_LIMIT, setting.CONCETTI_RATE_BURST),
+        UpstreamHost.TVPL: TokenBucket(setting.TVPL_RATE_LIMIT, setting.TVPL_RATE_BURST),
+        UpstreamHost.LUAT_VN: TokenBucket(setting.LUAT_VN_RATE_LIMIT, setting.LUAT_VN_RATE_BURST),
+    }
+
+    # wait until a request to the given host is allowed, only the calling coroutine is suspended
+    @classmethod
+    async def acquire(cls, host: UpstreamHost):
+        await cls._buckets[host].acquire()
@@ -0,0 +1,202 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import yarl
+from multidict import CIMultiDict, CIMultiDictProxy, MultiDict
+
+from app.helper.custom_exception import CommonException
+from app.helper.enum import ResponseArchiveMode
+from setting import setting
+
+# the body is archived decoded, so the headers describing the transfer are not kept
+_dropped_headers = ('Content-Encoding', 'Transfer-Encoding', 'Content-Length')
+
+
+# the part of aiohttp.ClientResponse the crawlers use, answered from an archived record
+class ArchivedResponse:
+    def __init__(self, method: str, url: str, status: int, reason: str, headers: CIMultiDict, body: bytes):
+        self.method = method
+        self.url = yarl.URL(url)
+        self.status = status
+        self.reason = reason
+        self.headers = CIMultiDictProxy(headers)
+        self._body = body
+
+    @property
+    def content_type(self):
+        return self.headers.get('Content-Type', 'application/octet-stream').split(';')[0].strip().lower()
+
+    @property
+    def content_length(self):
+        return len(self._body)
+
+    def get_encoding(self):
+        for param in self.headers.get('Content-Type', '').split(';')[1:]:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'charset' and value.strip():
+                return value.strip().strip('"')
+        return 'utf-8'
+
+    async def read(self):
+        return self._body
+
+    async def text(self, encoding: str = None, errors: str = 'strict'):
+        return self._body.decode(encoding or self.get_encoding(), errors)
+
+    async def json(self, *, encoding: str = None, loads=json.loads, content_type: Optional[str] = 'application/json'):
+        stripped = self._body.strip()
+        if not stripped:
+            return None
+        return loads(stripped.decode(encoding or self.get_encoding()))
+
+    def release(self):
+        pass
+
+
+# append only archive of the raw responses of every request sent through HttpClient.request, so parsers can be
+# re-run and benchmarked without the network. every run of the process appends to its own <run>.warc.gz, one gzip
+# member per WARC response record, and to <run>.idx, one json line per record with its request key and offset.
+# in replay mode every request is answered with the latest archived response for its key
+class ResponseArchive:
+    _archive_folder_path = 'documents/archive'
+    _lock = threading.Lock()
+    _run_name: Optional[str] = None
+    # request key -> (archive path, offset, length) of its latest record
+    _index: Optional[Dict[str, Tuple[str, int, int]]] = None
+
+    @classmethod
+    def mode(cls) -> ResponseArchiveMode:
+        return ResponseArchiveMode(setting.RESPONSE_ARCHIVE_MODE)
+
+    # method, url with the query the request is sent with and a digest of the body if it has one
+    @classmethod
+    def request_key(cls, method: str, url, params=None, data=None, json_data=None) -> str:
+        url = yarl.URL(url)
+        if params:
+            # the query is extended the way aiohttp does it
+            query = MultiDict(url.query)
+            query.extend(url.with_query(params).query)
+            url = url.with_query(query)
+        key = f'{method.upper()} {url}'
+
+        body = None
+        if json_data is not None:
+            body = json.dumps(json_data, sort_keys=True).encode()
+        elif isinstance(data, str):
+            body = data.encode()
+        elif isinstance(data, bytes):
+            body = data
+        elif isinstance(data, dict):
+            body = json.dumps(data, sort_keys=True).encode()
+        if body:
+            key = f'{key} {hashlib.sha256(body).hexdigest()[:16]}'
+        return key
+
+    @classmethod
+    def _archive_path(cls, name: str) -> str:
+        return os.path.join(cls._archive_folder_path, f'{name}.warc.gz')
+
+    @classmethod
+    def _index_path(cls, name: str) -> str:
+        return os.path.join(cls._archive_folder_path, f'{name}.idx')
+
+    @classmethod
+    def _build_record(cls, key: str, url: str, status: int, reason: str, headers, body: bytes) -> bytes:
+        http_head = [f'HTTP/1.1 {status} {reason or ""}']
+        for name, value in headers.items():
+            if name not in _dropped_headers:
+                http_head.append(f'{name}: {value}')
+        http_head.append(f'Content-Length: {len(body)}')
+        http_block = ('\r\n'.join(http_head) + '\r\n\r\n').encode() + body
+
+        warc_head = [
+            'WARC/1.0',
+            'WARC-Type: response',
+            f'WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>',
+            f'WARC-Date: {datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")}',
+            f'WARC-Target-URI: {url}',
+            f'WARC-Request-Key: {key}',
+            'Content-Type: application/http; msgtype=response',
+            f'Content-Length: {len(http_block)}',
+        ]
+        return ('\r\n'.join(warc_head) + '\r\n\r\n').encode() + http_block + b'\r\n\r\n'
+
+    @classmethod
+    def _append(cls, key: str, url: str, status: int, reason: str, headers, body: bytes):
+        record = gzip.compress(cls._build_record(key, url, status, reason, headers, body))
+        with cls._lock:
+            if cls._run_name is None:
+                os.makedirs(cls._archive_folder_path, exist_ok=True)
+                cls._run_name = f'{datetime.now().strftime("%Y%m%d-%H%M%S")}-{os.getpid()}'
+            archive_path = cls._archive_path(cls._run_name)
+            with open(archive_path, 'ab') as archive_file:
+                offset = archive_file.tell()
+                archive_file.write(record)
+            with open(cls._index_path(cls._run_name), 'a') as index_file:
+                index_file.write(json.dumps({'key': key, 'url': url, 'status': status,
+                                             'fetched_at': datetime.now().isoformat(),
+                                             'offset': offset, 'length': len(record)}) + '\n')
+
+    @classmethod
+    async def record(cls, method: str, url, resp, body: bytes, params=None, data=None, json_data=None):
+        key = cls.request_key(method, url, params, data, json_data)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, cls._append, key, str(resp.url), resp.status, resp.reason,
+                                   resp.headers, body)
+
+    # runs are read in name order, which is the order they were recorded in, so the latest fetch wins
+    @classmethod
+    def _load_index(cls) -> Dict[str, Tuple[str, int, int]]:
+        with cls._lock:
+            if cls._index is not None:
+                return cls._index
+
+            index = {}
+            if os.path.isdir(cls._archive_folder_path):
+                for file_name in sorted(os.listdir(cls._archive_folder_path)):
+                    if not file_name.endswith('.idx'):
+                        continue
+                    archive_path = cls._archive_path(file_name[:-len('.idx')])
+                    with open(os.path.join(cls._archive_folder_path, file_name), 'r') as index_file:
+                        for line in index_file:
+                            try:
+                                entry = json.loads(line)
+                            except ValueError:
+                                # the last line of a run that was killed while writing
+                                continue
+                            index[entry['key']] = (archive_path, entry['offset'], entry['length'])
+            cls._index = index
+            return index
+
+    @classmethod
+    def _read(cls, method: str, key: str) -> ArchivedResponse:
+        location = cls._load_index().get(key)
+        if location is None:
+            raise CommonException(404, f'{key} is not in the response archive')
+
+        archive_path, offset, length = location
+        with open(archive_path, 'rb') as archive_file:
+            archive_file.seek(offset)
+            record = gzip.decompress(archive_file.read(length))
+
+        warc_head, _, http_block = record.partition(b'\r\n\r\n')
+        warc_headers = dict(line.split(': ', 1) for line in warc_head.decode().split('\r\n')[1:])
+        http_block = http_block[:int(warc_headers['Content-Length'])]
+        http_head, _, body = http_block.partition(b'\r\n\r\n')
+        status_line, *header_lines = http_head.decode().split('\r\n')
+        _, status, reason = (status_line.split(' ', 2) + [''])[:3]
+        headers = CIMultiDict(line.split(': ', 1) for line in header_lines)
+        return ArchivedResponse(method, warc_headers['WARC-Target-URI'], int(status), reason, headers, body)
+
+    @classmethod
+    async def replay(cls, method: str, url, params=None, data=None, json_data=None) -> ArchivedResponse:
+        key = cls.request_key(method, url, params, data, json_data)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, cls._read, method, key)
@@ -1,6 +1,8 @@
 import re
 from datetime import datetime
 
+from bs4 import SoupStrainer
+
 
 def convert_str_to_camel(snake_str):
     parts = snake_str.split('_')
@@ -102,3 +104,23 @@ def check_header_tag(tag):
     if re.search('h\\d+', tag):
         return True
     return False
+
+
+# parse only the subtrees rooted at the given (tag, attribute, value) targets instead of the whole page,
+# a class target matches any of the node's classes like soup.find does
+def target_strainer(*targets):
+    def match(name, attrs):
+        for tag, attr, value in targets:
+            if name != tag or attrs.get(attr) is None:
+                continue
+            attr_value = attrs.get(attr)
+            if attr == 'class':
+                if isinstance(attr_value, str):
+                    attr_value = attr_value.split()
+                if value in attr_value:
+                    return True
+            elif attr_value == value:
+                return True
+        return False
+
+    return SoupStrainer(match)
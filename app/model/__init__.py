@@ -1,2 +1,4 @@
 from .vbpl import Vbpl, VbplDocMap, VbplRelatedDocument, VbplToanVan
 from .anle import Anle, AnleSection
+from .document import DocumentManifest
+from .job import JobCheckpoint, CrawlTask
@@ -18,6 +18,7 @@ class Anle(BareBaseModel):
     sector = Column(String(100), nullable=True)
     publication_decision = Column(String(255), nullable=True)
     org_pdf_link = Column(String(1000), nullable=True)
+    fingerprint = Column(String(64), nullable=True)
 
     # relationship
     section = relationship("AnleSection", foreign_keys='AnleSection.anle_id',
@@ -0,0 +1,22 @@
+from app.model.base import BareBaseModel
+from sqlalchemy import Column, String, Text, BigInteger
+
+
+class DocumentManifest(BareBaseModel):
+    __tablename__ = 'document_manifest'
+
+    url = Column(Text, nullable=False)
+    url_hash = Column(String(64), nullable=False, unique=True)
+    file_name = Column(String(1000), nullable=True)
+    etag = Column(String(255), nullable=True)
+    last_modified = Column(String(100), nullable=True)
+    content_length = Column(BigInteger, nullable=True)
+    content_hash = Column(String(64), nullable=True)
+
+    def __str__(self):
+        return (f'Url: {self.url},\n'
+                f'File name: {self.file_name},\n'
+                f'ETag: {self.etag},\n'
+                f'Last modified: {self.last_modified},\n'
+                f'Content length: {self.content_length},\n'
+                f'Content hash: {self.content_hash}')
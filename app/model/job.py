@@ -0,0 +1,41 @@
+from app.model.base import BareBaseModel
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index, UniqueConstraint
+from sqlalchemy.dialects.mysql import LONGTEXT
+
+
+class JobCheckpoint(BareBaseModel):
+    __tablename__ = 'job_checkpoint'
+
+    name = Column(String(100), nullable=False, unique=True)
+    last_id = Column(Integer, nullable=False, default=0)
+
+    def __str__(self):
+        return (f'Name: {self.name},\n'
+                f'Last id: {self.last_id}')
+
+
+# one document of a crawl, see CrawlFrontier
+class CrawlTask(BareBaseModel):
+    __tablename__ = 'crawl_task'
+    __table_args__ = (
+        UniqueConstraint('kind', 'target_id'),
+        Index('ix_crawl_task_kind_state', 'kind', 'state'),
+    )
+
+    kind = Column(String(50), nullable=False)
+    target_id = Column(String(100), nullable=False)
+    state = Column(String(20), nullable=False, default='pending')
+    attempts = Column(Integer, nullable=False, default=0)
+    lease_token = Column(String(32), nullable=True, index=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    next_attempt_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    # json of what is already known about the target, see CrawlFrontier.payload
+    payload = Column(LONGTEXT, nullable=True)
+
+    def __str__(self):
+        return (f'Kind: {self.kind},\n'
+                f'Target id: {self.target_id},\n'
+                f'State: {self.state},\n'
+                f'Attempts: {self.attempts},\n'
+                f'Last error: {self.last_error}')
@@ -22,6 +22,8 @@ class Vbpl(BareBaseModel):
     sector = Column(String(100), nullable=True)
     html = Column(LONGTEXT, nullable=True)
     org_pdf_link = Column(Text, nullable=True)
+    content_hash = Column(String(64), nullable=True)
+    fingerprint = Column(String(64), nullable=True)
 
     # relationship
     toan_van = relationship("VbplToanVan", foreign_keys='VbplToanVan.vbpl_id',
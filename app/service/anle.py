@@ -1,17 +1,24 @@
 import asyncio
+import hashlib
 import os
 import re
 from datetime import datetime
+from functools import partial
 from http import HTTPStatus
 from typing import Dict
-import aiohttp
 import pdfplumber
 from bs4 import BeautifulSoup
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.helper.constant import AnleSectionConst
+from app.helper.crawl_frontier import CrawlFrontier
 from app.helper.custom_exception import CommonException
-from app.helper.db import LocalSession
+from app.helper.db import LocalSession, async_db_session
+from app.helper.db_writer import DbWriter
+from app.helper.enum import UpstreamHost, CrawlTaskKind
+from app.helper.http_client import HttpClient
 from app.helper.logger import setup_logger
-from app.helper.utility import get_html_node_text
+from app.helper.utility import get_html_node_text, target_strainer
 from app.model import Anle
 from app.model import AnleSection
 from app.service.get_pdf import get_document, is_pdf
@@ -24,6 +31,9 @@ _logger = setup_logger('anle_logger', 'log/anle.log')
 
 class AnleService:
     _api_base_url = setting.ANLE_BASE_URL
+    # only the nodes the crawlers read are built into the tree
+    _listing_strainer = target_strainer(('span', 'style', 'color: #2673b4'), ('a', 'class', 'thuoctinh-hover'))
+    _info_strainer = target_strainer(('div', 'id', 'thuoctinh'), ('div', 'id', 'filetaive'))
 
     @classmethod
     def get_headers(cls) -> Dict:
@@ -37,10 +47,8 @@ class AnleService:
         max_retries = 3
         for retry in range(max_retries):
             try:
-                async with aiohttp.ClientSession(trust_env=True) as session:
-                    async with session.request(method, url, params=query_params, json=json_data, timeout=timeout,
-                                               headers=headers, verify_ssl=False) as resp:
-                        await resp.text()
+                resp = await HttpClient.request(method, url, host=UpstreamHost.ANLE, params=query_params,
+                                                json=json_data, timeout=timeout, headers=headers, ssl=False)
                 if resp.status != HTTPStatus.OK:
                     _logger.warning(
                         "Calling Anle URL: %s, request_param %s, request_payload %s, http_code: %s, response: %s" %
@@ -56,18 +64,21 @@ class AnleService:
                 else:
                     raise e
 
+    # the anle and its sections are written in one transaction once every file is processed, with the done state
+    # of the task it was claimed from. force crawls an anle whose fingerprint did not change as well
     @classmethod
-    async def crawl_anle_info(cls, anle: Anle):
+    async def crawl_anle_info(cls, anle: Anle, task=None, force: bool = False):
         url = f'/webcenter/portal/anle/chitietanle'
         query_params = {
             'dDocName': anle.doc_id,
             '_afrWindowMode': 0
         }
+        writes = []
         try:
             resp = await cls.call(method='GET', url_path=url, query_params=query_params)
             if resp.status == HTTPStatus.OK:
                 resp_text = await resp.text()
-                soup = BeautifulSoup(resp_text, 'lxml')
+                soup = BeautifulSoup(resp_text, 'lxml', parse_only=cls._info_strainer)
                 anle_info_node = soup.find('div', {'id': 'thuoctinh'})
                 table_headers = anle_info_node.find_all('th')
 
@@ -111,52 +122,99 @@ class AnleService:
                     if link_node is not None:
                         pdf_links.append(setting.ANLE_BASE_URL + link_node.get('href'))
 
-                file_links = []
-                if len(pdf_links) > 0:
-                    for link in pdf_links:
-                        file_link = get_document(link, False)
-                        file_links.append(file_link)
-                    anle.org_pdf_link = ' '.join(pdf_links)
-                    anle.file_link = ' '.join(file_links)
-
-                update_data = {
-                    'file_link': anle.file_link,
-                    'serial_number': anle.serial_number,
-                    'expiration_date': anle.expiration_date,
-                    'org_pdf_link': anle.org_pdf_link,
-                    'doc_id': anle.doc_id,
-                    'title': anle.title,
-                    'adoption_date': anle.adoption_date,
-                    'publication_date': anle.publication_date,
-                    'publication_decision': anle.publication_decision,
-                    'application_date': anle.application_date,
-                    'sector': anle.sector,
-                    'state': anle.state
-                }
-
-                # add to db
-                with LocalSession.begin() as session:
-                    statement = session.query(Anle).filter(Anle.doc_id == anle.doc_id)
-                    check_anle = session.execute(statement).first()
-                    if check_anle is not None:
-                        # upsert anle
-                        session.query(Anle).filter(Anle.doc_id == anle.doc_id).update(update_data)
-                    else:
-                        session.add(anle)
-
-                for file_link in file_links:
-                    file_id, anle_context, anle_solution, anle_content = cls.process_anle(file_link)
-                    cls.to_anle_section_db(file_id, anle_context, anle_solution, anle_content)
+                # an anle whose attributes and files are the ones it was written with is left as it is
+                anle.fingerprint = cls.get_fingerprint(anle, regex_dict.keys(), pdf_links)
+                async with async_db_session() as session:
+                    stored_fingerprint = (await session.execute(
+                        select(Anle.fingerprint).where(Anle.doc_id == anle.doc_id))).scalars().first()
+                if not force and stored_fingerprint == anle.fingerprint:
+                    _logger.info(f'Unchanged anle {anle.doc_id}')
+                else:
+                    writes = await cls.get_anle_writes(anle, pdf_links)
 
         except Exception as e:
             _logger.exception(f'Crawl anle info {anle.id} {e}')
             raise CommonException(500, 'Crawl anle thuoc tinh')
 
+        if task is not None:
+            await CrawlFrontier.complete(task, *writes)
+        elif len(writes) > 0:
+            await DbWriter.submit(DbWriter.chain(*writes), f'anle {anle.doc_id}')
+
+    # download and process the files of a changed anle, the writes of the anle and of its sections
+    @classmethod
+    async def get_anle_writes(cls, anle: Anle, pdf_links):
+        file_links = []
+        if len(pdf_links) > 0:
+            for link in pdf_links:
+                file_link = await get_document(link, False)
+                file_links.append(file_link)
+            anle.org_pdf_link = ' '.join(pdf_links)
+            anle.file_link = ' '.join(file_links)
+
+        update_data = {
+            'file_link': anle.file_link,
+            'serial_number': anle.serial_number,
+            'expiration_date': anle.expiration_date,
+            'org_pdf_link': anle.org_pdf_link,
+            'doc_id': anle.doc_id,
+            'title': anle.title,
+            'adoption_date': anle.adoption_date,
+            'publication_date': anle.publication_date,
+            'publication_decision': anle.publication_decision,
+            'application_date': anle.application_date,
+            'sector': anle.sector,
+            'state': anle.state,
+            'fingerprint': anle.fingerprint
+        }
+
+        # the sections come after the anle so they find it
+        writes = [partial(cls.write_anle, update_data)]
+        for file_link in file_links:
+            file_id, anle_context, anle_solution, anle_content = cls.process_anle(file_link)
+            writes.append(partial(cls.to_anle_section_db, file_id, anle_context, anle_solution, anle_content))
+        return writes
+
+    # hash of the attribute values and the file links of the detail page
+    @classmethod
+    def get_fingerprint(cls, anle: Anle, fields, pdf_links):
+        values = [getattr(anle, field) for field in fields] + pdf_links
+        return hashlib.sha256(repr(values).encode('utf-8')).hexdigest()
+
     @classmethod
     async def crawl_all_anle(cls):
+        listing = None
+        await CrawlFrontier.release_running(CrawlTaskKind.ANLE)
+        if await CrawlFrontier.has_unfinished(CrawlTaskKind.ANLE):
+            _logger.info('Resuming the unfinished anle crawl tasks')
+        else:
+            # the anle are crawled while the listing is still enqueuing them
+            listing = asyncio.ensure_future(cls.list_all_anle())
+
+        # a failed anle is left to a later claim instead of stopping the crawl
+        progress = 0
+        try:
+            async for task in CrawlFrontier.claim_all(CrawlTaskKind.ANLE, listing):
+                try:
+                    await cls.crawl_anle_info(Anle(doc_id=task.target_id), task)
+                except Exception as e:
+                    await CrawlFrontier.fail(task, e)
+                    continue
+
+                # update progress
+                progress += 1
+                _logger.info(f"Progress: {progress} anle crawled")
+            if listing is not None:
+                await listing
+        finally:
+            if listing is not None and not listing.done():
+                listing.cancel()
+
+    # enqueue the listed anle as crawl tasks
+    @classmethod
+    async def list_all_anle(cls):
         url = f'/webcenter/portal/anle/anle'
         current_page = 1
-        progress = 0
         while True:
             query_params = {
                 'selectedPage': current_page,
@@ -167,21 +225,15 @@ class AnleService:
             try:
                 resp = await cls.call(method='GET', url_path=url, query_params=query_params)
                 if resp.status == HTTPStatus.OK:
-                    soup = BeautifulSoup(await resp.text(), 'lxml')
+                    soup = BeautifulSoup(await resp.text(), 'lxml', parse_only=cls._listing_strainer)
                     total_records = soup.find('span', style="color: #2673b4").text
                     anle_attribute_list = soup.find_all('a', {
                         'class': 'thuoctinh-hover'
                     }, href=True)
 
-                    for attr in anle_attribute_list:
-                        href = attr['href']
-                        anle_id = href.split('=')[-1]
-                        new_anle = Anle(doc_id=anle_id)
-                        await cls.crawl_anle_info(new_anle)
-
-                        # update progress
-                        progress += 1
-                        _logger.info(f"Progress: {progress}/{total_records}")
+                    await CrawlFrontier.enqueue(CrawlTaskKind.ANLE,
+                                                {attr['href'].split('=')[-1]: None for attr in anle_attribute_list})
+                    _logger.info(f"Page {current_page} listed {len(anle_attribute_list)}/{total_records} anle")
 
                 if int(total_records) <= current_page * 10:
                     break
@@ -257,27 +309,37 @@ class AnleService:
         return extracted_content
 
     @classmethod
-    def to_anle_section_db(cls, file_id: str, anle_context: str, anle_solution: str, anle_content: str):
-        with LocalSession.begin() as session:
-            target_anle = session.query(Anle).filter(Anle.doc_id == file_id).all()
-            for anle in target_anle:
-                check_anle_section = session.query(AnleSection).filter(AnleSection.anle_id == anle.id).first()
-                if check_anle_section:
-                    # upsert anle section
-                    update_data = {
-                        'context': anle_context,
-                        'solution': anle_solution,
-                        'content': anle_content,
-                    }
-                    session.query(AnleSection).filter(AnleSection.anle_id == anle.id).update(update_data)
-                else:
-                    new_anle_section = AnleSection(
-                        anle_id=anle.id,
-                        context=anle_context,
-                        solution=anle_solution,
-                        content=anle_content,
-                    )
-                    session.add(new_anle_section)
+    async def write_anle(cls, anle_data, session: AsyncSession):
+        check_anle = (await session.execute(select(Anle.id).where(Anle.doc_id == anle_data['doc_id']))).first()
+        if check_anle is not None:
+            # upsert anle
+            await session.execute(update(Anle).where(Anle.doc_id == anle_data['doc_id']).values(**anle_data))
+        else:
+            session.add(Anle(**anle_data))
+
+    @classmethod
+    async def to_anle_section_db(cls, file_id: str, anle_context: str, anle_solution: str, anle_content: str,
+                                 session: AsyncSession):
+        target_anle_ids = (await session.execute(select(Anle.id).where(Anle.doc_id == file_id))).scalars().all()
+        for anle_id in target_anle_ids:
+            check_anle_section = (await session.execute(
+                select(AnleSection.id).where(AnleSection.anle_id == anle_id))).first()
+            if check_anle_section:
+                # upsert anle section
+                update_data = {
+                    'context': anle_context,
+                    'solution': anle_solution,
+                    'content': anle_content,
+                }
+                await session.execute(update(AnleSection).where(AnleSection.anle_id == anle_id).values(**update_data))
+            else:
+                new_anle_section = AnleSection(
+                    anle_id=anle_id,
+                    context=anle_context,
+                    solution=anle_solution,
+                    content=anle_content,
+                )
+                session.add(new_anle_section)
 
     @classmethod
     async def fetch_anle_by_id(cls, anle_id):
@@ -1,14 +1,28 @@
-import logging
+import asyncio
+import hashlib
 import os
 import re
 import urllib.parse
-import requests
-import requests.packages
-import urllib3.exceptions
+from http import HTTPStatus
+from typing import Dict, Tuple
 
+import aiohttp
+from sqlalchemy import select, update
+
+from app.helper.db import async_db_session
+from app.helper.enum import UpstreamHost
+from app.helper.file_store import FileStore
+from app.helper.http_client import HttpClient
 from app.helper.logger import setup_logger
+from app.model import DocumentManifest
+from setting import setting
 
 _logger = setup_logger('pdf_logger', 'log/pdf.log')
+# no total limit so large files are not cut off, only a stalled connection is
+_download_timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=setting.DOWNLOAD_READ_TIMEOUT)
+# document url -> (stored blob path, file name) for everything already downloaded by this process
+_fetched_documents: Dict[str, Tuple[str, str]] = {}
+_in_flight_documents: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Future] = {}
 
 
 def get_anle_file_name(response):
@@ -21,57 +35,237 @@ def get_anle_file_name(response):
     return None
 
 
-def get_document(document_url, is_vbpl, file_id=None, is_pdf_file=None):
+async def get_document(document_url, is_vbpl, file_id=None, is_pdf_file=None):
     document_url = clean_extension(document_url)
     try:
-        pdf_folder_path = 'documents/pdf/anle_pdf'
-        doc_folder_path = 'documents/doc/anle_doc'
-        if is_vbpl:
-            pdf_folder_path = 'documents/pdf/vbpl_pdf'
-            doc_folder_path = 'documents/doc/vbpl_doc'
+        fetched_document = _fetched_documents.get(document_url)
+        # files already transferred during this run only need their link
+        if fetched_document is None or not os.path.exists(fetched_document[0]):
+            # the partial file is keyed by url, so concurrent requests for one url share a single transfer
+            in_flight_key = (asyncio.get_running_loop(), document_url)
+            in_flight = _in_flight_documents.get(in_flight_key)
+            if in_flight is None:
+                in_flight = asyncio.ensure_future(fetch_document(document_url, is_vbpl, file_id, is_pdf_file))
+                _in_flight_documents[in_flight_key] = in_flight
+                in_flight.add_done_callback(lambda _: _in_flight_documents.pop(in_flight_key, None))
+            fetched_document = await asyncio.shield(in_flight)
+            if fetched_document is None:
+                return None
+            _fetched_documents[document_url] = fetched_document
+
+        blob_path, document_file_name = fetched_document
+        file_path = get_document_file_path(document_url, document_file_name, is_vbpl, file_id, is_pdf_file)
+        FileStore.link(blob_path, file_path)
+        return file_path
 
-        os.makedirs(pdf_folder_path, exist_ok=True)
-        os.makedirs(doc_folder_path, exist_ok=True)
+    except Exception as e:
+        _logger.exception(f'Error processing URL: {document_url} {e}')
 
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        response = requests.get(document_url, verify=False)
 
-        if is_vbpl:
-            file_name_from_url = os.path.basename(document_url)
-            document_file_name = urllib.parse.unquote_plus(file_name_from_url)
-        else:
-            document_file_name = get_anle_file_name(response).replace(" ", "_")
-            if not document_file_name:
-                raise Exception(f"Failed to get file name for URL: {document_url}")
+class PartialDownloadError(Exception):
+    pass
+
+
+# download a document into the file store unless the manifest shows the stored copy is still current,
+# returns (blob path, file name) or None if the document does not exist
+async def fetch_document(document_url, is_vbpl, file_id=None, is_pdf_file=None):
+    host = get_document_host(document_url, is_vbpl)
+    manifest = await get_document_manifest(document_url)
+
+    stored_blob_path = None
+    conditional_headers = {}
+    if manifest is not None and manifest.content_hash is not None and manifest.file_name is not None:
+        stored_file_path = get_document_file_path(document_url, manifest.file_name, is_vbpl, file_id, is_pdf_file)
+        stored_blob_path = FileStore.blob_path(manifest.content_hash, os.path.splitext(stored_file_path)[1])
+        if not os.path.exists(stored_blob_path):
+            stored_blob_path = None
+
+    if stored_blob_path is not None:
+        if manifest.etag:
+            conditional_headers['If-None-Match'] = manifest.etag
+        if manifest.last_modified:
+            conditional_headers['If-Modified-Since'] = manifest.last_modified
+
+        # no validators to send, a HEAD request tells whether the size changed
+        if not conditional_headers:
+            head_response = await HttpClient.request('HEAD', document_url, host=host, timeout=_download_timeout,
+                                                     ssl=False, allow_redirects=True)
+            if head_response.status == 200 and head_response.content_length is not None \
+                    and head_response.content_length == manifest.content_length:
+                _logger.info(f'Unchanged document {document_url}')
+                return stored_blob_path, manifest.file_name
 
-        decoded_file_name = urllib.parse.unquote(document_file_name)
+    max_retries = setting.DOWNLOAD_MAX_RETRIES
+    for retry in range(max_retries):
+        try:
+            return await download_document(document_url, host, is_vbpl, file_id, is_pdf_file, manifest,
+                                           stored_blob_path, conditional_headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError, PartialDownloadError) as e:
+            if retry == max_retries - 1:
+                raise e
+            # whatever arrived so far stays on disk, the next attempt only asks for the rest
+            _logger.warning(f'Download interrupted {document_url}, error {e}, '
+                            f'resuming... (Attempt {retry + 1}/{max_retries})')
+            await asyncio.sleep(2 ** retry)
 
-        if file_id is None:
-            file_id = get_file_id(document_url, is_vbpl)
-            file_name = f"({file_id})-{decoded_file_name.replace(' ', '_').replace('%', '_')}"
+
+async def download_document(document_url, host, is_vbpl, file_id, is_pdf_file, manifest, stored_blob_path,
+                            conditional_headers):
+    url_hash = get_url_hash(document_url)
+    # byte counts have to match what is on the server, so ask for the file without transfer compression
+    request_headers = {'Accept-Encoding': 'identity', **conditional_headers}
+
+    partial = FileStore.load_partial(url_hash)
+    if partial is not None and partial['offset'] > 0:
+        # only ask for the missing bytes, If-Range makes the server send the whole file if it changed meanwhile
+        request_headers = {'Accept-Encoding': 'identity', 'Range': f"bytes={partial['offset']}-"}
+        validator = partial.get('etag') or partial.get('last_modified')
+        if validator:
+            request_headers['If-Range'] = validator
+
+    async with HttpClient.stream('GET', document_url, host=host, headers=request_headers,
+                                 timeout=_download_timeout, ssl=False) as response:
+        if response.status == 304 and stored_blob_path is not None:
+            _logger.info(f'Unchanged document {document_url}')
+            return stored_blob_path, manifest.file_name
+        elif response.status == 404:
+            FileStore.discard_partial(url_hash)
+            return None
+        elif response.status == HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE:
+            FileStore.discard_partial(url_hash)
+            raise PartialDownloadError(f'Partial download rejected by server {document_url}')
+        elif response.status == HTTPStatus.PARTIAL_CONTENT and partial is not None and partial['offset'] > 0:
+            is_resumed = True
+            _logger.info(f"Resuming download {document_url} from byte {partial['offset']}")
+            total_length = get_content_range_total(response)
+            if total_length is not None:
+                partial['total_length'] = total_length
+        elif response.status == 200:
+            is_resumed = False
+            partial = {
+                'url': document_url,
+                'file_name': get_document_file_name(document_url, is_vbpl, response),
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'total_length': response.content_length,
+                'offset': 0,
+            }
         else:
-            if is_pdf_file:
-                file_name = f"{file_id}.pdf"
-            else:
-                file_name = f"{file_id}.doc"
+            raise Exception(f"Failed to download PDF from url {response.status}")
+
+        FileStore.save_partial(url_hash, partial)
+        with open(FileStore.partial_path(url_hash), 'ab' if is_resumed else 'wb') as partial_file:
+            try:
+                async for chunk in response.content.iter_chunked(setting.DOWNLOAD_CHUNK_SIZE):
+                    partial_file.write(chunk)
+            finally:
+                partial_file.flush()
+                partial['offset'] = partial_file.tell()
+                FileStore.save_partial(url_hash, partial)
+
+    # a partial that does not add up to the announced size or hash is corrupt and has to be fetched again
+    partial_path = FileStore.partial_path(url_hash)
+    content_length = os.path.getsize(partial_path)
+    if partial['total_length'] is not None and content_length != partial['total_length']:
+        FileStore.discard_partial(url_hash)
+        raise PartialDownloadError(f"Downloaded size {content_length} does not match {partial['total_length']}")
 
-        if is_pdf(file_name):
-            file_path = os.path.join(pdf_folder_path, file_name)
+    content_hash = (await asyncio.get_running_loop().run_in_executor(None, FileStore.hash_file,
+                                                                     partial_path)).hexdigest()
+    if manifest is not None and manifest.etag is not None and manifest.etag == partial['etag'] \
+            and manifest.content_hash is not None and manifest.content_hash != content_hash:
+        FileStore.discard_partial(url_hash)
+        raise PartialDownloadError(f'Downloaded content hash {content_hash} does not match {manifest.content_hash}')
+
+    document_file_name = partial['file_name']
+    file_path = get_document_file_path(document_url, document_file_name, is_vbpl, file_id, is_pdf_file)
+    blob_path = FileStore.put(url_hash, content_hash, os.path.splitext(file_path)[1])
+
+    await save_document_manifest(document_url, {
+        'file_name': document_file_name,
+        'etag': partial['etag'],
+        'last_modified': partial['last_modified'],
+        'content_length': content_length,
+        'content_hash': content_hash,
+    })
+    return blob_path, document_file_name
+
+
+def get_content_range_total(response):
+    content_range = response.headers.get('Content-Range')
+    if content_range:
+        match_total = re.search(r'/(\d+)$', content_range)
+        if match_total:
+            return int(match_total.group(1))
+    return None
+
+
+async def get_document_manifest(document_url):
+    async with async_db_session() as session:
+        return (await session.execute(select(DocumentManifest).where(
+            DocumentManifest.url_hash == get_url_hash(document_url)))).scalars().first()
+
+
+async def save_document_manifest(document_url, manifest_data):
+    url_hash = get_url_hash(document_url)
+    async with async_db_session() as session:
+        check_manifest = (await session.execute(
+            select(DocumentManifest.id).where(DocumentManifest.url_hash == url_hash))).first()
+        if check_manifest is not None:
+            # upsert manifest
+            await session.execute(update(DocumentManifest).where(DocumentManifest.url_hash == url_hash)
+                                  .values(**manifest_data))
         else:
-            file_path = os.path.join(doc_folder_path, file_name)
+            session.add(DocumentManifest(url=document_url, url_hash=url_hash, **manifest_data))
 
-        if response.status_code == 200:
-            with open(file_path, 'wb') as pdf_file:
-                pdf_file.write(response.content)
-        elif response.status_code == 404:
-            return None
+
+def get_url_hash(document_url):
+    return hashlib.sha256(document_url.encode('utf-8')).hexdigest()
+
+
+def get_document_file_name(document_url, is_vbpl, response):
+    if is_vbpl:
+        file_name_from_url = os.path.basename(document_url)
+        return urllib.parse.unquote_plus(file_name_from_url)
+
+    document_file_name = get_anle_file_name(response)
+    if not document_file_name:
+        raise Exception(f"Failed to get file name for URL: {document_url}")
+    return document_file_name.replace(" ", "_")
+
+
+def get_document_file_path(document_url, document_file_name, is_vbpl, file_id=None, is_pdf_file=None):
+    pdf_folder_path = 'documents/pdf/anle_pdf'
+    doc_folder_path = 'documents/doc/anle_doc'
+    if is_vbpl:
+        pdf_folder_path = 'documents/pdf/vbpl_pdf'
+        doc_folder_path = 'documents/doc/vbpl_doc'
+
+    os.makedirs(pdf_folder_path, exist_ok=True)
+    os.makedirs(doc_folder_path, exist_ok=True)
+
+    decoded_file_name = urllib.parse.unquote(document_file_name)
+
+    if file_id is None:
+        file_id = get_file_id(document_url, is_vbpl)
+        file_name = f"({file_id})-{decoded_file_name.replace(' ', '_').replace('%', '_')}"
+    else:
+        if is_pdf_file:
+            file_name = f"{file_id}.pdf"
         else:
-            raise Exception(f"Failed to download PDF from url {response.status_code}")
+            file_name = f"{file_id}.doc"
 
-        return file_path
+    if is_pdf(file_name):
+        return os.path.join(pdf_folder_path, file_name)
+    return os.path.join(doc_folder_path, file_name)
 
-    except Exception as e:
-        _logger.exception(f'Error processing URL: {document_url} {e}')
+
+def get_document_host(document_url, is_vbpl):
+    if not is_vbpl:
+        return UpstreamHost.ANLE
+    if setting.CONCETTI_BASE_URL and document_url.startswith(setting.CONCETTI_BASE_URL):
+        return UpstreamHost.CONCETTI
+    return UpstreamHost.VBPL
 
 
 def is_pdf(file_name):
@@ -1,51 +1,89 @@
 import asyncio
+import hashlib
 import os
-import re
-import copy
+import time
 from datetime import datetime
+from functools import partial
 from http import HTTPStatus
 from typing import Dict
-import aiohttp
 import yarl
-import concurrent.futures
-from app.entity.vbpl import VbplFullTextField
+from app.entity.vbpl import VbplCrawlItem, VbplListingProgress
 from app.helper.custom_exception import CommonException
-from app.helper.enum import VbplTab, VbplType
-from time import sleep
+from app.helper.enum import VbplTab, VbplType, UpstreamHost, ParseKind, CrawlTaskKind
+from app.helper.http_client import HttpClient
 from app.helper.logger import setup_logger
+from app.helper.page_cache import get_page_cache, page_cache_scope
+from app.helper.parse_pool import ParsePool
 from app.model import VbplToanVan, Vbpl, VbplRelatedDocument, VbplDocMap
 from app.model.vbpl import VbplSubPart
 from app.service.get_pdf import get_document
+from app.service.vbpl_index import KnownVbplIndex
+from app.service.vbpl_parser import VbplParser
 from setting import setting
-from app.helper.utility import convert_dict_to_pascal, get_html_node_text, convert_datetime_to_str, \
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.helper.utility import convert_dict_to_pascal, convert_datetime_to_str, \
     concetti_query_params_url_encode, convert_str_to_datetime, check_header_tag
 from app.helper.db import LocalSession
+from app.helper.db_writer import DbWriter
+from app.helper.concurrency import gather_or_cancel
+from app.helper.crawl_frontier import CrawlFrontier
+from app.helper.pipeline import Pipeline, Stage
 from urllib.parse import quote
 import Levenshtein
 from bs4 import BeautifulSoup
 import py7zr
 
 _logger = setup_logger('vbpl_logger', 'log/vbpl.log')
-find_id_regex = '(?<=ItemID=)\\d+'
 
 
 class VbplService:
     _api_base_url = setting.VBPl_BASE_URL
     _default_row_per_page = 130
-    _max_threads = 8
-    _find_big_part_regex = '^((Phần)|(Phần thứ)) (nhất|hai|ba|bốn|năm|sáu|bảy|tám|chín|mười)$'
-    _find_section_regex = '^((Điều)|(Điều thứ)) \\d+'
-    _find_chapter_regex = '^Chương [IVX]+'
-    _find_part_regex = '^Mục [IVX]+'
-    _find_part_regex_2 = '^Mu.c [IVX]+'
-    _find_mini_part_regex = '^Tiểu mục [IVX]+'
-    _find_start_sub_part_regex = '^PHỤ LỤC$'
-    _find_sub_part_regex = '^Phụ(\\s)*(\\n)*lục [IVX]+'
-    _empty_related_doc_msg = 'Nội dung đang cập nhật'
+    # listing pages walked when the total number of vbpl can not be read
+    _max_listing_pages = 1000
     _concetti_base_url = setting.CONCETTI_BASE_URL
     _tvpl_base_url = setting.TVPL_BASE_URL
     _cong_bao_base_url = setting.CONG_BAO_BASE_URL
     _luat_vn_base_url = setting.LUAT_VN_BASE_URL
+    _tab_parse_kinds = {
+        VbplTab.FULL_TEXT: ParseKind.VBPL_FULL_TEXT,
+        VbplTab.FULL_TEXT_HOP_NHAT: ParseKind.VBPL_HOPNHAT_FULL_TEXT,
+        VbplTab.FULL_TEXT_HOP_NHAT_2: ParseKind.VBPL_HOPNHAT_FULL_TEXT,
+        VbplTab.ATTRIBUTE: ParseKind.VBPL_ATTRIBUTE,
+        VbplTab.ATTRIBUTE_HOP_NHAT: ParseKind.VBPL_HOPNHAT_ATTRIBUTE,
+        VbplTab.RELATED_DOC: ParseKind.VBPL_RELATED_DOC,
+        VbplTab.DOC_MAP: ParseKind.VBPL_DOC_MAP,
+        VbplTab.DOC_MAP_HOP_NHAT: ParseKind.VBPL_HOPNHAT_DOC_MAP,
+    }
+    _fingerprint_tabs = {
+        VbplType.PHAP_QUY: (VbplTab.ATTRIBUTE, VbplTab.FULL_TEXT),
+        VbplType.HOP_NHAT: (VbplTab.ATTRIBUTE_HOP_NHAT, VbplTab.FULL_TEXT_HOP_NHAT),
+    }
+    _crawl_task_kinds = {
+        VbplType.PHAP_QUY: CrawlTaskKind.VBPL_PHAP_QUY,
+        VbplType.HOP_NHAT: CrawlTaskKind.VBPL_HOP_NHAT,
+    }
+    # rows per multi-row upsert statement, keeps a statement with long sections under max_allowed_packet
+    _bulk_write_rows = 500
+    # filled by the column defaults on insert, a duplicate only refreshes updated_at
+    _vbpl_timestamp_columns = ('created_at', 'updated_at', 'deleted_at')
+    _vbpl_upsert_columns = ('file_link', 'title', 'doc_type', 'serial_number', 'issuance_date', 'effective_date',
+                            'expiration_date', 'gazette_date', 'state', 'issuing_authority', 'applicable_information',
+                            'html', 'org_pdf_link', 'sub_title', 'sector', 'content_hash', 'fingerprint')
+    _toan_van_upsert_columns = ('section_name', 'section_content', 'chapter_number', 'chapter_name', 'part_number',
+                                'part_name', 'mini_part_number', 'mini_part_name', 'big_part_number',
+                                'big_part_name')
+    _sub_part_upsert_columns = ('sub_section_title', 'sub_section_part_title')
+    # edges whose target vbpl is not stored yet are held back in a crawl task of their source, per table
+    _held_edge_kinds = {
+        CrawlTaskKind.VBPL_RELATED_DOC: (VbplRelatedDocument, 'related_id'),
+        CrawlTaskKind.VBPL_DOC_MAP: (VbplDocMap, 'doc_map_id'),
+    }
+    # edge write stats per table, see log_edge_write
+    _edge_write_stats = {}
+    _edge_stats_log_every = 100
 
     @classmethod
     def get_headers(cls) -> Dict:
@@ -57,10 +95,8 @@ class VbplService:
         url = cls._api_base_url + url_path
         headers = cls.get_headers()
         try:
-            async with aiohttp.ClientSession(trust_env=True) as session:
-                async with session.request(method, url, params=query_params, json=json_data, timeout=timeout,
-                                           headers=headers) as resp:
-                    await resp.text()
+            resp = await HttpClient.request(method, url, host=UpstreamHost.VBPL, params=query_params,
+                                            json=json_data, timeout=timeout, headers=headers)
             if resp.status != HTTPStatus.OK:
                 _logger.warning(
                     "Calling VBPL URL: %s, request_param %s, request_payload %s, http_code: %s, response: %s" %
@@ -71,6 +107,70 @@ class VbplService:
                             f" request_params {str(query_params)}, request_body {str(json_data)},"
                             f" error {str(e)}")
 
+    # fetch a vbpl tab page, inside a document crawl each (tab, ItemID) page is fetched once.
+    # html is None unless the page was fetched
+    @classmethod
+    async def get_tab_html(cls, tab: VbplTab, item_id):
+        async def fetch_tab_html():
+            resp = await cls.call(method='GET', url_path=f'/TW/Pages/vbpq-{tab.value}.aspx',
+                                  query_params={'ItemID': item_id})
+            html = None
+            if resp is not None and resp.status == HTTPStatus.OK:
+                html = await resp.text()
+            return resp, html
+
+        page_cache = get_page_cache()
+        if page_cache is None:
+            return await fetch_tab_html()
+        return await page_cache.get(('html', tab, str(item_id)), fetch_tab_html)
+
+    # fetch and parse a vbpl tab page into its record, inside a document crawl each (tab, ItemID) page
+    # is fetched and parsed once
+    @classmethod
+    async def get_tab_page(cls, tab: VbplTab, item_id):
+        async def fetch_tab_page():
+            resp, html = await cls.get_tab_html(tab, item_id)
+            page = None
+            if html is not None:
+                page = await cls.parse_page(cls._tab_parse_kinds[tab], html)
+            return resp, page
+
+        page_cache = get_page_cache()
+        if page_cache is None:
+            return await fetch_tab_page()
+        return await page_cache.get((tab, str(item_id)), fetch_tab_page)
+
+    # fingerprint of the attribute and full text tab, None when one of them could not be fetched.
+    # the attribute record is the one the detail stage reads from the page cache afterwards
+    @classmethod
+    async def get_fingerprint(cls, vbpl_id, vbpl_type: VbplType):
+        attribute_tab, fulltext_tab = cls._fingerprint_tabs[vbpl_type]
+        (_, attribute_page), fulltext_fingerprint = await gather_or_cancel(
+            cls.get_tab_page(attribute_tab, vbpl_id),
+            cls.get_fulltext_fingerprint(fulltext_tab, vbpl_id)
+        )
+        if attribute_page is None or fulltext_fingerprint is None:
+            return None
+        digest = hashlib.sha256(repr(attribute_page).encode('utf-8'))
+        digest.update(repr(fulltext_fingerprint).encode('utf-8'))
+        return digest.hexdigest()
+
+    # digests of the full text nodes of the page, or its record for a page that is small anyway
+    @classmethod
+    async def get_fulltext_fingerprint(cls, tab: VbplTab, vbpl_id):
+        kind = cls._tab_parse_kinds[tab]
+        if not VbplParser.has_node_fingerprint(kind):
+            _, page = await cls.get_tab_page(tab, vbpl_id)
+            return page
+        _, html = await cls.get_tab_html(tab, vbpl_id)
+        if html is None:
+            return None
+        return await ParsePool.run(VbplParser.node_fingerprint, kind, html)
+
+    @classmethod
+    async def parse_page(cls, kind: ParseKind, html: str):
+        return await ParsePool.run(VbplParser.parse, kind, html)
+
     # get total number of vbpl
     @classmethod
     async def get_total_doc(cls, vbpl_type: VbplType):
@@ -91,378 +191,377 @@ class VbplService:
             _logger.exception(f'Get total vbpl doc {e}')
             raise CommonException(500, 'Get total doc')
 
+    # the listing fills the crawl_task frontier while the documents are crawled from the tasks claimed out of it,
+    # a crawl that finds unfinished tasks of its type resumes them instead of listing again.
+    # an incremental crawl walks the newest first listing until VBPL_INCREMENTAL_STOP_PAGES pages in a row
+    # listed only known vbpl, the known vbpl on the pages before still go through the fingerprint check
     @classmethod
-    async def crawl_all_vbpl(cls, vbpl_type: VbplType):
-        # total_doc = await cls.get_total_doc(vbpl_type)
-        total_pages = 1000
-        full_id_list = []
-
-        # crawl all vbpl info and full text using multi thread
-        with concurrent.futures.ThreadPoolExecutor(max_workers=cls._max_threads) as executor:
-            info_and_fulltext_coroutines = [cls.crawl_vbpl_in_one_page(page, full_id_list, vbpl_type) for page in
-                                            range(1, total_pages + 1)]
-            executor.map(asyncio.run, info_and_fulltext_coroutines)
-
-        # crawl vbpl relate doc using multi thread
-        with concurrent.futures.ThreadPoolExecutor(max_workers=cls._max_threads) as executor:
-            related_doc_coroutines = [cls.crawl_vbpl_related_doc(doc_id) for doc_id in full_id_list]
-            executor.map(asyncio.run, related_doc_coroutines)
-
-        # crawl vbpl doc map using multi thread
-        with concurrent.futures.ThreadPoolExecutor(max_workers=cls._max_threads) as executor:
-            doc_map_coroutines = [cls.crawl_vbpl_doc_map(doc_id, vbpl_type) for doc_id in full_id_list]
-            executor.map(asyncio.run, doc_map_coroutines)
-
+    async def crawl_all_vbpl(cls, vbpl_type: VbplType, incremental: bool = False):
+        await KnownVbplIndex.load()
+        task_kind = cls._crawl_task_kinds[vbpl_type]
+        listing = None
+        await CrawlFrontier.release_running(task_kind)
+        if await CrawlFrontier.has_unfinished(task_kind):
+            _logger.info(f'Resuming the unfinished vbpl {vbpl_type.name.lower()} crawl tasks')
+        else:
+            listing = asyncio.ensure_future(cls.list_all_vbpl(vbpl_type, incremental))
+
+        # documents flow through the stages one by one instead of waiting for the whole corpus,
+        # every queue is bounded so a slow stage holds back the ones before it
+        queue_size = setting.VBPL_PIPELINE_QUEUE_SIZE
+        pipeline = Pipeline(f'vbpl {vbpl_type.name.lower()}', [
+            Stage('detail', cls.crawl_vbpl_detail, setting.VBPL_DETAIL_WORKERS, queue_size),
+            Stage('enrichment', cls.enrich_vbpl, setting.VBPL_ENRICHMENT_WORKERS, queue_size),
+            Stage('relation', cls.crawl_vbpl_relation, setting.VBPL_RELATION_WORKERS, queue_size),
+            Stage('persist', cls.persist_vbpl, setting.VBPL_PERSIST_WORKERS, queue_size),
+        ], _logger, on_failure=lambda crawl_item, e: CrawlFrontier.fail(crawl_item.task, e))
+        try:
+            await pipeline.run(cls.claim_vbpl_crawl_items(vbpl_type, listing))
+            if listing is not None:
+                await listing
+        finally:
+            if listing is not None and not listing.done():
+                listing.cancel()
+        await cls.write_held_back_edges()
+
+    # enqueue the listed vbpl as crawl tasks
     @classmethod
-    async def crawl_vbpl_in_one_page(cls, page, full_id_list, vbpl_type: VbplType):
+    async def list_all_vbpl(cls, vbpl_type: VbplType, incremental: bool = False):
+        try:
+            total_doc = await cls.get_total_doc(vbpl_type)
+        except CommonException:
+            total_doc = None
+        if total_doc is None:
+            total_pages = cls._max_listing_pages
+        else:
+            total_pages = (total_doc + cls._default_row_per_page - 1) // cls._default_row_per_page
+        progress = VbplListingProgress(total_pages,
+                                       setting.VBPL_INCREMENTAL_STOP_PAGES if incremental else None)
+        task_kind = cls._crawl_task_kinds[vbpl_type]
+
+        async def enqueue_listing_page(page):
+            crawl_items = await cls.crawl_vbpl_listing_page(page, vbpl_type, progress)
+            # the listing title and sub title are kept with the task, the attribute tab does not always have them
+            await CrawlFrontier.enqueue(task_kind, {crawl_item.vbpl.id: {
+                'title': crawl_item.vbpl.title,
+                'sub_title': crawl_item.vbpl.sub_title,
+            } for crawl_item in crawl_items})
+
+        pipeline = Pipeline(f'vbpl {vbpl_type.name.lower()} listing', [
+            # pages are only handed out when a listing worker is free, so an incremental crawl stops promptly
+            Stage('listing', enqueue_listing_page, setting.VBPL_LISTING_WORKERS, setting.VBPL_LISTING_WORKERS),
+        ], _logger)
+        await pipeline.run(progress.pages())
+        if progress.stop_page is not None:
+            _logger.info(f'Incremental vbpl {vbpl_type.name.lower()} crawl stopped after page {progress.stop_page} '
+                         f'of {total_pages}')
+
+    # the claimed crawl tasks of the type as pipeline items, claimed until the listing is done
+    @classmethod
+    async def claim_vbpl_crawl_items(cls, vbpl_type: VbplType, listing: asyncio.Future = None):
+        async for task in CrawlFrontier.claim_all(cls._crawl_task_kinds[vbpl_type], listing):
+            listed_vbpl = CrawlFrontier.payload(task)
+            yield VbplCrawlItem(Vbpl(
+                id=int(task.target_id),
+                title=listed_vbpl.get('title'),
+                sub_title=listed_vbpl.get('sub_title')
+            ), vbpl_type, task)
+
+    # list the vbpl of one search page
+    @classmethod
+    async def crawl_vbpl_listing_page(cls, page, vbpl_type: VbplType, progress: VbplListingProgress = None):
+        # handed out before the incremental crawl found where to stop
+        if progress is not None and progress.is_past_stop(page):
+            return []
+
         query_params = convert_dict_to_pascal({
             'row_per_page': cls._default_row_per_page,
             'page': page
         })
-        progress = 0
-        max_progress = cls._default_row_per_page
 
         try:
             resp = await cls.call(method='GET',
                                   url_path=f'/VBQPPL_UserControls/Publishing_22/TimKiem/p_{vbpl_type.value}.aspx?IsVietNamese=True',
                                   query_params=query_params)
+            crawl_items = []
             if resp.status == HTTPStatus.OK:
-                soup = BeautifulSoup(await resp.text(), 'lxml')
-                titles = soup.find_all('p', {"class": "title"})
-                sub_titles = soup.find_all('div', {'class': "des"})
-                id_set = set()
-
-                for j in range(len(titles)):
-                    title = titles[j]
-                    sub_title = sub_titles[j]
-
-                    link = title.find('a')
-                    doc_id = int(re.findall(find_id_regex, link.get('href'))[0])
-
-                    _logger.info(f"Crawling vbpl {doc_id}")
-                    id_set.add(doc_id)
-                    full_id_list.append(doc_id)
+                for listed_vbpl in await cls.parse_page(ParseKind.VBPL_LISTING, await resp.text()):
+                    doc_id = listed_vbpl['id']
 
-                    # check for existing vbpl
-                    with LocalSession.begin() as session:
-                        check_vbpl = session.query(Vbpl).filter(Vbpl.id == doc_id).first()
-
-                    # if it does not exist, add to db
-                    new_vbpl = Vbpl(
+                    # known vbpl are crawled again as well, they are upserted
+                    crawl_items.append(VbplCrawlItem(Vbpl(
                         id=doc_id,
-                        title=get_html_node_text(link),
-                        sub_title=get_html_node_text(sub_title)
-                    )
-                    vbpl_fulltext = None
-                    vbpl_sub_part = None
-
-                    if vbpl_type == VbplType.PHAP_QUY:
-                        await cls.crawl_vbpl_phapquy_info(new_vbpl)
-                        await cls.crawl_vbpl_pdf(new_vbpl, vbpl_type)
-                        vbpl_fulltext, vbpl_sub_part = await cls.crawl_vbpl_phapquy_fulltext(new_vbpl)
-                        await cls.search_concetti(new_vbpl)
-                        await cls.enrich_vbpl_sector(new_vbpl)
-
-                    elif vbpl_type == VbplType.HOP_NHAT:
-                        await cls.crawl_vbpl_hopnhat_info(new_vbpl)
-                        await cls.crawl_vbpl_pdf(new_vbpl, vbpl_type)
-                        await cls.crawl_vbpl_hopnhat_fulltext(new_vbpl)
-                        await cls.search_concetti(new_vbpl)
-                        await cls.enrich_vbpl_sector(new_vbpl)
-                        vbpl_fulltext, vbpl_sub_part = await cls.additional_html_crawl(new_vbpl)
-
-                    # add to db
-                    await cls.push_vbpl_to_db(doc_id, new_vbpl, vbpl_fulltext, vbpl_sub_part)
-
-                    # update progress
-                    progress += 1
-                    _logger.info(f'Finished crawling vbpl {doc_id}')
-                    _logger.info(f"Page {page} progress: {progress}/{max_progress}")
-            sleep(3)
+                        title=listed_vbpl['title'],
+                        sub_title=listed_vbpl['sub_title']
+                    ), vbpl_type))
+
+                _logger.info(f"Page {page} listed {len(crawl_items)} vbpl")
+                if progress is not None:
+                    progress.record_page(page, all(KnownVbplIndex.contains(crawl_item.vbpl.id)
+                                                   for crawl_item in crawl_items))
+            return crawl_items
         except Exception as e:
             _logger.exception(f'Crawl all doc in page {page} {e}')
             raise CommonException(500, 'Crawl all doc')
 
+    # crawl every tab and enrichment of one vbpl and save it, whatever its fingerprint
     @classmethod
-    async def push_vbpl_to_db(cls, doc_id, new_vbpl, vbpl_fulltext, vbpl_sub_part):
-        with LocalSession.begin() as session:
-            check_vbpl = session.query(Vbpl).filter(Vbpl.id == doc_id).first()
-            if check_vbpl is not None:
-                # upsert vbpl
-                update_vbpl = {
-                    'file_link': new_vbpl.file_link,
-                    'title': new_vbpl.title,
-                    'doc_type': new_vbpl.doc_type,
-                    'serial_number': new_vbpl.serial_number,
-                    'issuance_date': new_vbpl.issuance_date,
-                    'effective_date': new_vbpl.effective_date,
-                    'expiration_date': new_vbpl.expiration_date,
-                    'gazette_date': new_vbpl.gazette_date,
-                    'state': new_vbpl.state,
-                    'issuing_authority': new_vbpl.issuing_authority,
-                    'applicable_information': new_vbpl.applicable_information,
-                    'html': new_vbpl.html,
-                    'org_pdf_link': new_vbpl.org_pdf_link,
-                    'sub_title': new_vbpl.sub_title,
-                    'sector': new_vbpl.sector,
-                }
-                session.query(Vbpl).filter(Vbpl.id == doc_id).update(update_vbpl)
-            else:
-                session.add(new_vbpl)
-
-            if vbpl_fulltext is not None:
-                for fulltext_section in vbpl_fulltext:
-                    check_fulltext = session.query(VbplToanVan).filter(
-                        VbplToanVan.vbpl_id == fulltext_section.vbpl_id,
-                        VbplToanVan.section_number == fulltext_section.section_number).first()
-                    if check_fulltext is None:
-                        session.add(fulltext_section)
-                    else:
-                        # upsert toan van
-                        updated_toan_van = {
-                            'section_name': fulltext_section.section_name,
-                            'section_content': fulltext_section.section_content,
-                            'chapter_number': fulltext_section.chapter_number,
-                            'chapter_name': fulltext_section.chapter_name,
-                            'part_number': fulltext_section.part_number,
-                            'part_name': fulltext_section.part_name,
-                            'mini_part_number': fulltext_section.mini_part_number,
-                            'mini_part_name': fulltext_section.mini_part_name,
-                            'big_part_number': fulltext_section.big_part_number,
-                            'big_part_name': fulltext_section.big_part_name,
-                        }
-                        session.query(VbplToanVan).filter(
-                            VbplToanVan.vbpl_id == fulltext_section.vbpl_id,
-                            VbplToanVan.section_number == fulltext_section.section_number).update(updated_toan_van)
-            if vbpl_sub_part is not None:
-                for sub_part in vbpl_sub_part:
-                    check_sub_part = session.query(VbplSubPart).filter(
-                        VbplSubPart.vbpl_id == sub_part.vbpl_id,
-                        VbplSubPart.sub_section_part_number == sub_part.sub_section_part_number).first()
-                    if check_sub_part is None:
-                        session.add(sub_part)
-                    else:
-                        # upsert sub parts
-                        updated_sub_part = {
-                            'sub_section_title': sub_part.sub_section_title,
-                            'sub_section_part_title': sub_part.sub_section_part_title
-                        }
-                        session.query(VbplSubPart).filter(
-                            VbplSubPart.vbpl_id == sub_part.vbpl_id,
-                            VbplSubPart.sub_section_part_number == sub_part.sub_section_part_number).update(updated_sub_part)
-
+    async def crawl_vbpl_document(cls, new_vbpl: Vbpl, vbpl_type: VbplType):
+        crawl_item = VbplCrawlItem(new_vbpl, vbpl_type, force=True)
+        await cls.crawl_vbpl_detail(crawl_item)
+        await cls.enrich_vbpl(crawl_item)
+        await cls.persist_vbpl(crawl_item)
+
+    # the attribute tab comes first, the pdf and full text only depend on it and run concurrently.
+    # a vbpl whose fingerprint is the one it was written with is marked unchanged here, nothing of it is parsed,
+    # enriched, downloaded or written again. the fingerprint does not cover the related doc and doc map tabs,
+    # later documents amend them, so they are still crawled and written by the last stages
     @classmethod
-    def update_vbpl_phapquy_fulltext(cls, line, fulltext_obj: VbplFullTextField):
-        line_content = get_html_node_text(line)
-        check = False
-
-        if re.search(cls._find_big_part_regex, line_content):
-            current_big_part_number_search = re.search('(?<=Phần thứ ).+', line_content)
-            fulltext_obj.current_big_part_number = line_content[current_big_part_number_search.span()[0]:]
-            next_node = line.find_next_sibling('p')
-            fulltext_obj.current_big_part_name = get_html_node_text(next_node)
-
-            fulltext_obj.reset_part()
-            check = True
-
-        if re.search(cls._find_chapter_regex, line_content):
-            fulltext_obj.current_chapter_number = re.findall('(?<=Chương ).+', line_content)[0]
-            next_node = line.find_next_sibling('p')
-            fulltext_obj.current_chapter_name = get_html_node_text(next_node)
-
-            fulltext_obj.reset_part()
-            check = True
-
-        if re.search(cls._find_part_regex, line_content) or re.search(cls._find_part_regex_2, line_content):
-            if re.search(cls._find_part_regex, line_content):
-                fulltext_obj.current_part_number = re.findall('(?<=Mục ).+', line_content)[0]
-            else:
-                fulltext_obj.current_part_number = re.findall('(?<=Mu.c ).+', line_content)[0]
-            next_node = line.find_next_sibling('p')
-            fulltext_obj.current_part_name = get_html_node_text(next_node)
-            check = True
-
-        if re.search(cls._find_mini_part_regex, line_content):
-            fulltext_obj.current_mini_part_number = re.findall('(?<=Tiểu mục ).+', line_content)[0]
-            next_node = line.find_next_sibling('p')
-            fulltext_obj.current_mini_part_name = get_html_node_text(next_node)
-            check = True
-
-        return fulltext_obj, check
-
+    async def crawl_vbpl_detail(cls, crawl_item: VbplCrawlItem):
+        new_vbpl = crawl_item.vbpl
+        _logger.info(f"Crawling vbpl {new_vbpl.id}")
+        with page_cache_scope(crawl_item.page_cache):
+            new_vbpl.fingerprint = await cls.get_fingerprint(new_vbpl.id, crawl_item.vbpl_type)
+            if not crawl_item.force and new_vbpl.fingerprint is not None \
+                    and new_vbpl.fingerprint == KnownVbplIndex.fingerprint(new_vbpl.id):
+                _logger.info(f'Unchanged vbpl {new_vbpl.id}, only its relations are crawled again')
+                crawl_item.unchanged = True
+                return crawl_item
+
+            if crawl_item.vbpl_type == VbplType.PHAP_QUY:
+                await cls.crawl_vbpl_phapquy_info(new_vbpl)
+
+                _, (crawl_item.fulltext, crawl_item.sub_part) = await gather_or_cancel(
+                    cls.crawl_vbpl_pdf(new_vbpl, crawl_item.vbpl_type),
+                    cls.crawl_vbpl_phapquy_fulltext(new_vbpl)
+                )
+
+            elif crawl_item.vbpl_type == VbplType.HOP_NHAT:
+                await cls.crawl_vbpl_hopnhat_info(new_vbpl)
+
+                async def crawl_hopnhat_pdf():
+                    await cls.crawl_vbpl_pdf(new_vbpl, crawl_item.vbpl_type)
+                    await cls.crawl_vbpl_hopnhat_fulltext(new_vbpl)
+
+                _, (crawl_item.fulltext, crawl_item.sub_part) = await gather_or_cancel(
+                    crawl_hopnhat_pdf(),
+                    cls.additional_html_crawl(new_vbpl)
+                )
+        return crawl_item
+
+    # concetti only falls back to its own pdf when the detail stage found none on vbpl
     @classmethod
-    def process_html_full_text(cls, vbpl: Vbpl, lines):
-        vbpl_fulltext_obj = VbplFullTextField()
-        results = []
-
-        # init vbpl fulltext object
-        for line in lines:
-            # if line.name not in ['p', 'div'] or not check_header_tag(line.name):
-            #     continue
-
-            line_content = get_html_node_text(line)
-            if re.search(cls._find_section_regex, line_content):
-                break
-
-            vbpl_fulltext_obj, check = cls.update_vbpl_phapquy_fulltext(line, vbpl_fulltext_obj)
-            if check:
-                continue
-
-        # process fulltext line by line
-        for line_index, line in enumerate(lines):
-            # if line.name not in ['p', 'div'] or not check_header_tag(line.name):
-            #     continue
-
-            line_content = get_html_node_text(line)
-
-            if re.search(cls._find_start_sub_part_regex, line_content):
-                new_vbpl_sub_part = cls.process_vbpl_sub_part(vbpl.id, lines[line_index:])
-                return results, new_vbpl_sub_part
+    async def enrich_vbpl(cls, crawl_item: VbplCrawlItem):
+        if crawl_item.unchanged:
+            return crawl_item
+        with page_cache_scope(crawl_item.page_cache):
+            await gather_or_cancel(
+                cls.search_concetti(crawl_item.vbpl),
+                cls.enrich_vbpl_sector(crawl_item.vbpl)
+            )
+        return crawl_item
 
-            if re.search(cls._find_section_regex, line_content):
-                section_number_search = re.search('\\b\\d+', line_content)
-                section_number = int(section_number_search.group())
+    # related documents and doc map point at other vbpl, their rows are written with the source vbpl
+    @classmethod
+    async def crawl_vbpl_relation(cls, crawl_item: VbplCrawlItem):
+        with page_cache_scope(crawl_item.page_cache):
+            crawl_item.related_doc_rows, crawl_item.doc_map_rows = await gather_or_cancel(
+                cls.crawl_vbpl_related_doc(crawl_item.vbpl.id),
+                cls.crawl_vbpl_doc_map(crawl_item.vbpl.id, crawl_item.vbpl_type)
+            )
+        return crawl_item
 
-                section_name = line_content[section_number_search.span()[1]:]
-                section_name_refined = None
-                section_name_search = re.search('\\b\\w', section_name)
-                if section_name_search:
-                    section_name_refined = section_name[section_name_search.span()[0]:]
+    # the last stage, everything crawled for the document is written in one transaction together with the done
+    # state of its task, a lost write fails the task. an unchanged vbpl only has its edges written
+    @classmethod
+    async def persist_vbpl(cls, crawl_item: VbplCrawlItem):
+        new_vbpl = crawl_item.vbpl
+        writes = []
+        index_update = None
+        if not crawl_item.unchanged:
+            vbpl_write, index_update = cls.get_vbpl_write(new_vbpl.id, new_vbpl, crawl_item.fulltext,
+                                                          crawl_item.sub_part)
+            writes.append(vbpl_write)
+        if crawl_item.related_doc_rows is not None:
+            writes.append(partial(cls.write_vbpl_edges, CrawlTaskKind.VBPL_RELATED_DOC, new_vbpl.id,
+                                  crawl_item.related_doc_rows))
+        if crawl_item.doc_map_rows is not None:
+            writes.append(partial(cls.write_vbpl_edges, CrawlTaskKind.VBPL_DOC_MAP, new_vbpl.id,
+                                  crawl_item.doc_map_rows))
+        # the rows are captured by the writes, only the tab pages are still referenced
+        crawl_item.fulltext = None
+        crawl_item.sub_part = None
+        crawl_item.related_doc_rows = None
+        crawl_item.doc_map_rows = None
+
+        # the known index only gets the new fingerprint once it is committed, a task that failed anywhere
+        # before is crawled again in full on its retry
+        if crawl_item.task is None:
+            await DbWriter.submit(DbWriter.chain(*writes), f'vbpl {new_vbpl.id}', on_written=index_update)
+        else:
+            await CrawlFrontier.complete(crawl_item.task, *writes, on_written=index_update)
+        _logger.info(f'Finished crawling vbpl {new_vbpl.id}')
 
-                current_fulltext_config = copy.deepcopy(vbpl_fulltext_obj)
-                content = []
-                if section_name_refined is not None and len(section_name_refined) >= 400:
-                    content.append(section_name_refined)
-                    section_name_refined = None
+    # the rows are taken from the orm objects now and written behind the crawl by DbWriter.
+    # returns the write and the update of the known index that goes with it
+    @classmethod
+    def get_vbpl_write(cls, doc_id, new_vbpl, vbpl_fulltext, vbpl_sub_part):
+        vbpl_row = {column: value for column, value in cls.row_values(Vbpl, new_vbpl).items()
+                    if column not in cls._vbpl_timestamp_columns}
+        vbpl_row['id'] = doc_id
+        vbpl_row['content_hash'] = cls.get_content_hash(new_vbpl)
+        section_rows = [cls.row_values(VbplToanVan, section) for section in vbpl_fulltext or []]
+        sub_part_rows = [cls.row_values(VbplSubPart, sub_part) for sub_part in vbpl_sub_part or []]
+        return (partial(cls.write_vbpl, doc_id, vbpl_row, section_rows, sub_part_rows),
+                partial(KnownVbplIndex.update, doc_id, vbpl_row['content_hash'], vbpl_row['fingerprint'],
+                        vbpl_row['sector']))
+
+    # hash of the stored full text html
+    @classmethod
+    def get_content_hash(cls, vbpl: Vbpl):
+        if vbpl.html is None:
+            return None
+        return hashlib.sha256(vbpl.html.encode('utf-8')).hexdigest()
+
+    # a document is written with a handful of statements whatever its size, every table is upserted with
+    # multi-row INSERT ... ON DUPLICATE KEY UPDATE on its primary key and the sections / sub parts the new
+    # crawl no longer has are deleted. an empty result leaves the stored rows as they are, once the full text
+    # was segmented its sub parts are the whole set, a document that lost its appendix loses its sub parts
+    @classmethod
+    async def write_vbpl(cls, doc_id, vbpl_row, section_rows, sub_part_rows, session: AsyncSession):
+        insert_vbpl = mysql_insert(Vbpl).values(**vbpl_row)
+        await session.execute(insert_vbpl.on_duplicate_key_update(
+            updated_at=datetime.now(),
+            **{column: insert_vbpl.inserted[column] for column in cls._vbpl_upsert_columns}))
 
-                next_node = line
-                while True:
-                    next_node = next_node.find_next_sibling('p')
+        if len(section_rows) == 0:
+            return
 
-                    if next_node is None:
-                        break
+        await cls.bulk_upsert(session, VbplToanVan, section_rows, cls._toan_van_upsert_columns)
+        section_numbers = {row['section_number'] for row in section_rows}
+        await session.execute(delete(VbplToanVan).where(VbplToanVan.vbpl_id == doc_id,
+                                                        VbplToanVan.section_number.notin_(section_numbers)))
 
-                    node_content = get_html_node_text(next_node)
+        stale_sub_parts = delete(VbplSubPart).where(VbplSubPart.vbpl_id == doc_id)
+        if len(sub_part_rows) > 0:
+            await cls.bulk_upsert(session, VbplSubPart, sub_part_rows, cls._sub_part_upsert_columns)
+            sub_part_numbers = {row['sub_section_part_number'] for row in sub_part_rows}
+            stale_sub_parts = stale_sub_parts.where(VbplSubPart.sub_section_part_number.notin_(sub_part_numbers))
+        await session.execute(stale_sub_parts)
 
-                    vbpl_fulltext_obj, check = cls.update_vbpl_phapquy_fulltext(next_node, vbpl_fulltext_obj)
-                    if check:
-                        next_node = next_node.find_next_sibling('p')
-                        if next_node is None:
-                            break
-                        continue
-
-                    if (re.search(cls._find_section_regex, node_content)
-                        or re.search('_{2,}', node_content)
-                        or next_node.find_next_sibling('p') is None) \
-                            or re.search(cls._find_start_sub_part_regex, node_content):
-                        section_content = '\n'.join(content)
-
-                        new_fulltext_section = VbplToanVan(
-                            vbpl_id=vbpl.id,
-                            section_number=section_number,
-                            section_name=section_name_refined,
-                            section_content=section_content,
-                            chapter_name=current_fulltext_config.current_chapter_name,
-                            chapter_number=current_fulltext_config.current_chapter_number,
-                            mini_part_name=current_fulltext_config.current_mini_part_name,
-                            mini_part_number=current_fulltext_config.current_mini_part_number,
-                            part_name=current_fulltext_config.current_part_name,
-                            part_number=current_fulltext_config.current_part_number,
-                            big_part_name=current_fulltext_config.current_big_part_name,
-                            big_part_number=current_fulltext_config.current_big_part_number
-                        )
-                        results.append(new_fulltext_section)
-                        break
+    @classmethod
+    def row_values(cls, model, obj):
+        return {column.name: getattr(obj, column.name) for column in model.__table__.columns}
 
-                    content.append(get_html_node_text(next_node))
-        return results, None
+    # rows sharing a primary key in one statement update each other, so the last one wins like before
+    @classmethod
+    async def bulk_upsert(cls, session: AsyncSession, model, rows, update_columns):
+        for start in range(0, len(rows), cls._bulk_write_rows):
+            insert_rows = mysql_insert(model).values(rows[start:start + cls._bulk_write_rows])
+            await session.execute(insert_rows.on_duplicate_key_update(
+                **{column: insert_rows.inserted[column] for column in update_columns}))
+
+    # the related documents / doc map of a source vbpl are replaced as a set, the stale edges are deleted and
+    # the new ones inserted with one multi-row insert. a target listed twice keeps its last edge. only the edges
+    # whose target vbpl is stored are inserted, one missing target does not fail the others. the rest replace the
+    # held back edges of the source, see write_held_back_edges
+    @classmethod
+    async def write_vbpl_edges(cls, kind: CrawlTaskKind, source_id, rows, session: AsyncSession):
+        started = time.perf_counter()
+        model, target_column = cls._held_edge_kinds[kind]
+        rows = list({row[target_column]: row for row in rows}.values())
+        await session.execute(delete(model).where(model.source_id == source_id))
+        stored_rows, missing_rows = await cls.split_stored_targets(session, target_column, rows)
+        if len(stored_rows) > 0:
+            await session.execute(insert(model), stored_rows)
+        if len(missing_rows) > 0:
+            await CrawlFrontier.write_put(kind, source_id, {'edges': missing_rows}, session)
+        else:
+            await CrawlFrontier.write_remove(kind, source_id, session)
+        cls.log_edge_write(model.__tablename__, len(stored_rows), len(missing_rows), time.perf_counter() - started)
 
+    # edges held back for a target that was not stored, written once the documents of the crawl are, so an edge to
+    # a vbpl crawled later in the same run or by the other vbpl type is not lost. an edge whose target is still
+    # missing stays with its task, which is failed and tried again by a later crawl after its backoff
     @classmethod
-    def process_vbpl_sub_part(cls, vbpl_id, sub_part_lines):
-        sub_section_title = get_html_node_text(sub_part_lines[1])
-        vbpl_sub_parts = []
-
-        regex_dict = {
-            '^Phụ(\\s)*(\\n)*lục [IVX]+': '(?<=lục )[IVX]+',
-            '^Phụ(\\s)*(\\n)*lục \\d+': '(?<=lục )\\d+',
-            # '^\\d+\\.': '^\\d+(?=\\.)',
-            # '^\\d+-': '^\\d+(?=-)'
-        }
-        is_sub_section_part_title = False
+    async def write_held_back_edges(cls):
+        # the held back edges of this crawl are queued behind its writes
+        await DbWriter.flush()
+        for kind in cls._held_edge_kinds:
+            sources = 0
+            await CrawlFrontier.release_running(kind)
+            async for task in CrawlFrontier.claim_all(kind):
+                await DbWriter.submit(partial(cls.write_held_back_edge_task, kind, task),
+                                      f'held back {kind.value} {task.target_id}',
+                                      on_failed=partial(CrawlFrontier.write_error, task))
+                sources += 1
+            _logger.info(f'Writing the held back {kind.value} edges of {sources} vbpl')
 
-        for i in range(2, len(sub_part_lines)):
-            if is_sub_section_part_title:
-                is_sub_section_part_title = False
-                continue
+    @classmethod
+    async def write_held_back_edge_task(cls, kind: CrawlTaskKind, task, session: AsyncSession):
+        model, target_column = cls._held_edge_kinds[kind]
+        stored_rows, missing_rows = await cls.split_stored_targets(session, target_column,
+                                                                   CrawlFrontier.payload(task)['edges'])
+        if len(stored_rows) > 0:
+            await session.execute(insert(model).prefix_with('IGNORE'), stored_rows)
+        if len(missing_rows) == 0:
+            await CrawlFrontier.write_done(task.id, session)
+            return
+        await CrawlFrontier.write_payload(task.id, {'edges': missing_rows}, session)
+        await CrawlFrontier.write_failed(task.id, task.attempts,
+                                         f'{len(missing_rows)} edges wait for their target vbpl', session)
 
-            line = sub_part_lines[i]
-            # if line.name not in ['p', 'div'] or not check_header_tag(line.name):
-            #     continue
-
-            line_content = get_html_node_text(line)
-
-            for check_regex in regex_dict.keys():
-                if re.search(check_regex, line_content):
-                    extract_regex = regex_dict[check_regex]
-                    current_sub_part_reg = re.search(extract_regex, line_content)
-
-                    # get sub part number
-                    current_sub_part = line_content[current_sub_part_reg.span()[0]:current_sub_part_reg.span()[1]]
-                    # skip if sub part number is not numeral or roman numeral
-                    if not re.search('^[IVX]+$', current_sub_part) and not re.search('^\\d+$', current_sub_part):
-                        continue
-
-                    current_sub_part_title = line_content[current_sub_part_reg.span()[1]:].strip()
-                    # if the sub part title is not right beside the sub part number, it is below it
-                    if current_sub_part_title == '':
-                        current_sub_part_title_node = sub_part_lines[i + 1]
-                        current_sub_part_title = get_html_node_text(current_sub_part_title_node)
-                        is_sub_section_part_title = True
-
-                    new_vbpl_sub_part = VbplSubPart(
-                        vbpl_id=vbpl_id,
-                        sub_section_title=sub_section_title,
-                        sub_section_part_number=current_sub_part,
-                        sub_section_part_title=current_sub_part_title
-                    )
-                    vbpl_sub_parts.append(new_vbpl_sub_part)
-                    break
-        if len(vbpl_sub_parts) == 0:
-            vbpl_sub_parts.append(VbplSubPart(
-                vbpl_id=vbpl_id,
-                sub_section_title=sub_section_title,
-                sub_section_part_number='0',
-                sub_section_part_title=None
-            ))
-        return vbpl_sub_parts
+    # (rows whose target vbpl is stored, the others), read in the write transaction so a target written earlier
+    # in the same batch counts
+    @classmethod
+    async def split_stored_targets(cls, session: AsyncSession, target_column, rows):
+        if len(rows) == 0:
+            return [], []
+        stored_ids = set((await session.execute(
+            select(Vbpl.id).where(Vbpl.id.in_({row[target_column] for row in rows})))).scalars())
+        return ([row for row in rows if row[target_column] in stored_ids],
+                [row for row in rows if row[target_column] not in stored_ids])
+
+    # edges written per second of statement time, logged every _edge_stats_log_every sources
+    @classmethod
+    def log_edge_write(cls, table_name, edges, skipped, seconds):
+        stats = cls._edge_write_stats.setdefault(table_name, {'sources': 0, 'edges': 0, 'skipped': 0,
+                                                              'seconds': 0.0})
+        stats['sources'] += 1
+        stats['edges'] += edges
+        stats['skipped'] += skipped
+        stats['seconds'] += seconds
+        if stats['sources'] % cls._edge_stats_log_every == 0:
+            _logger.info(f"{table_name} wrote {stats['edges']} edges of {stats['sources']} vbpl in "
+                         f"{stats['seconds']:.2f}s, {stats['edges'] / max(stats['seconds'], 1e-9):.0f} edges/s, "
+                         f"{stats['skipped']} edges skipped for a target that is not stored")
+
+    # orm rows from a parsed full text record
+    @classmethod
+    def build_fulltext_rows(cls, vbpl: Vbpl, page):
+        results = [VbplToanVan(vbpl_id=vbpl.id, **section) for section in page['sections'] or []]
+        vbpl_sub_parts = None
+        if page['sub_parts'] is not None:
+            vbpl_sub_parts = [VbplSubPart(vbpl_id=vbpl.id, **sub_part) for sub_part in page['sub_parts']]
+        return results, vbpl_sub_parts
 
     @classmethod
     async def crawl_vbpl_phapquy_fulltext(cls, vbpl: Vbpl):
-        aspx_url = f'/TW/Pages/vbpq-{VbplTab.FULL_TEXT.value}.aspx'
-        query_params = {
-            'ItemID': vbpl.id
-        }
         results = []
         vbpl_sub_parts = None
 
         try:
-            resp = await cls.call(method='GET', url_path=aspx_url, query_params=query_params)
+            resp, page = await cls.get_tab_page(VbplTab.FULL_TEXT, vbpl.id)
 
             if resp.status == HTTPStatus.OK:
-                soup = BeautifulSoup(await resp.text(), 'lxml')
-                fulltext = soup.find('div', {"class": "toanvancontent"})
-
-                if fulltext is None:
+                if page['html'] is None:
                     return await cls.additional_html_crawl(vbpl)
 
-                vbpl.html = str(fulltext)
+                vbpl.html = page['html']
 
-                lines = fulltext.find_all('p')
-                if len(lines) == 0:
-                    lines = fulltext.find_all('div')
-                if len(lines) == 0:
+                if page['sections'] is None:
                     return await cls.additional_html_crawl(vbpl)
-                results, vbpl_sub_parts = cls.process_html_full_text(vbpl, lines)
+                results, vbpl_sub_parts = cls.build_fulltext_rows(vbpl, page)
         except Exception as e:
             _logger.exception(f'Crawl vbpl phapquy fulltext {vbpl.id} {e}')
             raise CommonException(500, 'Crawl vbpl toan van')
@@ -476,98 +575,28 @@ class VbplService:
         if vbpl.org_pdf_link is not None and vbpl.org_pdf_link.strip() != '':
             return
 
-        aspx_url = f'/TW/Pages/vbpq-{VbplTab.FULL_TEXT_HOP_NHAT.value}.aspx'
-        query_params = {
-            'ItemID': vbpl.id
-        }
-
         try:
-            resp = await cls.call(method='GET', url_path=aspx_url, query_params=query_params)
+            resp, page = await cls.get_tab_page(VbplTab.FULL_TEXT_HOP_NHAT, vbpl.id)
             if resp.status == HTTPStatus.OK:
-                soup = BeautifulSoup(await resp.text(), 'lxml')
-                vbpl_view = soup.find('div', {'class': 'vbProperties'})
-                document_view_object = vbpl_view.find('object')
-                if document_view_object is not None:
-                    document_link = re.findall('.+.pdf', document_view_object.get('data'))[0]
-                    vbpl.org_pdf_link = setting.VBPL_PDF_BASE_URL + document_link
-                    vbpl.file_link = get_document(vbpl.org_pdf_link, True)
+                if page['pdf_link'] is not None:
+                    vbpl.org_pdf_link = setting.VBPL_PDF_BASE_URL + page['pdf_link']
+                    vbpl.file_link = await get_document(vbpl.org_pdf_link, True)
                 else:
-                    aspx_url = f'/TW/Pages/vbpq-{VbplTab.FULL_TEXT_HOP_NHAT_2.value}.aspx'
-                    query_params = {
-                        'ItemID': vbpl.id
-                    }
+                    resp, page = await cls.get_tab_page(VbplTab.FULL_TEXT_HOP_NHAT_2, vbpl.id)
 
-                    resp = await cls.call(method='GET', url_path=aspx_url, query_params=query_params)
-
-                    if resp.status == HTTPStatus.OK:
-                        soup = BeautifulSoup(await resp.text(), 'lxml')
-                        vbpl_view = soup.find('div', {'class': 'vbProperties'})
-                        pdf_view_object = vbpl_view.find('object')
-                        if pdf_view_object is not None:
-                            pdf_link = re.findall('.+.pdf', pdf_view_object.get('data'))[0]
-                            vbpl.org_pdf_link = setting.VBPL_PDF_BASE_URL + pdf_link
-                            vbpl.file_link = get_document(vbpl.org_pdf_link, True)
+                    if resp.status == HTTPStatus.OK and page['pdf_link'] is not None:
+                        vbpl.org_pdf_link = setting.VBPL_PDF_BASE_URL + page['pdf_link']
+                        vbpl.file_link = await get_document(vbpl.org_pdf_link, True)
         except Exception as e:
             _logger.exception(f'Crawl vbpl hopnhat fulltext {vbpl.id} {e}')
             raise CommonException(500, 'Crawl vbpl hop nhat toan van')
 
     @classmethod
     async def crawl_vbpl_hopnhat_info(cls, vbpl: Vbpl):
-        aspx_url = f'/TW/Pages/vbpq-{VbplTab.ATTRIBUTE_HOP_NHAT.value}.aspx'
-        query_params = {
-            'ItemID': vbpl.id
-        }
-
         try:
-            resp = await cls.call(method='GET', url_path=aspx_url, query_params=query_params)
+            resp, page = await cls.get_tab_page(VbplTab.ATTRIBUTE_HOP_NHAT, vbpl.id)
             if resp.status == HTTPStatus.OK:
-                soup = BeautifulSoup(await resp.text(), 'lxml')
-
-                properties = soup.find('div', {"class": "vbProperties"})
-                if properties is None:
-                    return
-
-                table_rows = properties.find_all('tr')
-                date_format = '%d/%m/%Y'
-
-                bread_crumbs = soup.find('div', {"class": "box-map"})
-                title = bread_crumbs.find('a', {"href": ""})
-                if vbpl.title is None:
-                    vbpl.title = title.text.strip()
-                sub_title = soup.find('td', {'class': 'title'})
-                if vbpl.sub_title is None:
-                    vbpl.sub_title = sub_title.text.strip()
-
-                # regex dict to automate info extraction
-                regex_dict = {
-                    'serial_number': 'Số ký hiệu',
-                    'effective_date': 'Ngày xác thực',
-                    'gazette_date': 'Ngày đăng công báo',
-                    'issuing_authority': 'Cơ quan ban hành',
-                    'doc_type': 'Loại VB được sửa đổi bổ sung'
-                }
-
-                def check_table_cell(field, node, input_vbpl: Vbpl):
-                    if re.search(regex_dict[field], str(node)):
-                        field_value_node = node.find_next_sibling('td')
-                        if field_value_node:
-                            if field == 'effective_date' or field == 'gazette_date':
-                                try:
-                                    field_value = datetime.strptime(get_html_node_text(field_value_node), date_format)
-                                except ValueError:
-                                    field_value = None
-                            else:
-                                field_value = get_html_node_text(field_value_node)
-                            setattr(input_vbpl, field, field_value)
-
-                # extract information based on regex dict
-                for row in table_rows:
-                    table_cells = row.find_all('td')
-
-                    for cell in table_cells:
-                        for key in regex_dict.keys():
-                            check_table_cell(key, cell, vbpl)
-
+                cls.apply_vbpl_info(vbpl, page['info'])
         except Exception as e:
             _logger.exception(f'Crawl vbpl hopnhat info {vbpl.id} {e}')
             raise CommonException(500, 'Crawl vbpl thuoc tinh')
@@ -576,229 +605,88 @@ class VbplService:
     # I split into 2 functions to avoid confusions
     @classmethod
     async def crawl_vbpl_phapquy_info(cls, vbpl: Vbpl):
-        aspx_url = f'/TW/Pages/vbpq-{VbplTab.ATTRIBUTE.value}.aspx'
-        query_params = {
-            'ItemID': vbpl.id
-        }
-
         try:
-            resp = await cls.call(method='GET', url_path=aspx_url, query_params=query_params)
+            resp, page = await cls.get_tab_page(VbplTab.ATTRIBUTE, vbpl.id)
             if resp.status == HTTPStatus.OK:
-                soup = BeautifulSoup(await resp.text(), 'lxml')
-
-                properties = soup.find('div', {"class": "vbProperties"})
-                info = soup.find('div', {'class': 'vbInfo'})
-                if properties is None:
-                    return
-
-                bread_crumbs = soup.find('div', {"class": "box-map"})
-
-                title = bread_crumbs.find('a', {"href": ""})
-                if vbpl.title is None:
-                    vbpl.title = title.text.strip()
-                sub_title = soup.find('td', {'class': 'title'})
-                if vbpl.sub_title is None:
-                    vbpl.sub_title = sub_title.text.strip()
-
-                table_rows = properties.find_all('tr')
-
-                state_regex = 'Hiệu lực:'
-                expiration_date_regex = 'Ngày hết hiệu lực:'
-
-                date_format = '%d/%m/%Y'
-
-                regex_dict = {
-                    'serial_number': 'Số ký hiệu',
-                    'issuance_date': 'Ngày ban hành',
-                    'effective_date': 'Ngày có hiệu lực',
-                    'gazette_date': 'Ngày đăng công báo',
-                    'issuing_authority': 'Cơ quan ban hành',
-                    'applicable_information': 'Thông tin áp dụng',
-                    'doc_type': 'Loại văn bản'
-                }
-
-                def check_table_cell(field, node, input_vbpl: Vbpl):
-                    if re.search(regex_dict[field], str(node)):
-                        field_value_node = node.find_next_sibling('td')
-                        if field_value_node:
-                            if field == 'issuance_date' or field == 'effective_date' or field == 'gazette_date':
-                                try:
-                                    field_value = datetime.strptime(get_html_node_text(field_value_node), date_format)
-                                except ValueError:
-                                    field_value = None
-                            else:
-                                field_value = get_html_node_text(field_value_node)
-                            setattr(input_vbpl, field, field_value)
-
-                for row in table_rows:
-                    table_cells = row.find_all('td')
-
-                    for cell in table_cells:
-                        for key in regex_dict.keys():
-                            check_table_cell(key, cell, vbpl)
-
-                if info is not None:
-                    info_rows = info.find_all('li')
-
-                    for row in info_rows:
-                        if re.search(state_regex, str(row)):
-                            vbpl.state = get_html_node_text(row)[len(state_regex):].strip()
-                        elif re.search(expiration_date_regex, str(row)):
-                            date_content = get_html_node_text(row)[len(expiration_date_regex):].strip()
-                            vbpl.expiration_date = datetime.strptime(date_content, date_format)
-
+                cls.apply_vbpl_info(vbpl, page['info'])
         except Exception as e:
             _logger.exception(f'Crawl vbpl phapquy info {vbpl.id} {e}')
             raise CommonException(500, 'Crawl vbpl thuoc tinh')
 
+    @classmethod
+    def apply_vbpl_info(cls, vbpl: Vbpl, info):
+        if info is None:
+            return
+
+        if vbpl.title is None:
+            vbpl.title = info['title']
+        if vbpl.sub_title is None:
+            vbpl.sub_title = info['sub_title']
+        for field, field_value in info['fields'].items():
+            setattr(vbpl, field, field_value)
+
+    # the related doc rows of a vbpl, None when the tab could not be read so the stored ones are kept
     @classmethod
     async def crawl_vbpl_related_doc(cls, vbpl_id):
-        aspx_url = f'/TW/Pages/vbpq-{VbplTab.RELATED_DOC.value}.aspx'
-        query_params = {
-            'ItemID': vbpl_id
-        }
         try:
-            resp = await cls.call(method='GET', url_path=aspx_url, query_params=query_params)
+            resp, page = await cls.get_tab_page(VbplTab.RELATED_DOC, vbpl_id)
             if resp.status == HTTPStatus.OK:
-                soup = BeautifulSoup(await resp.text(), 'lxml')
-
-                related_doc_node = soup.find('div', {'class': 'vbLienQuan'})
-                if related_doc_node is None or re.search(cls._empty_related_doc_msg,
-                                                         get_html_node_text(related_doc_node)):
-                    return
-
-                doc_type_node = related_doc_node.find_all('td', {'class': 'label'})
-
-                for node in doc_type_node:
-                    doc_type = get_html_node_text(node)
-                    related_doc_list_node = node.find_next_sibling('td').find('ul', {'class': 'listVB'})
-
-                    related_doc_list = related_doc_list_node.find_all('p', {'class': 'title'})
-                    for doc in related_doc_list:
-                        link = doc.find('a')
-                        doc_id = int(re.findall(find_id_regex, link.get('href'))[0])
-                        new_vbpl_related_doc = VbplRelatedDocument(
-                            source_id=vbpl_id,
-                            related_id=doc_id,
-                            doc_type=doc_type
-                        )
-                        with LocalSession.begin() as session:
-                            check_related_doc = session.query(VbplRelatedDocument).filter(
-                                VbplRelatedDocument.source_id == new_vbpl_related_doc.source_id,
-                                VbplRelatedDocument.related_id == new_vbpl_related_doc.related_id).first()
-                            if check_related_doc is None:
-                                session.add(new_vbpl_related_doc)
-                            else:
-                                # upsert vbpl_related_document
-                                update_data = {
-                                    'doc_type': doc_type
-                                }
-                                session.query(VbplRelatedDocument).filter(
-                                    VbplRelatedDocument.source_id == new_vbpl_related_doc.source_id,
-                                    VbplRelatedDocument.related_id == new_vbpl_related_doc.related_id).update(
-                                    update_data)
-
-            sleep(1)
+                return [{
+                    'source_id': vbpl_id,
+                    'related_id': related_doc['id'],
+                    'doc_type': related_doc['doc_type']
+                } for related_doc in page['related_docs']]
         except Exception as e:
             _logger.exception(f'Crawl vbpl related doc {vbpl_id} {e}')
             raise CommonException(500, 'Crawl vbpl van ban lien quan')
 
+    # the doc map rows of a vbpl, None when the tab could not be read so the stored ones are kept
     @classmethod
     async def crawl_vbpl_doc_map(cls, vbpl_id, vbpl_type: VbplType):
-        aspx_url = f'/TW/Pages/vbpq-{VbplTab.DOC_MAP.value}.aspx'
+        doc_map_tab = VbplTab.DOC_MAP
         if vbpl_type == VbplType.HOP_NHAT:
-            aspx_url = f'/TW/Pages/vbpq-{VbplTab.DOC_MAP_HOP_NHAT.value}.aspx'
-        query_params = {
-            'ItemID': vbpl_id
-        }
+            doc_map_tab = VbplTab.DOC_MAP_HOP_NHAT
         try:
-            resp = await cls.call(method='GET', url_path=aspx_url, query_params=query_params)
+            resp, page = await cls.get_tab_page(doc_map_tab, vbpl_id)
             if resp.status == HTTPStatus.OK:
-                soup = BeautifulSoup(await resp.text(), 'lxml')
+                doc_map_rows = []
                 if vbpl_type == VbplType.PHAP_QUY:
-                    doc_map_title_nodes = soup.find_all('div', {'class': re.compile('title')})
-                    for doc_map_title_node in doc_map_title_nodes:
-                        doc_map_title = get_html_node_text(doc_map_title_node)
-
-                        doc_map_content_node = doc_map_title_node.find_next_sibling('div')
-                        doc_map_list = doc_map_content_node.find_all('li')
-                        for doc_map in doc_map_list:
-                            link = doc_map.find('a')
-                            link_ref = re.findall(find_id_regex, link.get('href'))
-                            doc_map_id = None
-
-                            # in some cases, the doc map id is embedded in the link but some cases it is not
-                            # so we have to manually search for those cases, like i said, this web is retarded
-                            if len(link_ref) > 0:
-                                doc_map_id = int(link_ref[0])
-                            else:
-                                doc_title = link.text.strip()
-
-                                search_resp = await cls.call(method='GET',
-                                                             url_path=f'/VBQPPL_UserControls/Publishing_22/TimKiem/p_{vbpl_type.value}.aspx?IsVietNamese=True',
-                                                             query_params=convert_dict_to_pascal({
-                                                                 'row_per_page': cls._default_row_per_page,
-                                                                 'page': 1,
-                                                                 'keyword': doc_title
-                                                             }))
-                                if search_resp.status == HTTPStatus.OK:
-                                    search_soup = BeautifulSoup(await search_resp.text(), 'lxml')
-                                    titles = search_soup.find_all('p', {"class": "title"})
-                                    if len(titles) > 0:
-                                        search_link = titles[0].find('a')
-                                        doc_map_id = int(re.findall(find_id_regex, search_link.get('href'))[0])
-
-                            new_vbpl_doc_map = VbplDocMap(
-                                source_id=vbpl_id,
-                                doc_map_id=doc_map_id,
-                                doc_map_type=doc_map_title
-                            )
-                            with LocalSession.begin() as session:
-                                check_doc_map = session.query(VbplDocMap).filter(
-                                    VbplDocMap.source_id == new_vbpl_doc_map.source_id,
-                                    VbplDocMap.doc_map_id == new_vbpl_doc_map.doc_map_id).first()
-                                if check_doc_map is None:
-                                    session.add(new_vbpl_doc_map)
-                                else:
-                                    # upsert doc_map for phap quy
-                                    update_data = {
-                                        'doc_map_type': doc_map_title
-                                    }
-                                    session.query(VbplDocMap).filter(
-                                        VbplDocMap.source_id == new_vbpl_doc_map.source_id,
-                                        VbplDocMap.doc_map_id == new_vbpl_doc_map.doc_map_id).update(update_data)
+                    for doc_map in page['doc_maps']:
+                        doc_map_title = doc_map['doc_map_type']
+                        doc_map_id = doc_map['id']
+
+                        # in some cases, the doc map id is embedded in the link but some cases it is not
+                        # so we have to manually search for those cases, like i said, this web is retarded
+                        if doc_map_id is None:
+                            search_resp = await cls.call(method='GET',
+                                                         url_path=f'/VBQPPL_UserControls/Publishing_22/TimKiem/p_{vbpl_type.value}.aspx?IsVietNamese=True',
+                                                         query_params=convert_dict_to_pascal({
+                                                             'row_per_page': cls._default_row_per_page,
+                                                             'page': 1,
+                                                             'keyword': doc_map['link_title']
+                                                         }))
+                            if search_resp.status == HTTPStatus.OK:
+                                search_results = await cls.parse_page(ParseKind.VBPL_LISTING,
+                                                                      await search_resp.text())
+                                if len(search_results) > 0:
+                                    doc_map_id = search_results[0]['id']
+
+                        doc_map_rows.append({
+                            'source_id': vbpl_id,
+                            'doc_map_id': doc_map_id,
+                            'doc_map_type': doc_map_title
+                        })
 
                 elif vbpl_type == VbplType.HOP_NHAT:
-                    doc_map_nodes = soup.find_all('div', {'class': 'w'})
-                    if len(doc_map_nodes) > 1:
-                        doc_map_nodes = doc_map_nodes[:-1]
-                    else:
-                        return
-                    for doc_map_node in doc_map_nodes:
-                        link = doc_map_node.find('a')
-                        link_ref = re.findall(find_id_regex, link.get('href'))
-                        doc_map_id = int(link_ref[0])
-
-                        new_vbpl_doc_map = VbplDocMap(
-                            source_id=vbpl_id,
-                            doc_map_id=doc_map_id,
-                            doc_map_type='Văn bản được hợp nhất'
-                        )
-                        with LocalSession.begin() as session:
-                            check_doc_map = session.query(VbplDocMap).filter(
-                                VbplDocMap.source_id == new_vbpl_doc_map.source_id,
-                                VbplDocMap.doc_map_id == new_vbpl_doc_map.doc_map_id).first()
-                            if check_doc_map is None:
-                                session.add(new_vbpl_doc_map)
-                            else:
-                                # upsert doc_map for hop nhat
-                                update_data = {
-                                    'doc_map_type': 'Văn bản được hợp nhất'
-                                }
-                                session.query(VbplDocMap).filter(
-                                    VbplDocMap.source_id == new_vbpl_doc_map.source_id,
-                                    VbplDocMap.doc_map_id == new_vbpl_doc_map.doc_map_id).update(update_data)
-            sleep(1)
+                    for doc_map_id in page['doc_map_ids']:
+                        doc_map_rows.append({
+                            'source_id': vbpl_id,
+                            'doc_map_id': doc_map_id,
+                            'doc_map_type': 'Văn bản được hợp nhất'
+                        })
+
+                # a doc map that could not be found by its title has no id to be stored with
+                return [row for row in doc_map_rows if row['doc_map_id'] is not None]
         except Exception as e:
             _logger.exception(f'Crawl vbpl doc map {vbpl_id} {e}')
             raise CommonException(500, 'Crawl vbpl luoc do')
@@ -852,13 +740,11 @@ class VbplService:
                 query_params['page'] = i + 1
                 params = concetti_query_params_url_encode(query_params)
                 try:
-                    async with aiohttp.ClientSession(trust_env=True) as session:
-                        async with session.request('GET',
-                                                   yarl.URL(f'{cls._concetti_base_url + search_url}?{params}',
-                                                            encoded=True),
-                                                   headers=cls.get_headers()
-                                                   ) as resp:
-                            await resp.text()
+                    resp = await HttpClient.request('GET',
+                                                    yarl.URL(f'{cls._concetti_base_url + search_url}?{params}',
+                                                             encoded=True),
+                                                    host=UpstreamHost.CONCETTI,
+                                                    headers=cls.get_headers())
                     if resp.status == HTTPStatus.OK:
                         raw_json = await resp.json()
                         result_items = raw_json['items']
@@ -896,19 +782,17 @@ class VbplService:
                                     slug = item['slug']
                                     doc_url = '/documents/slug'
                                     try:
-                                        async with aiohttp.ClientSession(trust_env=True) as session:
-                                            async with session.request('GET',
-                                                                       f'{cls._concetti_base_url + doc_url}/{slug}',
-                                                                       headers=cls.get_headers()
-                                                                       ) as doc_resp:
-                                                await doc_resp.text()
+                                        doc_resp = await HttpClient.request('GET',
+                                                                            f'{cls._concetti_base_url + doc_url}/{slug}',
+                                                                            host=UpstreamHost.CONCETTI,
+                                                                            headers=cls.get_headers())
                                         if resp.status == HTTPStatus.OK:
                                             raw_doc_json = await doc_resp.json()
                                             pdf_id = raw_doc_json['pdfFile']
                                             if pdf_id is not None:
                                                 pdf_url = f'{cls._concetti_base_url}/files/{pdf_id}/fetch'
                                                 vbpl.org_pdf_link = pdf_url
-                                                vbpl.file_link = get_document(pdf_url, True, pdf_id, True)
+                                                vbpl.file_link = await get_document(pdf_url, True, pdf_id, True)
                                     except Exception as e:
                                         _logger.exception(f'Get concetti {slug} {e}')
                                         raise CommonException(500, 'Get concetti')
@@ -942,45 +826,35 @@ class VbplService:
                 'sort': 1,
             }
             try:
-                async with aiohttp.ClientSession(trust_env=True) as session:
-                    async with session.request('GET',
-                                               cls._tvpl_base_url + search_url,
-                                               params=query_params,
-                                               headers=cls.get_headers()
-                                               ) as resp:
-                        await resp.text()
+                resp = await HttpClient.request('GET',
+                                                cls._tvpl_base_url + search_url,
+                                                host=UpstreamHost.TVPL,
+                                                params=query_params,
+                                                headers=cls.get_headers())
             except Exception as e:
                 _logger.exception(f'Search tvpl {e}')
                 raise CommonException(500, 'Search tvpl')
             if resp.status == HTTPStatus.OK:
-                soup = BeautifulSoup(await resp.text(), 'lxml')
-                search_results = soup.find_all('p', {'class': 'nqTitle'})
+                search_results = await cls.parse_page(ParseKind.TVPL_SEARCH, await resp.text())
 
                 for result in search_results:
-                    search_text = get_html_node_text(result)
-                    if Levenshtein.ratio(search_text, search_key) >= threshold:
+                    if Levenshtein.ratio(result['text'], search_key) >= threshold:
                         found = True
-                        result_url = result.find('a').get('href')
+                        result_url = result['url']
                         try:
-                            async with aiohttp.ClientSession(trust_env=True) as session:
-                                async with session.request('GET',
-                                                           result_url,
-                                                           headers=cls.get_headers()
-                                                           ) as full_text_resp:
-                                    await full_text_resp.text()
+                            full_text_resp = await HttpClient.request('GET',
+                                                                      result_url,
+                                                                      host=UpstreamHost.TVPL,
+                                                                      headers=cls.get_headers())
                             if full_text_resp.status == HTTPStatus.OK:
-                                full_text_soup = BeautifulSoup(await full_text_resp.text(), 'lxml')
-                                full_text = full_text_soup.find('div', {'class': 'cldivContentDocVn'})
+                                full_text = await cls.parse_page(ParseKind.TVPL_FULL_TEXT,
+                                                                 await full_text_resp.text())
 
-                                if full_text is None:
+                                if full_text['html'] is None:
                                     return None
 
-                                vbpl.html = str(full_text)
-
-                                lines = full_text.find_all('p')
-                                if len(lines) == 0:
-                                    lines = full_text.find_all('div')
-                                results, vbpl_sub_parts = cls.process_html_full_text(vbpl, lines)
+                                vbpl.html = full_text['html']
+                                results, vbpl_sub_parts = cls.build_fulltext_rows(vbpl, full_text)
                             break
                         except Exception as e:
                             _logger.exception(f'Get tvpl html {result_url} {e}')
@@ -993,53 +867,36 @@ class VbplService:
         # the download Tab is embedded in any link that does not return null
         # unfortunately any link relate to vbpl can return null so we need to check all of them
         # and i will say it again, this web is retarded
+        # the pages are usually already fetched by the other tab crawlers of this document and come from the cache
         if vbpl_type == VbplType.PHAP_QUY:
-            possible_path = [
-                VbplTab.FULL_TEXT.value,
-                VbplTab.ATTRIBUTE.value,
-                VbplTab.RELATED_DOC.value,
-                VbplTab.DOC_MAP.value
+            possible_tabs = [
+                VbplTab.FULL_TEXT,
+                VbplTab.ATTRIBUTE,
+                VbplTab.RELATED_DOC,
+                VbplTab.DOC_MAP
             ]
         else:
-            possible_path = [
-                VbplTab.FULL_TEXT_HOP_NHAT.value,
-                VbplTab.FULL_TEXT_HOP_NHAT_2.value,
-                VbplTab.ATTRIBUTE_HOP_NHAT.value,
-                VbplTab.DOC_MAP_HOP_NHAT.value
+            possible_tabs = [
+                VbplTab.FULL_TEXT_HOP_NHAT,
+                VbplTab.FULL_TEXT_HOP_NHAT_2,
+                VbplTab.ATTRIBUTE_HOP_NHAT,
+                VbplTab.DOC_MAP_HOP_NHAT
             ]
 
-        for path in possible_path:
-            aspx_url = f'/TW/Pages/vbpq-{path}.aspx'
-            query_params = {
-                'ItemID': vbpl.id
-            }
-
+        for tab in possible_tabs:
             try:
-                resp = await cls.call(method='GET', url_path=aspx_url, query_params=query_params)
+                resp, page = await cls.get_tab_page(tab, vbpl.id)
                 if resp.status == HTTPStatus.OK:
-                    soup = BeautifulSoup(await resp.text(), 'lxml')
-                    files = soup.find('ul', {'class': 'fileAttack'})
-                    if files is not None:
-                        file_urls = []
-                        file_links = files.find_all('li')
-
-                        for link in file_links:
-                            link_node = link.find_all('a')[0]
-                            link_content = get_html_node_text(link_node)
-                            if re.search('.+.pdf', link_content) \
-                                    or re.search('.+.doc', link_content) \
-                                    or re.search('.+.docx', link_content):
-                                href = link_node['href']
-                                if re.search('javascript:downloadfile', href):
-                                    file_url = href[len('javascript:downloadfile('):-2].split(',')[1][1:-1]
-                                    file_urls.append(quote(setting.VBPL_PDF_BASE_URL + file_url, safe='/:?'))
+                    if page['attachments'] is not None:
+                        file_urls = [quote(setting.VBPL_PDF_BASE_URL + file_path, safe='/:?')
+                                     for file_path in page['attachments']]
 
                         if len(file_urls) > 0:
                             local_links = []
                             for url in file_urls:
-                                doc_link = get_document(url, True)
+                                doc_link = await get_document(url, True)
                                 if doc_link is not None:
-                                    local_links.append(get_document(url, True))
+                                    local_links.append(doc_link)
                             if len(local_links) > 0:
                                 vbpl.file_link = ' '.join(local_links)
                             vbpl.org_pdf_link = ' '.join(file_urls)
@@ -1051,23 +908,13 @@ class VbplService:
 
     @classmethod
     async def crawl_vbpl_by_id(cls, vbpl_id, vbpl_type: VbplType):
+        # the id typed in the cli is a string, the known index is keyed by the integer primary key
+        vbpl_id = int(vbpl_id)
         new_vbpl = Vbpl(
             id=vbpl_id,
         )
-        if vbpl_type == VbplType.HOP_NHAT:
-            await cls.crawl_vbpl_hopnhat_info(new_vbpl)
-            await cls.crawl_vbpl_pdf(new_vbpl, vbpl_type)
-            await cls.crawl_vbpl_hopnhat_fulltext(new_vbpl)
-            await cls.search_concetti(new_vbpl)
-            await cls.enrich_vbpl_sector(new_vbpl)
-            vbpl_fulltext, vbpl_sub_part = await cls.additional_html_crawl(new_vbpl)
-        else:
-            await cls.crawl_vbpl_phapquy_info(new_vbpl)
-            await cls.crawl_vbpl_pdf(new_vbpl, vbpl_type)
-            vbpl_fulltext, vbpl_sub_part = await cls.crawl_vbpl_phapquy_fulltext(new_vbpl)
-            await cls.search_concetti(new_vbpl)
-            await cls.enrich_vbpl_sector(new_vbpl)
-        await cls.push_vbpl_to_db(vbpl_id, new_vbpl, vbpl_fulltext, vbpl_sub_part)
+        await KnownVbplIndex.load([vbpl_id])
+        await cls.crawl_vbpl_document(new_vbpl, vbpl_type)
 
     @classmethod
     async def fetch_vbpl_by_id(cls, vbpl_id):
@@ -1178,6 +1025,11 @@ class VbplService:
     # get vbpl sector
     @classmethod
     async def enrich_vbpl_sector(cls, vbpl: Vbpl):
+        # nothing to search with, the attribute tab gave neither of them
+        if vbpl.serial_number is None or (vbpl.serial_number == 'Không số' and vbpl.sub_title is None):
+            cls.apply_known_sector(vbpl)
+            return
+
         if vbpl.serial_number == 'Không số':
             query_params = {
                 'Keywords': vbpl.sub_title,
@@ -1192,72 +1044,54 @@ class VbplService:
             }
 
         search_url = 'tim-van-ban.html'
-        vbpl_sectors = []
 
         try:
-            async with aiohttp.ClientSession(trust_env=True) as session:
-                async with session.request('GET',
-                                           f'{cls._luat_vn_base_url + search_url}',
-                                           params=query_params,
-                                           headers=cls.get_headers()
-                                           ) as resp:
-                    await resp.text()
+            resp = await HttpClient.request('GET',
+                                            f'{cls._luat_vn_base_url + search_url}',
+                                            host=UpstreamHost.LUAT_VN,
+                                            params=query_params,
+                                            headers=cls.get_headers())
         except Exception as e:
             _logger.exception(f'Search vbpl on luatvietnam with url {search_url}')
             raise CommonException(500, 'Crawl vbpl sector from luatvietnam')
 
         if resp.status == HTTPStatus.OK:
-            soup = BeautifulSoup(await resp.text(), 'lxml')
-            search_results = soup.find_all('h2', {'class': 'doc-title'})
+            search_results = await cls.parse_page(ParseKind.LUAT_VN_SEARCH, await resp.text())
             result_url = ''
             # check if the searched doc is in the search result
             for search_result in search_results:
-                title = search_result.find('a').get('title')
-                if vbpl.serial_number in title or vbpl.sub_title in title:
-                    result_url = search_result.find('a').get('href')
+                title = search_result['title']
+                if vbpl.serial_number in title or (vbpl.sub_title is not None and vbpl.sub_title in title):
+                    result_url = search_result['url']
                     break
             # if not found, then stop the function, and mark those as "Lĩnh vực khác"
             if result_url == '':
                 vbpl.sector = 'Lĩnh vực khác'
                 return
             try:
-                async with aiohttp.ClientSession(trust_env=True) as session:
-                    async with session.request('GET',
-                                               f'{cls._luat_vn_base_url + result_url}',
-                                               params=query_params,
-                                               headers=cls.get_headers()
-                                               ) as vbpl_resp:
-                        await vbpl_resp.text()
+                vbpl_resp = await HttpClient.request('GET',
+                                                     f'{cls._luat_vn_base_url + result_url}',
+                                                     host=UpstreamHost.LUAT_VN,
+                                                     params=query_params,
+                                                     headers=cls.get_headers())
             except Exception as e:
                 _logger.exception(f'Get vbpl info on luatvietnam with url {result_url}')
                 raise CommonException(500, 'Crawl vbpl sector from luatvietnam')
 
             if vbpl_resp.status == HTTPStatus.OK:
-                vbpl_soup = BeautifulSoup(await vbpl_resp.text(), 'lxml')
-                summary = vbpl_soup.find('div', {'id': 'tomtat'})
-                if summary is not None:
-                    table_rows = summary.find_all('tr')
-                    for row in table_rows:
-                        sector_row = row.find('td', text="Lĩnh vực:")
-                        if sector_row is None:
-                            continue
-                        all_sector_info = row.find_all('a')
-                        for sector in all_sector_info:
-                            vbpl_sector = sector.get('title')
-                            # the sector above will be "Lĩnh vực: something", we need to remove "Lĩnh vực: "
-                            colon_index = vbpl_sector.find(':')
-                            if colon_index != -1:
-                                # Extract the text after ':', removing any leading or trailing spaces
-                                vbpl_sectors.append(vbpl_sector[colon_index + 1:].strip())
+                vbpl_sectors = await cls.parse_page(ParseKind.LUAT_VN_SECTOR, await vbpl_resp.text())
+                if vbpl_sectors is not None:
+                    vbpl.sector = ' - '.join(vbpl_sectors)
 
-                        vbpl.sector = ' - '.join(vbpl_sectors)
+        cls.apply_known_sector(vbpl)
 
-        with LocalSession.begin() as session:
-            # avoid upsert into 'Lĩnh vực khác' for the already specific sector
-            check_sector = session.query(Vbpl).filter(Vbpl.id == vbpl.id).first()
-            if check_sector is not None:
-                if check_sector.sector != 'Lĩnh vực khác' and vbpl.sector is None:
-                    vbpl.sector = check_sector.sector
+    @classmethod
+    def apply_known_sector(cls, vbpl: Vbpl):
+        # avoid upsert into 'Lĩnh vực khác' for the already specific sector
+        known_sector = KnownVbplIndex.sector(vbpl.id)
+        if KnownVbplIndex.contains(vbpl.id):
+            if known_sector != 'Lĩnh vực khác' and vbpl.sector is None:
+                vbpl.sector = known_sector
 
         if vbpl.sector is None:
             vbpl.sector = 'Lĩnh vực khác'
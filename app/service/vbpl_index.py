@@ -0,0 +1,59 @@
+import sys
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.helper.db import async_db_session
+from app.helper.logger import setup_logger
+from app.model import Vbpl
+
+_logger = setup_logger('vbpl_index_logger', 'log/vbpl_index.log')
+
+
+# every stored vbpl id with its last written content hash, fingerprint and sector, loaded in one pass when a
+# crawl starts and updated whenever DbWriter committed a vbpl, so the crawl looks documents up without a query.
+# only this process writes vbpl during a crawl, the index is the state of the db
+class KnownVbplIndex:
+    # id -> (content hash, fingerprint, sector), the few distinct sectors are interned so every entry shares them
+    _entries: Dict[int, Tuple[Optional[str], Optional[str], Optional[str]]] = {}
+
+    # all stored vbpl, or only the given ids for a crawl of a few documents, merged into what is already loaded
+    @classmethod
+    async def load(cls, vbpl_ids: Iterable[int] = None):
+        query = select(Vbpl.id, Vbpl.content_hash, Vbpl.fingerprint, Vbpl.sector)
+        if vbpl_ids is not None:
+            query = query.where(Vbpl.id.in_(list(vbpl_ids)))
+
+        entries = {}
+        async with async_db_session() as session:
+            rows = await session.stream(query)
+            async for vbpl_id, content_hash, fingerprint, sector in rows:
+                entries[vbpl_id] = (content_hash, fingerprint, sys.intern(sector) if sector is not None else None)
+        if vbpl_ids is None:
+            cls._entries = entries
+        else:
+            cls._entries.update(entries)
+        _logger.info(f'Loaded {len(entries)} known vbpl')
+
+    @classmethod
+    def contains(cls, vbpl_id) -> bool:
+        return vbpl_id in cls._entries
+
+    @classmethod
+    def content_hash(cls, vbpl_id) -> Optional[str]:
+        entry = cls._entries.get(vbpl_id)
+        return entry[0] if entry is not None else None
+
+    @classmethod
+    def fingerprint(cls, vbpl_id) -> Optional[str]:
+        entry = cls._entries.get(vbpl_id)
+        return entry[1] if entry is not None else None
+
+    @classmethod
+    def sector(cls, vbpl_id) -> Optional[str]:
+        entry = cls._entries.get(vbpl_id)
+        return entry[2] if entry is not None else None
+
+    @classmethod
+    def update(cls, vbpl_id, content_hash: Optional[str], fingerprint: Optional[str], sector: Optional[str]):
+        cls._entries[vbpl_id] = (content_hash, fingerprint, sys.intern(sector) if sector is not None else None)
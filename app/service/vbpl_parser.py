@@ -0,0 +1,915 @@
+import copy
+import hashlib
+import re
+from datetime import datetime
+from typing import Optional
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+from app.entity.vbpl import VbplFullTextField
+from app.helper.enum import ParseKind, FullTextLineKind
+from app.helper.utility import get_html_node_text, target_strainer
+from setting import setting
+
+find_id_regex = '(?<=ItemID=)\\d+'
+
+
+# labels a full text line in one match of a single compiled pattern, each alternative is a named group
+# (the FullTextLineKind value) with a <kind>_number group for the number it carries
+class VbplLineClassifier:
+    _line_regex = re.compile(
+        '^(?:'
+        '(?P<big_part>Phần(?: thứ)? (?P<big_part_number>nhất|hai|ba|bốn|năm|sáu|bảy|tám|chín|mười)$)'
+        '|(?P<chapter>Chương (?P<chapter_number>[IVX]+.*))'
+        '|(?P<part>(?:Mục|Mu.c) (?P<part_number>[IVX]+.*))'
+        '|(?P<mini_part>Tiểu mục (?P<mini_part_number>[IVX]+.*))'
+        '|(?P<section>Điều(?: thứ)? (?P<section_number>\\d+))'
+        '|(?P<start_sub_part>PHỤ LỤC$)'
+        '|(?P<sub_part>Phụ\\s*lục (?P<sub_part_number>[IVX]+|\\d+))'
+        ')'
+    )
+    _separator_regex = re.compile('_{2,}')
+
+    # (kind, number, text after the number), kind is None for a plain line
+    @classmethod
+    def classify(cls, line_content):
+        match = cls._line_regex.match(line_content)
+        if match is None:
+            return None, None, None
+
+        kind = FullTextLineKind(match.lastgroup)
+        if kind == FullTextLineKind.START_SUB_PART:
+            return kind, None, None
+        number_group = f'{match.lastgroup}_number'
+        return kind, match.group(number_group), line_content[match.end(number_group):]
+
+    @classmethod
+    def is_separator(cls, line_content):
+        return cls._separator_regex.search(line_content) is not None
+
+
+# cuts full text lines into sections (VbplToanVan) and the appendix into sub parts (VbplSubPart) while the lines
+# come in. a line is opened in document order and gets its text when it is closed, the next sibling line of a line
+# is known once another line of the same parent is opened or the parent ends. sections are handed out as soon as
+# they end and the lines behind the current one are dropped, so a streamed page never has to be held whole.
+# check any change to this against the stored html with VbplSegmentCheck
+class VbplFullTextSegmenter:
+    _word_start_regex = re.compile('\\b\\w')
+    _heading_kinds = (FullTextLineKind.BIG_PART, FullTextLineKind.CHAPTER,
+                      FullTextLineKind.PART, FullTextLineKind.MINI_PART)
+
+    def __init__(self):
+        self._texts = {}
+        self._kinds = {}
+        self._next_siblings = {}
+        self._last_sibling = {}
+        self._line_count = 0
+        self._released = 0
+        self._closed = False
+        self._sections = []
+        self._steps = self._segment()
+        self.sub_parts = None
+
+    # parent_key None is a line without sibling lines
+    def open_line(self, parent_key):
+        line_index = self._line_count
+        self._line_count += 1
+        if parent_key is None:
+            self._next_siblings[line_index] = None
+            return line_index
+
+        last_index = self._last_sibling.get(parent_key)
+        if last_index is not None and last_index >= self._released:
+            self._next_siblings[last_index] = line_index
+        self._last_sibling[parent_key] = line_index
+        return line_index
+
+    def close_line(self, line_index, line_content):
+        if line_index < self._released:
+            return
+        self._texts[line_index] = line_content
+        self._kinds[line_index] = VbplLineClassifier.classify(line_content)
+
+    def add_line(self, line_content, parent_key):
+        self.close_line(self.open_line(parent_key), line_content)
+
+    def end_parent(self, parent_key):
+        last_index = self._last_sibling.pop(parent_key, None)
+        if last_index is not None and last_index >= self._released:
+            self._next_siblings[last_index] = None
+
+    def close(self):
+        for parent_key in list(self._last_sibling):
+            self.end_parent(parent_key)
+        self._closed = True
+        self.advance()
+
+    # run the segmentation as far as the lines seen so far allow
+    def advance(self):
+        next(self._steps, None)
+
+    def pop_sections(self):
+        sections = self._sections
+        self._sections = []
+        return sections
+
+    def _has_line(self, line_index):
+        while line_index not in self._kinds:
+            if self._closed and line_index >= self._line_count:
+                return False
+            yield
+        return True
+
+    def _next_sibling(self, line_index):
+        while line_index not in self._next_siblings:
+            yield
+        next_index = self._next_siblings[line_index]
+        if next_index is not None:
+            yield from self._has_line(next_index)
+        return next_index
+
+    def _release(self, line_index):
+        for released_index in range(self._released, line_index):
+            self._texts.pop(released_index, None)
+            self._kinds.pop(released_index, None)
+            self._next_siblings.pop(released_index, None)
+        self._released = max(self._released, line_index)
+
+    # a heading line moves the position, its name is the next sibling line
+    def _update_heading(self, line_index, fulltext_obj: VbplFullTextField):
+        kind, number, _ = self._kinds[line_index]
+        if kind not in self._heading_kinds:
+            return False
+        name_index = yield from self._next_sibling(line_index)
+        name = self._texts[name_index] if name_index is not None else None
+        return VbplParser.update_vbpl_phapquy_fulltext(kind, number, name, fulltext_obj)
+
+    def _segment(self):
+        vbpl_fulltext_obj = VbplFullTextField()
+
+        # init vbpl fulltext object
+        line_index = 0
+        while (yield from self._has_line(line_index)):
+            if self._kinds[line_index][0] == FullTextLineKind.SECTION:
+                break
+            yield from self._update_heading(line_index, vbpl_fulltext_obj)
+            line_index += 1
+
+        # process fulltext line by line
+        line_index = 0
+        while (yield from self._has_line(line_index)):
+            self._release(line_index)
+            kind, section_number, section_name = self._kinds[line_index]
+
+            if kind == FullTextLineKind.START_SUB_PART:
+                while not self._closed:
+                    yield
+                sub_part_texts = [self._texts[i] for i in range(line_index, self._line_count)]
+                self.sub_parts = VbplParser.process_vbpl_sub_part(sub_part_texts)
+                return
+
+            if kind != FullTextLineKind.SECTION:
+                line_index += 1
+                continue
+
+            section_number = int(section_number)
+            section_name_refined = None
+            section_name_search = self._word_start_regex.search(section_name)
+            if section_name_search:
+                section_name_refined = section_name[section_name_search.span()[0]:]
+
+            # the position only holds strings, a shallow copy is a snapshot
+            current_fulltext_config = copy.copy(vbpl_fulltext_obj)
+            content = []
+            if section_name_refined is not None and len(section_name_refined) >= 400:
+                content.append(section_name_refined)
+                section_name_refined = None
+
+            next_index = line_index
+            while True:
+                next_index = yield from self._next_sibling(next_index)
+                if next_index is None:
+                    break
+
+                node_content = self._texts[next_index]
+
+                # skip the heading and its name line
+                if (yield from self._update_heading(next_index, vbpl_fulltext_obj)):
+                    next_index = yield from self._next_sibling(next_index)
+                    if next_index is None:
+                        break
+                    continue
+
+                next_kind = self._kinds[next_index][0]
+                if next_kind == FullTextLineKind.SECTION \
+                        or next_kind == FullTextLineKind.START_SUB_PART \
+                        or (yield from self._next_sibling(next_index)) is None \
+                        or VbplLineClassifier.is_separator(node_content):
+                    self._sections.append({
+                        'section_number': section_number,
+                        'section_name': section_name_refined,
+                        'section_content': '\n'.join(content),
+                        'chapter_name': current_fulltext_config.current_chapter_name,
+                        'chapter_number': current_fulltext_config.current_chapter_number,
+                        'mini_part_name': current_fulltext_config.current_mini_part_name,
+                        'mini_part_number': current_fulltext_config.current_mini_part_number,
+                        'part_name': current_fulltext_config.current_part_name,
+                        'part_number': current_fulltext_config.current_part_number,
+                        'big_part_name': current_fulltext_config.current_big_part_name,
+                        'big_part_number': current_fulltext_config.current_big_part_number
+                    })
+                    break
+
+                content.append(node_content)
+            line_index += 1
+
+
+# memory bounded parse of a full text page for very large documents. the page is fed to lxml in chunks, every
+# line is handed to the segmenter as soon as it ends. the full text node is serialized as it is parsed, an element
+# is written once it ends and its content is dropped, the elements around it are written up to it when one of
+# their children starts, so a page wrapping every line in one inner div is not held whole either. the content of
+# an open line is kept until the line ends, its text is read from it. everything outside the node (except the
+# download box) is dropped when it ends. the stored html is lxml's serialization of the node instead of
+# BeautifulSoup's
+class VbplFullTextStream:
+    # text of these tags is not part of BeautifulSoup's get_text
+    _skipped_text_tags = ('script', 'style', 'template', 'rt', 'rp')
+
+    # node_class None takes the first div
+    def __init__(self, node_class: Optional[str]):
+        self._node_class = node_class
+        self._parser = etree.HTMLPullParser(events=('start', 'end'))
+        self._segmenter = VbplFullTextSegmenter()
+        self._fulltext = None
+        self._fulltext_done = False
+        self._fulltext_parts = []
+        # [element key, line index, element, start tag written] of the open elements inside the full text node
+        self._open_elements = []
+        # ended elements already written, only their tail is still to be written
+        self._written_elements = []
+        self._element_count = 0
+        self._has_p_line = False
+        self._div_lines = []
+        self._attachment_node = None
+        self.html = None
+        self.attachment_html = None
+
+    @classmethod
+    def node_text(cls, node):
+        parts = []
+        if isinstance(node.tag, str) and node.tag not in cls._skipped_text_tags:
+            parts.append(node.text or '')
+            for child in node:
+                parts.append(cls.node_text(child))
+                parts.append(child.tail or '')
+        return ''.join(parts)
+
+    @classmethod
+    def has_class(cls, node, class_name):
+        return class_name in (node.get('class') or '').split()
+
+    # feed the next part of the page, returns the sections that ended in it
+    def feed(self, data: str):
+        self._parser.feed(data)
+        self._read_events()
+        return self._segmenter.pop_sections()
+
+    def close(self):
+        self._parser.close()
+        self._read_events()
+        if self._fulltext is None:
+            return []
+        if not self._has_p_line:
+            # no p line, the div lines are used and none of them has a sibling line
+            for line_content in self._div_lines:
+                self._segmenter.add_line(line_content, None)
+        self._segmenter.close()
+        return self._segmenter.pop_sections()
+
+    @property
+    def has_fulltext(self):
+        return self._fulltext is not None
+
+    @property
+    def has_lines(self):
+        return self._has_p_line or len(self._div_lines) > 0
+
+    @property
+    def sub_parts(self):
+        return self._segmenter.sub_parts
+
+    def _read_events(self):
+        for event, node in self._parser.read_events():
+            if event == 'start':
+                self._start(node)
+            else:
+                self._end(node)
+        self._segmenter.advance()
+
+    def _start(self, node):
+        if self._fulltext is None and node.tag == 'div' \
+                and (self._node_class is None or self.has_class(node, self._node_class)):
+            self._fulltext = node
+            self._open_elements.append([self._next_element_key(), None, node, False])
+            return
+        if self._fulltext is None or self._fulltext_done:
+            if self._attachment_node is None and node.tag == 'ul' and self.has_class(node, 'fileAttack'):
+                self._attachment_node = node
+            return
+
+        if node.tag == 'p' and not self._has_p_line:
+            self._has_p_line = True
+            self._div_lines = []
+        if not self._in_line():
+            self._write_open_elements(node)
+
+        line_index = None
+        if node.tag == 'p':
+            line_index = self._segmenter.open_line(self._open_elements[-1][0])
+        elif node.tag == 'div' and not self._has_p_line:
+            line_index = len(self._div_lines)
+            self._div_lines.append(None)
+        self._open_elements.append([self._next_element_key(), line_index, node, False])
+
+    def _end(self, node):
+        if self._fulltext is not None and not self._fulltext_done:
+            element_key, line_index, _, start_written = self._open_elements.pop()
+            self._segmenter.end_parent(element_key)
+            if node is self._fulltext:
+                self._write_element(node, start_written)
+                self.html = ''.join(self._fulltext_parts)
+                self._fulltext_parts = []
+                self._fulltext_done = True
+                return
+            if line_index is not None:
+                if node.tag == 'p':
+                    self._segmenter.close_line(line_index, self.node_text(node).strip())
+                elif not self._has_p_line:
+                    self._div_lines[line_index] = self.node_text(node).strip()
+            if not self._in_line():
+                # the tail may already be parsed, it is written by the parent and kept until then
+                self._write_element(node, start_written)
+                node.text = None
+                del node[:]
+                self._written_elements.append(node)
+            return
+
+        if node is self._attachment_node:
+            self.attachment_html = etree.tostring(node, method='html', encoding='unicode', with_tail=False)
+        elif self._attachment_node is not None and self.attachment_html is None:
+            # inside the download box
+            return
+        node.clear()
+        parent = node.getparent()
+        if parent is not None:
+            while node.getprevious() is not None:
+                del parent[0]
+
+    def _next_element_key(self):
+        self._element_count += 1
+        return self._element_count
+
+    # an open line keeps its content until it ends, a div is only a line while the page has no p line
+    def _in_line(self):
+        return any(line_index is not None and (node.tag == 'p' or not self._has_p_line)
+                   for _, line_index, node, _ in self._open_elements)
+
+    # write the start tag and text of every open element above node, and the children they got before it
+    def _write_open_elements(self, node):
+        for index, open_element in enumerate(self._open_elements):
+            element = open_element[2]
+            if not open_element[3]:
+                shell = etree.Element(element.tag, attrib=dict(element.attrib))
+                shell.text = element.text
+                shell_html = etree.tostring(shell, method='html', encoding='unicode')
+                self._fulltext_parts.append(shell_html[:-len(f'</{element.tag}>')])
+                open_element[3] = True
+            until_node = self._open_elements[index + 1][2] if index + 1 < len(self._open_elements) else node
+            self._write_children(element, until_node)
+
+    # serialize an ended element without its tail
+    def _write_element(self, node, start_written):
+        if not start_written:
+            self._fulltext_parts.append(etree.tostring(node, method='html', encoding='unicode', with_tail=False))
+            return
+        self._write_children(node, None)
+        self._fulltext_parts.append(f'</{node.tag}>')
+
+    # serialize and drop the children of node written before until_node
+    def _write_children(self, node, until_node):
+        while True:
+            child = next(node.iterchildren(), None)
+            if child is None or child is until_node:
+                break
+            written = next((index for index, element in enumerate(self._written_elements) if element is child), None)
+            if written is None:
+                self._fulltext_parts.append(etree.tostring(child, method='html', encoding='unicode',
+                                                           with_tail=True))
+            else:
+                del self._written_elements[written]
+                if child.tail:
+                    shell = etree.Element('span')
+                    shell.tail = child.tail
+                    shell_html = etree.tostring(shell, method='html', encoding='unicode', with_tail=True)
+                    self._fulltext_parts.append(shell_html[len('<span></span>'):])
+            node.remove(child)
+
+
+# sha256 of the first node of each (tag, class) target of a page, fed in chunks like VbplFullTextStream.
+# the nodes are hashed as a sequence of start, end and tail records while they are parsed, every element is
+# dropped once it ended and its tail was hashed, so only the open elements are held whatever the page size
+class VbplNodeDigest:
+    def __init__(self, targets):
+        self._targets = targets
+        self._parser = etree.HTMLPullParser(events=('start', 'end'))
+        self._digests = [None] * len(targets)
+        # open elements inside each found target, a target is hashed while it is above 0
+        self._depths = [0] * len(targets)
+        self._done = [False] * len(targets)
+
+    def feed(self, data: str):
+        self._parser.feed(data)
+        self._read_events()
+
+    # hex digest of each target, None for a target the page does not have
+    def close(self):
+        self._parser.close()
+        self._read_events()
+        return [digest.hexdigest() if digest is not None else None for digest in self._digests]
+
+    def _read_events(self):
+        for event, node in self._parser.read_events():
+            if event == 'start':
+                self._start(node)
+            else:
+                self._end(node)
+
+    def _start(self, node):
+        parent = node.getparent()
+        if parent is not None:
+            # the previous siblings ended and their tails are complete now that node started
+            self._release_children(parent, node)
+        for index, (tag, class_name) in enumerate(self._targets):
+            if self._digests[index] is None and node.tag == tag \
+                    and class_name in (node.get('class') or '').split():
+                self._digests[index] = hashlib.sha256()
+            if self._digests[index] is not None and not self._done[index]:
+                self._depths[index] += 1
+        self._update(('start', node.tag, sorted(node.attrib.items())))
+
+    def _end(self, node):
+        self._release_children(node, None)
+        self._update(('end', node.text))
+        node.text = None
+        for index in range(len(self._targets)):
+            if self._depths[index] > 0:
+                self._depths[index] -= 1
+                self._done[index] = self._depths[index] == 0
+
+    # hash the tails of the children of node before until_node and drop them
+    def _release_children(self, node, until_node):
+        while True:
+            child = next(node.iterchildren(), None)
+            if child is None or child is until_node:
+                break
+            if isinstance(child.tag, str):
+                self._update(('tail', child.tail))
+            else:
+                # comments and processing instructions have no events of their own
+                self._update(('node', child.text, child.tail))
+            node.remove(child)
+
+    def _update(self, record):
+        for index, digest in enumerate(self._digests):
+            if self._depths[index] > 0:
+                digest.update(repr(record).encode('utf-8'))
+
+
+# html parsing for the vbpl crawl. everything here takes raw html and returns plain records
+# (dicts, lists, str, datetime) so it can run in the parse worker processes,
+# the orm objects are built from the records by VbplService
+class VbplParser:
+    _empty_related_doc_msg = 'Nội dung đang cập nhật'
+    _date_format = '%d/%m/%Y'
+    _attachment_target = ('ul', 'class', 'fileAttack')
+    # only the nodes each kind reads are built into the tree, the doc map is parsed whole
+    # because its entries are found through siblings of the title divs
+    _page_strainers = {
+        ParseKind.VBPL_LISTING: target_strainer(('p', 'class', 'title'), ('div', 'class', 'des')),
+        ParseKind.VBPL_FULL_TEXT: target_strainer(('div', 'class', 'toanvancontent'), _attachment_target),
+        ParseKind.VBPL_HOPNHAT_FULL_TEXT: target_strainer(('div', 'class', 'vbProperties'), _attachment_target),
+        ParseKind.VBPL_ATTRIBUTE: target_strainer(('div', 'class', 'vbProperties'), ('div', 'class', 'vbInfo'),
+                                                  ('div', 'class', 'box-map'), ('td', 'class', 'title'),
+                                                  _attachment_target),
+        ParseKind.VBPL_HOPNHAT_ATTRIBUTE: target_strainer(('div', 'class', 'vbProperties'),
+                                                          ('div', 'class', 'box-map'), ('td', 'class', 'title'),
+                                                          _attachment_target),
+        ParseKind.VBPL_RELATED_DOC: target_strainer(('div', 'class', 'vbLienQuan'), _attachment_target),
+        ParseKind.VBPL_HOPNHAT_DOC_MAP: target_strainer(('div', 'class', 'w'), _attachment_target),
+        ParseKind.TVPL_SEARCH: target_strainer(('p', 'class', 'nqTitle')),
+        ParseKind.TVPL_FULL_TEXT: target_strainer(('div', 'class', 'cldivContentDocVn')),
+        ParseKind.LUAT_VN_SEARCH: target_strainer(('h2', 'class', 'doc-title')),
+        ParseKind.LUAT_VN_SECTOR: target_strainer(('div', 'id', 'tomtat')),
+    }
+    # full text node of the kinds that are streamed when the page is large
+    _streamed_node_classes = {
+        ParseKind.VBPL_FULL_TEXT: 'toanvancontent',
+        ParseKind.TVPL_FULL_TEXT: 'cldivContentDocVn',
+    }
+    _stream_chunk_size = 64 * 1024
+    # (tag, class) of the nodes of a full text page that make up its fingerprint,
+    # kinds without an entry use their parsed record
+    _fingerprint_nodes = {
+        ParseKind.VBPL_FULL_TEXT: (('div', 'toanvancontent'), ('ul', 'fileAttack')),
+    }
+    _raw_text_regex = re.compile('<(script|style)\\b.*?</\\1\\s*>', re.S | re.I)
+
+    @classmethod
+    def parse(cls, kind: ParseKind, html: str):
+        parsers = {
+            ParseKind.VBPL_LISTING: cls.parse_listing,
+            ParseKind.VBPL_FULL_TEXT: cls.parse_full_text,
+            ParseKind.VBPL_HOPNHAT_FULL_TEXT: cls.parse_hopnhat_full_text,
+            ParseKind.VBPL_ATTRIBUTE: cls.parse_phapquy_info,
+            ParseKind.VBPL_HOPNHAT_ATTRIBUTE: cls.parse_hopnhat_info,
+            ParseKind.VBPL_RELATED_DOC: cls.parse_related_doc,
+            ParseKind.VBPL_DOC_MAP: cls.parse_doc_map,
+            ParseKind.VBPL_HOPNHAT_DOC_MAP: cls.parse_hopnhat_doc_map,
+            ParseKind.TVPL_SEARCH: cls.parse_tvpl_search,
+            ParseKind.TVPL_FULL_TEXT: cls.parse_tvpl_full_text,
+            ParseKind.LUAT_VN_SEARCH: cls.parse_luat_vn_search,
+            ParseKind.LUAT_VN_SECTOR: cls.parse_luat_vn_sector,
+        }
+        if kind in cls._streamed_node_classes and len(html) >= setting.FULL_TEXT_STREAM_MIN_SIZE:
+            return cls.parse_content_stream(html, cls._streamed_node_classes[kind],
+                                            with_attachments=kind == ParseKind.VBPL_FULL_TEXT)
+        return parsers[kind](BeautifulSoup(html, 'lxml', parse_only=cls._page_strainers.get(kind)))
+
+    # listing and search result pages, one record per vbpl
+    @classmethod
+    def parse_listing(cls, soup):
+        titles = soup.find_all('p', {"class": "title"})
+        sub_titles = soup.find_all('div', {'class': "des"})
+        results = []
+
+        for j in range(len(titles)):
+            link = titles[j].find('a')
+            results.append({
+                'id': int(re.findall(find_id_regex, link.get('href'))[0]),
+                'title': get_html_node_text(link),
+                'sub_title': get_html_node_text(sub_titles[j]) if j < len(sub_titles) else None
+            })
+        return results
+
+    # file paths in the download box, every vbpl tab may carry it. None when the page has no download box
+    @classmethod
+    def parse_attachments(cls, soup):
+        files = soup.find('ul', {'class': 'fileAttack'})
+        if files is None:
+            return None
+
+        file_paths = []
+        for link in files.find_all('li'):
+            link_node = link.find_all('a')[0]
+            link_content = get_html_node_text(link_node)
+            if re.search('.+.pdf', link_content) \
+                    or re.search('.+.doc', link_content) \
+                    or re.search('.+.docx', link_content):
+                href = link_node['href']
+                if re.search('javascript:downloadfile', href):
+                    file_paths.append(href[len('javascript:downloadfile('):-2].split(',')[1][1:-1])
+        return file_paths
+
+    # html of the full text node and its segmentation, sections is None when the node has no lines.
+    # node_class None takes the first div
+    @classmethod
+    def parse_content(cls, soup, node_class: Optional[str]):
+        fulltext = soup.find('div', {"class": node_class}) if node_class is not None else soup.find('div')
+        if fulltext is None:
+            return {'html': None, 'sections': None, 'sub_parts': None}
+
+        lines = fulltext.find_all('p')
+        if len(lines) == 0:
+            lines = fulltext.find_all('div')
+        if len(lines) == 0:
+            return {'html': str(fulltext), 'sections': None, 'sub_parts': None}
+
+        sections, sub_parts = cls.process_html_full_text(lines)
+        return {'html': str(fulltext), 'sections': sections, 'sub_parts': sub_parts}
+
+    # same record as parse_full_text / parse_tvpl_full_text without building the page tree
+    @classmethod
+    def parse_content_stream(cls, html: str, node_class: Optional[str], with_attachments: bool = False):
+        stream = VbplFullTextStream(node_class)
+        sections = []
+        for chunk in cls.stream_chunks(html):
+            sections.extend(stream.feed(chunk))
+        sections.extend(stream.close())
+
+        if not stream.has_fulltext:
+            page = {'html': None, 'sections': None, 'sub_parts': None}
+        elif not stream.has_lines:
+            page = {'html': stream.html, 'sections': None, 'sub_parts': None}
+        else:
+            page = {'html': stream.html, 'sections': sections, 'sub_parts': stream.sub_parts}
+
+        if with_attachments:
+            attachments = None
+            if stream.attachment_html is not None:
+                attachments = cls.parse_attachments(BeautifulSoup(stream.attachment_html, 'lxml'))
+            page['attachments'] = attachments
+        return page
+
+    # libxml2 drops the rest of the page when a chunk ends inside a script or style element,
+    # so chunks are only cut outside of them
+    @classmethod
+    def stream_chunks(cls, html: str):
+        raw_text_nodes = cls._raw_text_regex.finditer(html)
+        raw_text_node = next(raw_text_nodes, None)
+        start = 0
+        while start < len(html):
+            end = min(start + cls._stream_chunk_size, len(html))
+            while raw_text_node is not None and raw_text_node.end() <= end:
+                raw_text_node = next(raw_text_nodes, None)
+            if raw_text_node is not None and raw_text_node.start() < end:
+                end = raw_text_node.start() if raw_text_node.start() > start else raw_text_node.end()
+            yield html[start:end]
+            start = end
+
+    # segmentation of a stored vbpl html (the full text node itself), so it can be re-run without the network.
+    # returns (page, None) or (None, error) so one broken document does not stop a batch
+    @classmethod
+    def parse_stored_full_text(cls, html: str):
+        try:
+            if len(html) >= setting.FULL_TEXT_STREAM_MIN_SIZE:
+                page = cls.parse_content_stream(html, None)
+            else:
+                page = cls.parse_content(BeautifulSoup(html, 'lxml'), None)
+        except Exception as e:
+            return None, f'{type(e).__name__} {e}'
+        # the html is already stored, it is not sent back
+        return {'sections': page['sections'], 'sub_parts': page['sub_parts']}, None
+
+    @classmethod
+    def has_node_fingerprint(cls, kind: ParseKind):
+        return kind in cls._fingerprint_nodes
+
+    # digests of the full text node and the download box of a full text page, streamed like a large page
+    # and neither built into a tree nor segmented, so an unchanged document is recognised without parsing it
+    @classmethod
+    def node_fingerprint(cls, kind: ParseKind, html: str):
+        digest = VbplNodeDigest(cls._fingerprint_nodes[kind])
+        for chunk in cls.stream_chunks(html):
+            digest.feed(chunk)
+        return digest.close()
+
+    @classmethod
+    def parse_full_text(cls, soup):
+        page = cls.parse_content(soup, 'toanvancontent')
+        page['attachments'] = cls.parse_attachments(soup)
+        return page
+
+    @classmethod
+    def parse_tvpl_full_text(cls, soup):
+        return cls.parse_content(soup, 'cldivContentDocVn')
+
+    # hop nhat full text is only an embedded pdf viewer
+    @classmethod
+    def parse_hopnhat_full_text(cls, soup):
+        pdf_link = None
+        vbpl_view = soup.find('div', {'class': 'vbProperties'})
+        if vbpl_view is not None:
+            document_view_object = vbpl_view.find('object')
+            if document_view_object is not None:
+                pdf_link = re.findall('.+.pdf', document_view_object.get('data'))[0]
+        return {'pdf_link': pdf_link, 'attachments': cls.parse_attachments(soup)}
+
+    # values of the attribute table, the fields are applied in page order so the last match wins like before
+    @classmethod
+    def parse_info_table(cls, soup, regex_dict, date_fields):
+        properties = soup.find('div', {"class": "vbProperties"})
+        if properties is None:
+            return None
+
+        bread_crumbs = soup.find('div', {"class": "box-map"})
+        title = bread_crumbs.find('a', {"href": ""}) if bread_crumbs is not None else None
+        info = {
+            'title': get_html_node_text(title),
+            'sub_title': get_html_node_text(soup.find('td', {'class': 'title'})),
+            'fields': {},
+        }
+
+        for row in properties.find_all('tr'):
+            for cell in row.find_all('td'):
+                for field, regex in regex_dict.items():
+                    if not re.search(regex, str(cell)):
+                        continue
+                    field_value_node = cell.find_next_sibling('td')
+                    if field_value_node:
+                        if field in date_fields:
+                            try:
+                                field_value = datetime.strptime(get_html_node_text(field_value_node),
+                                                                cls._date_format)
+                            except ValueError:
+                                field_value = None
+                        else:
+                            field_value = get_html_node_text(field_value_node)
+                        info['fields'][field] = field_value
+        return info
+
+    @classmethod
+    def parse_hopnhat_info(cls, soup):
+        regex_dict = {
+            'serial_number': 'Số ký hiệu',
+            'effective_date': 'Ngày xác thực',
+            'gazette_date': 'Ngày đăng công báo',
+            'issuing_authority': 'Cơ quan ban hành',
+            'doc_type': 'Loại VB được sửa đổi bổ sung'
+        }
+        return {
+            'info': cls.parse_info_table(soup, regex_dict, ['effective_date', 'gazette_date']),
+            'attachments': cls.parse_attachments(soup)
+        }
+
+    @classmethod
+    def parse_phapquy_info(cls, soup):
+        regex_dict = {
+            'serial_number': 'Số ký hiệu',
+            'issuance_date': 'Ngày ban hành',
+            'effective_date': 'Ngày có hiệu lực',
+            'gazette_date': 'Ngày đăng công báo',
+            'issuing_authority': 'Cơ quan ban hành',
+            'applicable_information': 'Thông tin áp dụng',
+            'doc_type': 'Loại văn bản'
+        }
+        state_regex = 'Hiệu lực:'
+        expiration_date_regex = 'Ngày hết hiệu lực:'
+
+        info = cls.parse_info_table(soup, regex_dict, ['issuance_date', 'effective_date', 'gazette_date'])
+        vb_info = soup.find('div', {'class': 'vbInfo'})
+        if info is not None and vb_info is not None:
+            for row in vb_info.find_all('li'):
+                if re.search(state_regex, str(row)):
+                    info['fields']['state'] = get_html_node_text(row)[len(state_regex):].strip()
+                elif re.search(expiration_date_regex, str(row)):
+                    date_content = get_html_node_text(row)[len(expiration_date_regex):].strip()
+                    info['fields']['expiration_date'] = datetime.strptime(date_content, cls._date_format)
+        return {'info': info, 'attachments': cls.parse_attachments(soup)}
+
+    @classmethod
+    def parse_related_doc(cls, soup):
+        related_docs = []
+        related_doc_node = soup.find('div', {'class': 'vbLienQuan'})
+        if related_doc_node is not None and not re.search(cls._empty_related_doc_msg,
+                                                          get_html_node_text(related_doc_node)):
+            for node in related_doc_node.find_all('td', {'class': 'label'}):
+                doc_type = get_html_node_text(node)
+                related_doc_list_node = node.find_next_sibling('td').find('ul', {'class': 'listVB'})
+                if related_doc_list_node is None:
+                    continue
+
+                for doc in related_doc_list_node.find_all('p', {'class': 'title'}):
+                    link = doc.find('a')
+                    related_docs.append({
+                        'id': int(re.findall(find_id_regex, link.get('href'))[0]),
+                        'doc_type': doc_type
+                    })
+        return {'related_docs': related_docs, 'attachments': cls.parse_attachments(soup)}
+
+    # the doc map id is not always in the link, those entries come with id None and the link title to search for
+    @classmethod
+    def parse_doc_map(cls, soup):
+        doc_maps = []
+        for doc_map_title_node in soup.find_all('div', {'class': re.compile('title')}):
+            doc_map_title = get_html_node_text(doc_map_title_node)
+
+            doc_map_content_node = doc_map_title_node.find_next_sibling('div')
+            if doc_map_content_node is None:
+                continue
+            for doc_map in doc_map_content_node.find_all('li'):
+                link = doc_map.find('a')
+                link_ref = re.findall(find_id_regex, link.get('href'))
+                doc_maps.append({
+                    'id': int(link_ref[0]) if len(link_ref) > 0 else None,
+                    'doc_map_type': doc_map_title,
+                    'link_title': link.text.strip()
+                })
+        return {'doc_maps': doc_maps, 'attachments': cls.parse_attachments(soup)}
+
+    @classmethod
+    def parse_hopnhat_doc_map(cls, soup):
+        doc_map_ids = []
+        doc_map_nodes = soup.find_all('div', {'class': 'w'})
+        if len(doc_map_nodes) > 1:
+            for doc_map_node in doc_map_nodes[:-1]:
+                link = doc_map_node.find('a')
+                doc_map_ids.append(int(re.findall(find_id_regex, link.get('href'))[0]))
+        return {'doc_map_ids': doc_map_ids, 'attachments': cls.parse_attachments(soup)}
+
+    @classmethod
+    def parse_tvpl_search(cls, soup):
+        results = []
+        for result in soup.find_all('p', {'class': 'nqTitle'}):
+            link = result.find('a')
+            results.append({
+                'text': get_html_node_text(result),
+                'url': link.get('href') if link is not None else None
+            })
+        return results
+
+    @classmethod
+    def parse_luat_vn_search(cls, soup):
+        results = []
+        for search_result in soup.find_all('h2', {'class': 'doc-title'}):
+            link = search_result.find('a')
+            results.append({'title': link.get('title'), 'url': link.get('href')})
+        return results
+
+    # sectors of the luatvietnam summary table, None when the page has no sector row
+    @classmethod
+    def parse_luat_vn_sector(cls, soup):
+        summary = soup.find('div', {'id': 'tomtat'})
+        if summary is None:
+            return None
+
+        vbpl_sectors = None
+        for row in summary.find_all('tr'):
+            sector_row = row.find('td', text="Lĩnh vực:")
+            if sector_row is None:
+                continue
+            if vbpl_sectors is None:
+                vbpl_sectors = []
+            for sector in row.find_all('a'):
+                vbpl_sector = sector.get('title')
+                # the sector above will be "Lĩnh vực: something", we need to remove "Lĩnh vực: "
+                colon_index = vbpl_sector.find(':')
+                if colon_index != -1:
+                    # Extract the text after ':', removing any leading or trailing spaces
+                    vbpl_sectors.append(vbpl_sector[colon_index + 1:].strip())
+        return vbpl_sectors
+
+    # a heading line moves the current position (phần, chương, mục, tiểu mục), its name is the next sibling line
+    @classmethod
+    def update_vbpl_phapquy_fulltext(cls, kind: FullTextLineKind, number, name, fulltext_obj: VbplFullTextField):
+        if kind == FullTextLineKind.BIG_PART:
+            fulltext_obj.current_big_part_number = number
+            fulltext_obj.current_big_part_name = name
+            fulltext_obj.reset_part()
+        elif kind == FullTextLineKind.CHAPTER:
+            fulltext_obj.current_chapter_number = number
+            fulltext_obj.current_chapter_name = name
+            fulltext_obj.reset_part()
+        elif kind == FullTextLineKind.PART:
+            fulltext_obj.current_part_number = number
+            fulltext_obj.current_part_name = name
+        elif kind == FullTextLineKind.MINI_PART:
+            fulltext_obj.current_mini_part_number = number
+            fulltext_obj.current_mini_part_name = name
+        else:
+            return False
+        return True
+
+    # split the full text lines into sections (VbplToanVan) and the appendix into sub parts (VbplSubPart)
+    @classmethod
+    def process_html_full_text(cls, lines):
+        segmenter = VbplFullTextSegmenter()
+        for line in lines:
+            # every p sibling of a p line is one of the lines too, a div line never has a p sibling
+            segmenter.add_line(get_html_node_text(line), id(line.parent) if line.name == 'p' else None)
+        segmenter.close()
+        return segmenter.pop_sections(), segmenter.sub_parts
+
+    @classmethod
+    def process_vbpl_sub_part(cls, sub_part_texts):
+        sub_section_title = sub_part_texts[1]
+        vbpl_sub_parts = []
+        is_sub_section_part_title = False
+
+        for i in range(2, len(sub_part_texts)):
+            if is_sub_section_part_title:
+                is_sub_section_part_title = False
+                continue
+
+            kind, current_sub_part, current_sub_part_title = VbplLineClassifier.classify(sub_part_texts[i])
+            if kind != FullTextLineKind.SUB_PART:
+                continue
+
+            current_sub_part_title = current_sub_part_title.strip()
+            # if the sub part title is not right beside the sub part number, it is below it
+            if current_sub_part_title == '':
+                current_sub_part_title = sub_part_texts[i + 1]
+                is_sub_section_part_title = True
+
+            vbpl_sub_parts.append({
+                'sub_section_title': sub_section_title,
+                'sub_section_part_number': current_sub_part,
+                'sub_section_part_title': current_sub_part_title
+            })
+        if len(vbpl_sub_parts) == 0:
+            vbpl_sub_parts.append({
+                'sub_section_title': sub_section_title,
+                'sub_section_part_number': '0',
+                'sub_section_part_title': None
+            })
+        return vbpl_sub_parts
@@ -0,0 +1,116 @@
+from itertools import islice
+
+from app.helper.db import LocalSession
+from app.helper.logger import setup_logger
+from app.helper.parse_pool import ParsePool
+from app.model import Vbpl, VbplToanVan, JobCheckpoint
+from app.model.vbpl import VbplSubPart
+from app.service.vbpl_parser import VbplParser
+from setting import setting
+
+_logger = setup_logger('vbpl_reparse_logger', 'log/vbpl_reparse.log')
+
+
+# rebuilds vbpl_toan_van and vbpl_sub_part from the stored vbpl html without any request to vbpl.vn.
+# the stored html is streamed by id, segmented in the parse worker processes and every batch is rewritten
+# in one transaction together with the checkpoint, an interrupted run continues after the last written batch
+class VbplReparseService:
+    _checkpoint_name = 'vbpl_reparse'
+
+    @classmethod
+    def get_checkpoint(cls, restart: bool):
+        with LocalSession.begin() as session:
+            checkpoint = session.query(JobCheckpoint).filter(JobCheckpoint.name == cls._checkpoint_name).first()
+            if checkpoint is None:
+                session.add(JobCheckpoint(name=cls._checkpoint_name, last_id=0))
+                return 0
+            if restart:
+                checkpoint.last_id = 0
+            return checkpoint.last_id
+
+    # one row per primary key, a later section with the same number wins like the upsert of the crawl
+    @classmethod
+    def build_rows(cls, vbpl_id, page):
+        sections = {}
+        for section in page['sections']:
+            sections[section['section_number']] = {'vbpl_id': vbpl_id, **section}
+        sub_parts = {}
+        for sub_part in page['sub_parts'] or []:
+            sub_parts[sub_part['sub_section_part_number']] = {'vbpl_id': vbpl_id, **sub_part}
+        return list(sections.values()), list(sub_parts.values())
+
+    # returns (rewritten, skipped, failed) of the batch
+    @classmethod
+    def write_batch(cls, vbpl_ids, parsed_pages):
+        rewritten_ids = []
+        section_rows = []
+        sub_part_rows = []
+        skipped = 0
+        failed = 0
+        for vbpl_id, (page, error) in zip(vbpl_ids, parsed_pages):
+            if error is not None:
+                failed += 1
+                _logger.warning(f'Reparse vbpl {vbpl_id} failed {error}')
+                continue
+            # no lines in the stored html, the crawl falls back to another source for these so they are kept
+            if page['sections'] is None:
+                skipped += 1
+                continue
+
+            sections, sub_parts = cls.build_rows(vbpl_id, page)
+            rewritten_ids.append(vbpl_id)
+            section_rows.extend(sections)
+            sub_part_rows.extend(sub_parts)
+
+        with LocalSession.begin() as session:
+            if len(rewritten_ids) > 0:
+                session.query(VbplToanVan).filter(VbplToanVan.vbpl_id.in_(rewritten_ids)) \
+                    .delete(synchronize_session=False)
+                session.query(VbplSubPart).filter(VbplSubPart.vbpl_id.in_(rewritten_ids)) \
+                    .delete(synchronize_session=False)
+                session.bulk_insert_mappings(VbplToanVan, section_rows)
+                session.bulk_insert_mappings(VbplSubPart, sub_part_rows)
+            session.query(JobCheckpoint).filter(JobCheckpoint.name == cls._checkpoint_name) \
+                .update({'last_id': vbpl_ids[-1]})
+        return len(rewritten_ids), skipped, failed
+
+    @classmethod
+    def run(cls, restart: bool = False, batch_size: int = None):
+        batch_size = batch_size or setting.VBPL_REPARSE_BATCH_SIZE
+        last_id = cls.get_checkpoint(restart)
+        done = rewritten = skipped = failed = 0
+
+        with LocalSession.begin() as session:
+            total = session.query(Vbpl.id).filter(Vbpl.html.isnot(None), Vbpl.id > last_id).count()
+            if last_id > 0:
+                print(f'Tiếp tục sau vbpl {last_id}')
+
+            # yield_per streams the rows with a server side cursor, the batches are written on other connections
+            stored_vbpl = iter(session.query(Vbpl.id, Vbpl.html)
+                               .filter(Vbpl.html.isnot(None), Vbpl.id > last_id)
+                               .order_by(Vbpl.id)
+                               .yield_per(batch_size))
+
+            # the next batch is parsed in the worker processes while the previous one is written
+            previous = None
+            while True:
+                batch = list(islice(stored_vbpl, batch_size))
+                if len(batch) > 0:
+                    parsed_pages = ParsePool.map(VbplParser.parse_stored_full_text, [html for _, html in batch])
+                    current = ([vbpl_id for vbpl_id, _ in batch], parsed_pages)
+                else:
+                    current = None
+
+                if previous is not None:
+                    batch_rewritten, batch_skipped, batch_failed = cls.write_batch(*previous)
+                    done += len(previous[0])
+                    rewritten += batch_rewritten
+                    skipped += batch_skipped
+                    failed += batch_failed
+                    print(f'Đã tách lại {done}/{total} văn bản (đến vbpl {previous[0][-1]})')
+
+                if current is None:
+                    break
+                previous = current
+
+        return rewritten, skipped, failed
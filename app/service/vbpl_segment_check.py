@@ -0,0 +1,258 @@
+import copy
+import re
+from typing import Optional
+
+from bs4 import BeautifulSoup
+
+from app.entity.vbpl import VbplFullTextField
+from app.helper.db import LocalSession
+from app.helper.utility import get_html_node_text
+from app.model import Vbpl
+from app.service.vbpl_parser import VbplParser
+
+
+# the full text segmentation as it was before the single pass rewrite, only kept to check the new one against
+class LegacyVbplSegmenter:
+    _find_big_part_regex = '^((Phần)|(Phần thứ)) (nhất|hai|ba|bốn|năm|sáu|bảy|tám|chín|mười)$'
+    _find_section_regex = '^((Điều)|(Điều thứ)) \\d+'
+    _find_chapter_regex = '^Chương [IVX]+'
+    _find_part_regex = '^Mục [IVX]+'
+    _find_part_regex_2 = '^Mu.c [IVX]+'
+    _find_mini_part_regex = '^Tiểu mục [IVX]+'
+    _find_start_sub_part_regex = '^PHỤ LỤC$'
+
+    @classmethod
+    def update_vbpl_phapquy_fulltext(cls, line, fulltext_obj: VbplFullTextField):
+        line_content = get_html_node_text(line)
+        check = False
+
+        if re.search(cls._find_big_part_regex, line_content):
+            current_big_part_number_search = re.search('(?<=Phần thứ ).+', line_content)
+            fulltext_obj.current_big_part_number = line_content[current_big_part_number_search.span()[0]:]
+            next_node = line.find_next_sibling('p')
+            fulltext_obj.current_big_part_name = get_html_node_text(next_node)
+
+            fulltext_obj.reset_part()
+            check = True
+
+        if re.search(cls._find_chapter_regex, line_content):
+            fulltext_obj.current_chapter_number = re.findall('(?<=Chương ).+', line_content)[0]
+            next_node = line.find_next_sibling('p')
+            fulltext_obj.current_chapter_name = get_html_node_text(next_node)
+
+            fulltext_obj.reset_part()
+            check = True
+
+        if re.search(cls._find_part_regex, line_content) or re.search(cls._find_part_regex_2, line_content):
+            if re.search(cls._find_part_regex, line_content):
+                fulltext_obj.current_part_number = re.findall('(?<=Mục ).+', line_content)[0]
+            else:
+                fulltext_obj.current_part_number = re.findall('(?<=Mu.c ).+', line_content)[0]
+            next_node = line.find_next_sibling('p')
+            fulltext_obj.current_part_name = get_html_node_text(next_node)
+            check = True
+
+        if re.search(cls._find_mini_part_regex, line_content):
+            fulltext_obj.current_mini_part_number = re.findall('(?<=Tiểu mục ).+', line_content)[0]
+            next_node = line.find_next_sibling('p')
+            fulltext_obj.current_mini_part_name = get_html_node_text(next_node)
+            check = True
+
+        return fulltext_obj, check
+
+    # split the full text lines into sections (VbplToanVan) and the appendix into sub parts (VbplSubPart)
+    @classmethod
+    def process_html_full_text(cls, lines):
+        vbpl_fulltext_obj = VbplFullTextField()
+        results = []
+
+        # init vbpl fulltext object
+        for line in lines:
+            # if line.name not in ['p', 'div'] or not check_header_tag(line.name):
+            #     continue
+
+            line_content = get_html_node_text(line)
+            if re.search(cls._find_section_regex, line_content):
+                break
+
+            vbpl_fulltext_obj, check = cls.update_vbpl_phapquy_fulltext(line, vbpl_fulltext_obj)
+            if check:
+                continue
+
+        # process fulltext line by line
+        for line_index, line in enumerate(lines):
+            # if line.name not in ['p', 'div'] or not check_header_tag(line.name):
+            #     continue
+
+            line_content = get_html_node_text(line)
+
+            if re.search(cls._find_start_sub_part_regex, line_content):
+                new_vbpl_sub_part = cls.process_vbpl_sub_part(lines[line_index:])
+                return results, new_vbpl_sub_part
+
+            if re.search(cls._find_section_regex, line_content):
+                section_number_search = re.search('\\b\\d+', line_content)
+                section_number = int(section_number_search.group())
+
+                section_name = line_content[section_number_search.span()[1]:]
+                section_name_refined = None
+                section_name_search = re.search('\\b\\w', section_name)
+                if section_name_search:
+                    section_name_refined = section_name[section_name_search.span()[0]:]
+
+                current_fulltext_config = copy.deepcopy(vbpl_fulltext_obj)
+                content = []
+                if section_name_refined is not None and len(section_name_refined) >= 400:
+                    content.append(section_name_refined)
+                    section_name_refined = None
+
+                next_node = line
+                while True:
+                    next_node = next_node.find_next_sibling('p')
+
+                    if next_node is None:
+                        break
+
+                    node_content = get_html_node_text(next_node)
+
+                    vbpl_fulltext_obj, check = cls.update_vbpl_phapquy_fulltext(next_node, vbpl_fulltext_obj)
+                    if check:
+                        next_node = next_node.find_next_sibling('p')
+                        if next_node is None:
+                            break
+                        continue
+
+                    if (re.search(cls._find_section_regex, node_content)
+                        or re.search('_{2,}', node_content)
+                        or next_node.find_next_sibling('p') is None) \
+                            or re.search(cls._find_start_sub_part_regex, node_content):
+                        section_content = '\n'.join(content)
+
+                        results.append({
+                            'section_number': section_number,
+                            'section_name': section_name_refined,
+                            'section_content': section_content,
+                            'chapter_name': current_fulltext_config.current_chapter_name,
+                            'chapter_number': current_fulltext_config.current_chapter_number,
+                            'mini_part_name': current_fulltext_config.current_mini_part_name,
+                            'mini_part_number': current_fulltext_config.current_mini_part_number,
+                            'part_name': current_fulltext_config.current_part_name,
+                            'part_number': current_fulltext_config.current_part_number,
+                            'big_part_name': current_fulltext_config.current_big_part_name,
+                            'big_part_number': current_fulltext_config.current_big_part_number
+                        })
+                        break
+
+                    content.append(get_html_node_text(next_node))
+        return results, None
+
+    @classmethod
+    def process_vbpl_sub_part(cls, sub_part_lines):
+        sub_section_title = get_html_node_text(sub_part_lines[1])
+        vbpl_sub_parts = []
+
+        regex_dict = {
+            '^Phụ(\\s)*(\\n)*lục [IVX]+': '(?<=lục )[IVX]+',
+            '^Phụ(\\s)*(\\n)*lục \\d+': '(?<=lục )\\d+',
+            # '^\\d+\\.': '^\\d+(?=\\.)',
+            # '^\\d+-': '^\\d+(?=-)'
+        }
+        is_sub_section_part_title = False
+
+        for i in range(2, len(sub_part_lines)):
+            if is_sub_section_part_title:
+                is_sub_section_part_title = False
+                continue
+
+            line = sub_part_lines[i]
+            # if line.name not in ['p', 'div'] or not check_header_tag(line.name):
+            #     continue
+
+            line_content = get_html_node_text(line)
+
+            for check_regex in regex_dict.keys():
+                if re.search(check_regex, line_content):
+                    extract_regex = regex_dict[check_regex]
+                    current_sub_part_reg = re.search(extract_regex, line_content)
+
+                    # get sub part number
+                    current_sub_part = line_content[current_sub_part_reg.span()[0]:current_sub_part_reg.span()[1]]
+                    # skip if sub part number is not numeral or roman numeral
+                    if not re.search('^[IVX]+$', current_sub_part) and not re.search('^\\d+$', current_sub_part):
+                        continue
+
+                    current_sub_part_title = line_content[current_sub_part_reg.span()[1]:].strip()
+                    # if the sub part title is not right beside the sub part number, it is below it
+                    if current_sub_part_title == '':
+                        current_sub_part_title_node = sub_part_lines[i + 1]
+                        current_sub_part_title = get_html_node_text(current_sub_part_title_node)
+                        is_sub_section_part_title = True
+
+                    vbpl_sub_parts.append({
+                        'sub_section_title': sub_section_title,
+                        'sub_section_part_number': current_sub_part,
+                        'sub_section_part_title': current_sub_part_title
+                    })
+                    break
+        if len(vbpl_sub_parts) == 0:
+            vbpl_sub_parts.append({
+                'sub_section_title': sub_section_title,
+                'sub_section_part_number': '0',
+                'sub_section_part_title': None
+            })
+        return vbpl_sub_parts
+
+# regression check of the full text segmentation, every stored vbpl html is segmented by both
+# implementations and the records have to be identical, a failure has to be the same exception
+class VbplSegmentCheck:
+    @classmethod
+    def segment(cls, segmenter, lines):
+        try:
+            return segmenter.process_html_full_text(lines)
+        except Exception as e:
+            return type(e).__name__
+
+    # None when both agree, otherwise a short description of the first difference
+    @classmethod
+    def compare(cls, html: str) -> Optional[str]:
+        fulltext = BeautifulSoup(html, 'lxml').find('div')
+        if fulltext is None:
+            return None
+
+        lines = fulltext.find_all('p')
+        if len(lines) == 0:
+            lines = fulltext.find_all('div')
+        if len(lines) == 0:
+            return None
+
+        legacy = cls.segment(LegacyVbplSegmenter, lines)
+        current = cls.segment(VbplParser, lines)
+        if legacy == current:
+            return None
+        if isinstance(legacy, str) or isinstance(current, str):
+            return f'legacy: {legacy if isinstance(legacy, str) else "ok"}, ' \
+                   f'current: {current if isinstance(current, str) else "ok"}'
+        for name, legacy_records, current_records in [('sections', legacy[0], current[0]),
+                                                       ('sub parts', legacy[1], current[1])]:
+            if legacy_records == current_records:
+                continue
+            if legacy_records is None or current_records is None:
+                return f'{name}: legacy {legacy_records is not None}, current {current_records is not None}'
+            for index, (legacy_record, current_record) in enumerate(zip(legacy_records, current_records)):
+                if legacy_record != current_record:
+                    return f'{name} #{index}: legacy {legacy_record}, current {current_record}'
+            return f'{name}: legacy {len(legacy_records)} records, current {len(current_records)} records'
+
+    @classmethod
+    def run(cls, batch_size: int = 100):
+        checked = 0
+        mismatched = []
+        with LocalSession.begin() as session:
+            stored_vbpl = session.query(Vbpl.id, Vbpl.html).filter(Vbpl.html.isnot(None)).yield_per(batch_size)
+            for vbpl_id, html in stored_vbpl:
+                difference = cls.compare(html)
+                checked += 1
+                if difference is not None:
+                    mismatched.append(vbpl_id)
+                    print(f'vbpl {vbpl_id}: {difference}')
+        return checked, mismatched
@@ -1,12 +1,14 @@
-import asyncio
 import re
 import sys
 
+from app.helper.crawl_runner import run_crawl
 from app.helper.enum import VbplType
 from app.model import Anle, Vbpl
 from app.service.anle import AnleService
 
 from app.service.vbpl import VbplService
+from app.service.vbpl_reparse import VbplReparseService
+from app.service.vbpl_segment_check import VbplSegmentCheck
 
 vbpl_service = VbplService()
 anle_service = AnleService()
@@ -14,62 +16,62 @@ anle_service = AnleService()
 
 def crawl_all_vbpl_phap_quy():
     print("Đang cào dữ liệu vbpl - văn bản pháp quy")
-    asyncio.run(vbpl_service.crawl_all_vbpl(VbplType.PHAP_QUY))
+    run_crawl(vbpl_service.crawl_all_vbpl(VbplType.PHAP_QUY))
     print("Cào dữ liệu hoàn tất")
 
 
 def crawl_all_vbpl_hop_nhat():
     print("Đang cào dữ liệu vbpl - văn bản hợp nhất")
-    asyncio.run(vbpl_service.crawl_all_vbpl(VbplType.HOP_NHAT))
+    run_crawl(vbpl_service.crawl_all_vbpl(VbplType.HOP_NHAT))
     print("Cào dữ liệu hoàn tất")
 
 
 def craw_all_anle():
     print("Đang cào dữ liệu án lệ")
-    asyncio.run(anle_service.crawl_all_anle())
+    run_crawl(anle_service.crawl_all_anle())
     print("Cào dữ liệu hoàn tất")
 
 
 def crawl_anle_by_id(id):
     print(f"Đang cào dữ liệu của án lệ có id: {id}")
     new_anle = Anle(doc_id=id)
-    asyncio.run(anle_service.crawl_anle_info(new_anle))
+    run_crawl(anle_service.crawl_anle_info(new_anle, force=True))
     print("Cào dữ liệu hoàn tất")
 
 
 def crawl_vbpl_by_id_phap_quy(id):
     print(f"Đang cào dữ liệu của văn bản pháp quy có id: {id}")
-    asyncio.run(vbpl_service.crawl_vbpl_by_id(id, VbplType.PHAP_QUY))
+    run_crawl(vbpl_service.crawl_vbpl_by_id(id, VbplType.PHAP_QUY))
     print("Cào dữ liệu hoàn tất")
 
 
 def crawl_vbpl_by_id_hop_nhat(id):
     print(f"Đang cào dữ liệu của văn bản hợp nhất có id: {id}")
-    asyncio.run(vbpl_service.crawl_vbpl_by_id(id, VbplType.HOP_NHAT))
+    run_crawl(vbpl_service.crawl_vbpl_by_id(id, VbplType.HOP_NHAT))
     print("Cào dữ liệu hoàn tất")
 
 
 def fetch_vbpl_by_id(id):
     print(f"Đang lấy dữ liệu của văn bản pháp luật có id: {id}")
-    asyncio.run(vbpl_service.fetch_vbpl_by_id(id))
+    run_crawl(vbpl_service.fetch_vbpl_by_id(id))
     print("Lấy dữ liệu hoàn tất")
 
 
 def fetch_anle_by_id(id):
     print(f"Đang lấy dữ liệu của án lệ có id: {id}")
-    asyncio.run(anle_service.fetch_anle_by_id(id))
+    run_crawl(anle_service.fetch_anle_by_id(id))
     print("Lấy dữ liệu hoàn tất")
 
 
 def preview_vbpl(num_of_rows, issuance_date):
     print(f"Đang tải bản xem trước của {num_of_rows} vbpl")
-    asyncio.run(vbpl_service.get_vbpl_preview(num_of_rows, issuance_date))
+    run_crawl(vbpl_service.get_vbpl_preview(num_of_rows, issuance_date))
     print("Bản xem trước được lưu tại documents/preview/vbpl")
 
 
 def preview_anle():
     print(f"Đang tải bản xem trước của án lệ")
-    asyncio.run(anle_service.get_anle_preview())
+    run_crawl(anle_service.get_anle_preview())
     print("Bản xem trước được lưu tại documents/preview/anle")
 
 
@@ -78,7 +80,7 @@ def crawl_anle_by_id_string(id_string):
     id_arr = re.split(r',\s*|,', id_string)
     for anle_id in id_arr:
         new_anle = Anle(doc_id=anle_id)
-        asyncio.run(anle_service.crawl_anle_info(new_anle))
+        run_crawl(anle_service.crawl_anle_info(new_anle, force=True))
     print("Cào dữ liệu hoàn tất")
 
 
@@ -86,7 +88,7 @@ def crawl_vbpl_by_id_string_hop_nhat(id_string):
     print(f"Đang cào dữ liệu của các văn bản hợp nhất có id: {id_string}")
     id_arr = re.split(r',\s*|,', id_string)
     for vbpl_id in id_arr:
-        asyncio.run(vbpl_service.crawl_vbpl_by_id(vbpl_id, VbplType.HOP_NHAT))
+        run_crawl(vbpl_service.crawl_vbpl_by_id(vbpl_id, VbplType.HOP_NHAT))
     print("Cào dữ liệu hoàn tất")
 
 
@@ -94,10 +96,22 @@ def crawl_vbpl_by_id_string_phap_quy(id_string):
     print(f"Đang cào dữ liệu của các văn bản pháp quy có id: {id_string}")
     id_arr = re.split(r',\s*|,', id_string)
     for vbpl_id in id_arr:
-        asyncio.run(vbpl_service.crawl_vbpl_by_id(vbpl_id, VbplType.PHAP_QUY))
+        run_crawl(vbpl_service.crawl_vbpl_by_id(vbpl_id, VbplType.PHAP_QUY))
     print("Cào dữ liệu hoàn tất")
 
 
+def check_vbpl_segmentation():
+    print("Đang kiểm tra tách toàn văn của các vbpl đã lưu")
+    checked, mismatched = VbplSegmentCheck.run()
+    print(f"Đã kiểm tra {checked} văn bản, {len(mismatched)} văn bản có kết quả khác")
+
+
+def reparse_vbpl(restart):
+    print("Đang tách lại toàn văn của các vbpl đã lưu")
+    rewritten, skipped, failed = VbplReparseService.run(restart)
+    print(f"Hoàn tất, {rewritten} văn bản được ghi lại, {skipped} văn bản không có nội dung, {failed} văn bản lỗi")
+
+
 def print_menu():
     menu = """
 ╔══════════════════════════════════════════════════════╗
@@ -120,8 +134,10 @@ def print_menu():
 ║ 11. Tìm án lệ theo ID                                ║
 ║ 12. Preview án lệ                                    ║
 ║ 13. Preview văn bản pháp luật                        ║
-║ 14. --help                                           ║
-║ 15. Thoát                                            ║
+║ 14. Kiểm tra tách toàn văn vbpl đã lưu               ║
+║ 15. Tách lại toàn văn vbpl đã lưu                    ║
+║ 16. --help                                           ║
+║ 17. Thoát                                            ║
 ╚══════════════════════════════════════════════════════╝
 """
     print(menu)
@@ -169,9 +185,14 @@ def main():
                 num_of_rows = input("Nhập số dòng (VD: 3): ")
                 issuance_date = input("Nhập ngày ban hành (DD/MM/YYYY): ")
                 preview_vbpl(num_of_rows, issuance_date)
-            elif choice == "14" or choice == "--help":
-                print_menu()
+            elif choice == "14":
+                check_vbpl_segmentation()
             elif choice == "15":
+                restart = input("Chạy lại từ đầu thay vì tiếp tục lần trước? (y/N): ")
+                reparse_vbpl(restart.strip().lower() == "y")
+            elif choice == "16" or choice == "--help":
+                print_menu()
+            elif choice == "17":
                 print("Đang thoát chương trình.")
                 break
             else:
@@ -1,20 +1,27 @@
-import asyncio
 import time
 
+from app.helper.crawl_runner import run_crawl
 from app.helper.enum import VbplType
 from app.model import Vbpl
 from app.service.anle import AnleService
 
 from app.service.vbpl import VbplService
+from setting import setting
 
 vbpl_service = VbplService()
 anle_service = AnleService()
 
+# the first run after a start is a full sweep, then incremental runs until the sweep interval has passed
+last_full_sweep = None
+
 while True:
     try:
-        asyncio.run(anle_service.crawl_all_anle())
-        asyncio.run(vbpl_service.crawl_all_vbpl(VbplType.PHAP_QUY))
-        asyncio.run(vbpl_service.crawl_all_vbpl(VbplType.HOP_NHAT))
+        full_sweep = last_full_sweep is None or time.time() - last_full_sweep >= setting.VBPL_FULL_SWEEP_INTERVAL
+        run_crawl(anle_service.crawl_all_anle())
+        run_crawl(vbpl_service.crawl_all_vbpl(VbplType.PHAP_QUY, incremental=not full_sweep))
+        run_crawl(vbpl_service.crawl_all_vbpl(VbplType.HOP_NHAT, incremental=not full_sweep))
+        if full_sweep:
+            last_full_sweep = time.time()
     except Exception as e:
         continue
     time.sleep(15)
@@ -19,5 +19,72 @@ class Setting(BaseSettings):
     CONG_BAO_BASE_URL: str = os.getenv('CONG_BAO_BASE_URL')
     LUAT_VN_BASE_URL: str = os.getenv('LUAT_VN_BASE_URL')
 
+    # crawl_task frontier, lease of a claimed task in seconds, attempts before a task is given up until the
+    # next listing, base of the exponential retry backoff in seconds and tasks claimed per statement
+    CRAWL_TASK_LEASE: int = int(os.getenv('CRAWL_TASK_LEASE', 1800))
+    CRAWL_TASK_MAX_ATTEMPTS: int = int(os.getenv('CRAWL_TASK_MAX_ATTEMPTS', 5))
+    CRAWL_TASK_BACKOFF: int = int(os.getenv('CRAWL_TASK_BACKOFF', 60))
+    CRAWL_TASK_CLAIM_SIZE: int = int(os.getenv('CRAWL_TASK_CLAIM_SIZE', 50))
+
+    # connection pool of the async engine the crawlers use
+    DB_POOL_SIZE: int = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW: int = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT: int = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE: int = int(os.getenv('DB_POOL_RECYCLE', 3600))
+
+    # vbpl crawl pipeline, workers per stage and size of the queue in front of each stage
+    VBPL_LISTING_WORKERS: int = int(os.getenv('VBPL_LISTING_WORKERS', 2))
+    VBPL_DETAIL_WORKERS: int = int(os.getenv('VBPL_DETAIL_WORKERS', 16))
+    VBPL_ENRICHMENT_WORKERS: int = int(os.getenv('VBPL_ENRICHMENT_WORKERS', 8))
+    VBPL_PERSIST_WORKERS: int = int(os.getenv('VBPL_PERSIST_WORKERS', 4))
+    VBPL_RELATION_WORKERS: int = int(os.getenv('VBPL_RELATION_WORKERS', 8))
+    VBPL_PIPELINE_QUEUE_SIZE: int = int(os.getenv('VBPL_PIPELINE_QUEUE_SIZE', 64))
+    # an incremental crawl stops after this many listing pages in a row of known vbpl,
+    # main.py runs a full sweep of every listing page once per VBPL_FULL_SWEEP_INTERVAL seconds
+    VBPL_INCREMENTAL_STOP_PAGES: int = int(os.getenv('VBPL_INCREMENTAL_STOP_PAGES', 3))
+    VBPL_FULL_SWEEP_INTERVAL: int = int(os.getenv('VBPL_FULL_SWEEP_INTERVAL', 86400))
+
+    # html parsing worker processes, 0 parses on the event loop thread
+    PARSE_WORKERS: int = int(os.getenv('PARSE_WORKERS', 4))
+    # full text pages of at least this many characters are parsed as a stream, 0 always streams
+    FULL_TEXT_STREAM_MIN_SIZE: int = int(os.getenv('FULL_TEXT_STREAM_MIN_SIZE', 1000000))
+
+    # offline re-parse of the stored vbpl html, documents per batch
+    VBPL_REPARSE_BATCH_SIZE: int = int(os.getenv('VBPL_REPARSE_BATCH_SIZE', 200))
+
+    # write-behind db writer, writes per transaction, how long a write may wait for the batch to fill
+    # and how many writes may be queued before the crawl waits for the db
+    DB_WRITE_BATCH_SIZE: int = int(os.getenv('DB_WRITE_BATCH_SIZE', 100))
+    DB_WRITE_MAX_LATENCY_MS: int = int(os.getenv('DB_WRITE_MAX_LATENCY_MS', 500))
+    DB_WRITE_QUEUE_SIZE: int = int(os.getenv('DB_WRITE_QUEUE_SIZE', 1000))
+
+    # shared http connection pool
+    HTTP_POOL_LIMIT: int = int(os.getenv('HTTP_POOL_LIMIT', 100))
+    HTTP_POOL_LIMIT_PER_HOST: int = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', 16))
+    HTTP_DNS_CACHE_TTL: int = int(os.getenv('HTTP_DNS_CACHE_TTL', 600))
+    HTTP_KEEPALIVE_TIMEOUT: int = int(os.getenv('HTTP_KEEPALIVE_TIMEOUT', 60))
+
+    # raw response archive of HttpClient.request: off, record (archive every response) or
+    # replay (answer every request from the archive, nothing is sent)
+    RESPONSE_ARCHIVE_MODE: str = os.getenv('RESPONSE_ARCHIVE_MODE', 'off')
+
+    # pdf/doc downloads
+    DOWNLOAD_CONCURRENCY: int = int(os.getenv('DOWNLOAD_CONCURRENCY', 4))
+    DOWNLOAD_READ_TIMEOUT: int = int(os.getenv('DOWNLOAD_READ_TIMEOUT', 60))
+    DOWNLOAD_CHUNK_SIZE: int = int(os.getenv('DOWNLOAD_CHUNK_SIZE', 65536))
+    DOWNLOAD_MAX_RETRIES: int = int(os.getenv('DOWNLOAD_MAX_RETRIES', 3))
+
+    # per host rate limit, requests per second and burst size, a rate of 0 disables the limit
+    VBPL_RATE_LIMIT: float = float(os.getenv('VBPL_RATE_LIMIT', 5))
+    VBPL_RATE_BURST: int = int(os.getenv('VBPL_RATE_BURST', 5))
+    ANLE_RATE_LIMIT: float = float(os.getenv('ANLE_RATE_LIMIT', 2))
+    ANLE_RATE_BURST: int = int(os.getenv('ANLE_RATE_BURST', 2))
+    CONCETTI_RATE_LIMIT: float = float(os.getenv('CONCETTI_RATE_LIMIT', 5))
+    CONCETTI_RATE_BURST: int = int(os.getenv('CONCETTI_RATE_BURST', 5))
+    TVPL_RATE_LIMIT: float = float(os.getenv('TVPL_RATE_LIMIT', 1))
+    TVPL_RATE_BURST: int = int(os.getenv('TVPL_RATE_BURST', 2))
+    LUAT_VN_RATE_LIMIT: float = float(os.getenv('LUAT_VN_RATE_LIMIT', 2))
+    LUAT_VN_RATE_BURST: int = int(os.getenv('LUAT_VN_RATE_BURST', 2))
+
 
 setting = Setting()